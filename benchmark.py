@@ -0,0 +1,933 @@
+import argparse
+import gc
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from bs4 import BeautifulSoup
+
+import page_analysis as pa
+
+
+def generate_page(sections=2000, seed=0):
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+    parts = [
+        "<html><head>",
+        '<meta name="description" content="benchmark page">',
+        '<meta name="keywords" content="one,two,three">',
+        '<meta name="viewport" content="width=device-width">',
+        '<link rel="canonical" href="https://bench.example/">',
+        '<link rel="icon" href="/favicon.ico">',
+        '<script type="application/ld+json">{"@type": "Organization"}</script>',
+        "</head><body>",
+    ]
+    for i in range(sections):
+        text = " ".join(rng.choice(words) for _ in range(40))
+        parts.append(f"<div class='section'><h{i % 6 + 1}>Section {i}</h{i % 6 + 1}>")
+        parts.append(f"<p>{text}</p><!-- section {i} -->")
+        parts.append(f'<a href="https://bench.example/page/{i}">internal</a>')
+        parts.append(f'<a href="https://twitter.com/user{i}">social</a>')
+        parts.append(f'<img src="/img/{i}.png" alt="image {i}">')
+        if i % 10 == 0:
+            parts.append(f'<link rel="stylesheet" href="/css/{i}.css">')
+            parts.append(f'<script src="/js/analytics-{i}.js"></script>')
+            parts.append(f'<iframe src="/frame/{i}"></iframe><audio src="/audio/{i}.mp3"></audio>')
+            parts.append(f'<video src="/video/{i}.mp4"></video>')
+            parts.append(f'<form action="/contact/{i}" method="post"><input name="q{i}" type="text"></form>')
+            parts.append("<table>" + "".join(f"<tr><td>{r}</td><td>{text[:20]}</td></tr>" for r in range(5)) + "</table>")
+        parts.append("</div>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def script_heavy_page(sections=500, seed=0):
+    # Inline scripts and styles full of long numbers, with a few real contact details in the text
+    rng = random.Random(seed)
+    parts = ["<html><head><style>" + "".join(f".c{i}{{width:{rng.randrange(10**9, 10**10)}px}}" for i in range(200)) + "</style></head><body>"]
+    for i in range(sections):
+        ids = ", ".join(str(rng.randrange(10**9, 10**14)) for _ in range(30))
+        parts.append(f"<script>window.dataLayer.push({{ids: [{ids}], ts: {rng.randrange(10**12, 10**13)}}});</script>")
+        parts.append(f"<p>Section {i} of the catalogue, updated 2024-01-{i % 28 + 1:02d}.</p>")
+        if i % 50 == 0:
+            parts.append(f'<p>Call +1 (555) {100 + i % 900:03d}-{i:04d} or write to sales{i}@example.com</p>')
+            parts.append(f'<a href="mailto:support{i}@example.com">mail</a><a href="tel:+44-20-7946-{i:04d}">call</a>')
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def legacy_dom_fields(url, soup):
+    internal_links, external_links = pa.extract_links(url, soup)
+    return {
+        "Meta Tags": pa.extract_meta_tags(soup),
+        "Main Content": " ".join([p.get_text() for p in soup.find_all("p")]),
+        "Internal Links": internal_links,
+        "External Links": external_links,
+        "JSON-LD Data": pa.extract_json_ld(soup),
+        "Forms": pa.extract_forms(soup),
+        "Tracking Scripts": pa.extract_scripts_and_tracking(soup),
+        "Media": pa.extract_media(soup),
+        "Comments": pa.extract_comments(soup),
+        "Tables": pa.extract_tables(soup),
+        "Headings": pa.extract_headings(soup),
+        "Audio Files": pa.extract_audio_files(soup),
+        "Stylesheets": pa.extract_stylesheets(soup),
+        "iFrames": pa.extract_iframes(soup),
+        "External JavaScript": pa.extract_external_js(soup),
+        "Meta Keywords": pa.extract_meta_keywords(soup),
+        "Contact Forms": [pa.form_to_dict(form) for form in soup.find_all("form") if "contact" in form.get("action", "").lower()],
+        "Viewport Meta Tag": pa.check_viewport_meta(soup),
+        "Canonical Link": pa.extract_canonical_link(soup),
+        "Favicon": pa.check_favicon(soup),
+        "Schema Markup": pa.extract_schema_markup(soup),
+    }
+
+
+def single_pass_dom_fields(url, soup):
+    return dom_fields(pa.walk_dom(url, soup))
+
+
+def dom_fields(dom):
+    return {
+        "Meta Tags": dom["meta_tags"],
+        "Main Content": " ".join(dom["paragraphs"]),
+        "Internal Links": dom["internal_links"],
+        "External Links": dom["external_links"],
+        "JSON-LD Data": dom["json_ld"],
+        "Forms": dom["forms"],
+        "Tracking Scripts": dom["tracking_scripts"],
+        "Media": dom["images"] + dom["videos"],
+        "Comments": dom["comments"],
+        "Tables": dom["tables"],
+        "Headings": dom["headings"],
+        "Audio Files": dom["audio_files"],
+        "Stylesheets": dom["stylesheets"],
+        "iFrames": dom["iframes"],
+        "External JavaScript": dom["external_js"],
+        "Meta Keywords": dom["meta_keywords"],
+        "Contact Forms": dom["contact_forms"],
+        "Viewport Meta Tag": dom["viewport"] if dom["viewport"] is not None else "Not found",
+        "Canonical Link": dom["canonical"] if dom["canonical"] is not None else "Not found",
+        "Favicon": dom["favicon"] if dom["favicon"] is not None else "Not found",
+        "Schema Markup": dom["json_ld"],
+    }
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_dom_extraction(sections, repeat):
+    url = "https://bench.example"
+    html = generate_page(sections)
+    soup = BeautifulSoup(html, "html.parser")
+
+    legacy = legacy_dom_fields(url, soup)
+    single_pass = single_pass_dom_fields(url, soup)
+    mismatched = [key for key in legacy if legacy[key] != single_pass[key]]
+    if mismatched:
+        raise SystemExit(f"Single-pass output differs from per-function output: {', '.join(mismatched)}")
+
+    legacy_time = best_of(lambda: legacy_dom_fields(url, soup), repeat)
+    single_pass_time = best_of(lambda: single_pass_dom_fields(url, soup), repeat)
+    print(f"DOM extraction ({len(html) / 1e6:.1f} MB HTML, best of {repeat})")
+    print(f"  per-function: {legacy_time * 1000:8.1f} ms")
+    print(f"  single-pass:  {single_pass_time * 1000:8.1f} ms")
+    print(f"  speedup:      {legacy_time / single_pass_time:8.2f}x")
+    return {
+        "per_function_ms": legacy_time * 1000,
+        "single_pass_ms": single_pass_time * 1000,
+        "speedup": legacy_time / single_pass_time
+    }
+
+
+def parity_corpus():
+    return {
+        "small": generate_page(10, seed=1),
+        "medium": generate_page(500, seed=2),
+        "empty-body": "<html><head><title>t</title></head><body></body></html>",
+        "nested-tables": (
+            "<html><body><table><tr><td>outer<table><tr><th>inner</th></tr></table></td></tr></table>"
+            '<link rel="alternate stylesheet" href="/alt.css"><link rel="shortcut icon" href="/s.ico">'
+            '<meta property="og:title" content="og"><p>one <b>two</b> three</p></body></html>'
+        ),
+        "inline-script-style": (
+            "<html><body><p>Visible words are here <script>var secret=1;</script> and more</p>"
+            "<p>a <style>.x{color:red}</style> b <!-- note --> c <template>hidden<b>too</b></template> d</p>"
+            "<template><p>paragraph in a template</p><h3>heading <i>too</i></h3></template>"
+            "<h2>Title <script>track()</script>end</h2><p>x <b>y <script>z</script> w</b> v</p>"
+            "<table><tr><td>cell <style>td{}</style>value</td></tr></table></body></html>"
+        ),
+        "whitespace-only-text": (
+            "<html><body><p><em><span>a <style>.s{}</style></span>  <b>b</b>\n\t <i>c</i></em></p>"
+            "<pre><span>x</span>   <span>y</span></pre><p>d <textarea>  </textarea>   e</p></body></html>"
+        ),
+    }
+
+
+def bench_parsers(repeat):
+    url = "https://bench.example"
+    parsers = pa.available_parsers()
+    reference = parsers[-1]
+    for name, html in parity_corpus().items():
+        expected = single_pass_dom_fields(url, pa.parse_html(html, reference))
+        for parser in parsers:
+            actual = single_pass_dom_fields(url, pa.parse_html(html, parser))
+            mismatched = [key for key in expected if expected[key] != actual[key]]
+            if mismatched:
+                raise SystemExit(f"{parser} differs from {reference} on '{name}': {', '.join(mismatched)}")
+        if pa.etree is not None:
+            actual = dom_fields(pa.stream_dom(url, html.encode()))
+            mismatched = [key for key in expected if expected[key] != actual[key]]
+            if mismatched:
+                raise SystemExit(f"{pa.STREAM_PARSER} differs from {reference} on '{name}': {', '.join(mismatched)}")
+
+    html = generate_page()
+    print(f"Parsing ({len(html) / 1e6:.1f} MB HTML, best of {repeat}); all backends match {reference}")
+    results = {}
+    for parser in parsers:
+        parse_time = best_of(lambda: pa.parse_html(html, parser), repeat)
+        print(f"  {parser:12s} {parse_time * 1000:8.1f} ms")
+        results[f"{parser}_ms"] = parse_time * 1000
+    return results
+
+
+def bench_contact_extraction(sections, repeat):
+    url = "https://bench.example"
+    html = script_heavy_page(sections)
+    soup = pa.parse_html(html, "lxml")
+    dom = pa.walk_dom(url, soup)
+    legacy = pa.extract_contact_info(soup, contact_forms=[])
+    current = pa.extract_contact_details(dom["text_nodes"], dom["hrefs"], [])
+    legacy_time = best_of(lambda: pa.extract_contact_info(soup, contact_forms=[]), repeat)
+    current_time = best_of(lambda: pa.extract_contact_details(dom["text_nodes"], dom["hrefs"], []), repeat)
+    walk_time = best_of(lambda: pa.walk_dom(url, soup), repeat)
+    print(f"Contact extraction on a script-heavy page ({len(html) / 1e6:.1f} MB HTML, best of {repeat})")
+    print(f"  str(soup) regexes:  {legacy_time * 1000:8.1f} ms  {len(legacy['phone_numbers']):5d} phone numbers, {len(legacy['emails'])} emails")
+    print(f"  text nodes + hrefs: {current_time * 1000:8.1f} ms  {len(current['phone_numbers']):5d} phone numbers, {len(current['emails'])} emails")
+    print(f"  (walk_dom, which now also collects the text nodes: {walk_time * 1000:.1f} ms)")
+    return {
+        "str_soup_ms": legacy_time * 1000,
+        "text_nodes_ms": current_time * 1000,
+        "speedup": legacy_time / current_time
+    }
+
+
+def bench_text_analytics(sections, repeat, tfidf_pages):
+    # Zipf-distributed vocabulary with punctuation and stopwords, like real article text
+    rng = random.Random(0)
+    syllables = ["ka", "lo", "mi", "re", "tu", "san", "vel", "dor", "pra", "qui"]
+    vocabulary = ["".join(syllables[int(digit)] for digit in str(i)) for i in range(1000, 6000)] + sorted(pa.STOPWORDS)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rng.shuffle(weights)
+    words = rng.choices(vocabulary, weights, k=sections * 40)
+    text = " ".join(word + rng.choice(["", "", "", ",", ".", "!"]) for word in words)
+    legacy_time = best_of(lambda: pa.analyze_word_count_and_density(text), repeat)
+    current_time = best_of(lambda: pa.analyze_keywords(text), repeat)
+    legacy_size = len(json.dumps(pa.analyze_word_count_and_density(text)[1]))
+    _, keywords, bigrams = pa.analyze_keywords(text)
+    current_size = len(json.dumps(keywords)) + len(json.dumps(bigrams))
+    corpus = {f"page{i}": pa.analyze_keywords(" ".join(text.split()[i * 500:(i + 1) * 500]))[1] for i in range(200)}
+    tfidf_time = best_of(lambda: pa.corpus_tfidf(corpus), repeat)
+    # Many pages with mostly distinct keywords, as across a crawl of unrelated sites
+    terms = [f"term{i}" for i in range(200000)]
+    term_weights = [1 / (rank + 1) for rank in range(len(terms))]
+    large_corpus = {
+        f"page{i}": {term: rng.random() for term in rng.choices(terms, term_weights, k=pa.KEYWORD_TOP_K)}
+        for i in range(tfidf_pages)
+    }
+    tracemalloc.start()
+    large_tfidf_time, _ = timed(pa.corpus_tfidf, large_corpus)
+    large_tfidf_peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    print(f"Keyword analytics ({len(text.split())} words, best of {repeat})")
+    print(f"  dict density:        {legacy_time * 1000:8.1f} ms  {legacy_size:7d} bytes of JSON")
+    print(f"  top-K keywords+bigrams: {current_time * 1000:5.1f} ms  {current_size:7d} bytes of JSON")
+    print(f"  corpus TF-IDF, {len(corpus)} pages: {tfidf_time * 1000:5.1f} ms")
+    print(f"  corpus TF-IDF, {len(large_corpus)} pages: {large_tfidf_time * 1000:5.1f} ms, peak {large_tfidf_peak:.1f} MB allocated")
+    return {
+        "dict_density_ms": legacy_time * 1000,
+        "top_k_ms": current_time * 1000,
+        "dict_density_bytes": legacy_size,
+        "top_k_bytes": current_size,
+        "tfidf_ms": tfidf_time * 1000,
+        "large_tfidf_ms": large_tfidf_time * 1000,
+        "large_tfidf_peak_mb": large_tfidf_peak
+    }
+
+
+SENTENCES = {
+    "en": [
+        "The new release is a great improvement and the team is very happy with it.",
+        "Shipping was slow and the support staff never answered our terrible complaint.",
+        "Our quarterly report covers revenue, hiring and the roadmap for next year.",
+        "Customers love the simple design, although some find the setup confusing.",
+        "The museum opens at nine and guided tours run every hour until the evening.",
+        "Heavy rain flooded the old bridge, and the council is planning repairs.",
+    ],
+    "fr": [
+        "Le nouveau service est vraiment excellent et les clients sont satisfaits.",
+        "La réunion a été reportée à cause de la grève des transports publics.",
+        "Nous publions chaque mois un rapport détaillé sur nos activités.",
+        "Le musée ouvre ses portes à neuf heures pour les visites guidées.",
+    ],
+    "de": [
+        "Die neue Version ist deutlich schneller und die Kunden sind zufrieden.",
+        "Wegen des Streiks wurde die Sitzung auf nächste Woche verschoben.",
+        "Unser Bericht beschreibt den Umsatz und die Pläne für das kommende Jahr.",
+        "Das Museum öffnet um neun Uhr und bietet stündlich Führungen an.",
+    ],
+    "es": [
+        "La nueva versión es excelente y los clientes están muy contentos.",
+        "La reunión se aplazó por la huelga del transporte público.",
+        "Nuestro informe trimestral describe los ingresos y los planes del año.",
+        "El museo abre a las nueve y ofrece visitas guiadas cada hora.",
+    ],
+}
+
+
+def language_corpus(pages=40, seed=0):
+    # Articles from a few hundred to tens of thousands of words, some with a
+    # long passage in a second language, as on translated or quoting pages
+    rng = random.Random(seed)
+    languages = list(SENTENCES)
+    corpus = []
+    for page in range(pages):
+        language = languages[page % len(languages)]
+        sentences = [rng.choice(SENTENCES[language]) for _ in range(rng.choice([20, 200, 2000]))]
+        if page % 5 == 4:
+            other = languages[(page + 1) % len(languages)]
+            sentences += [rng.choice(SENTENCES[other]) for _ in range(len(sentences) // 4)]
+        corpus.append(" ".join(sentences))
+    return corpus
+
+
+def bench_analysis_modes(pages):
+    corpus = language_corpus(pages)
+    pa.detect_language("warm up the language profiles before timing")
+    results = {}
+    outputs = {}
+    for mode in pa.ANALYSIS_MODES:
+        start = time.process_time()
+        outputs[mode] = [pa.analyze_text(text, mode) for text in corpus]
+        results[f"{mode}_cpu_ms"] = (time.process_time() - start) * 1000
+    exact, fast = outputs["exact"], outputs["fast"]
+    results["language_agreement"] = sum(e[0] == f[0] for e, f in zip(exact, fast)) / len(corpus)
+    results["polarity_mean_abs_delta"] = sum(abs(e[1] - f[1]) for e, f in zip(exact, fast)) / len(corpus)
+    results["subjectivity_mean_abs_delta"] = sum(abs(e[2] - f[2]) for e, f in zip(exact, fast)) / len(corpus)
+    words = sum(len(text.split()) for text in corpus)
+    print(f"Language detection and sentiment ({len(corpus)} pages, {words} words, CPU time)")
+    print(f"  exact: {results['exact_cpu_ms']:8.1f} ms")
+    print(f"  fast:  {results['fast_cpu_ms']:8.1f} ms  ({results['exact_cpu_ms'] / results['fast_cpu_ms']:.1f}x)")
+    print(f"  fast vs exact: same language on {results['language_agreement']:.0%} of pages, "
+          f"mean |delta| polarity {results['polarity_mean_abs_delta']:.3f}, "
+          f"subjectivity {results['subjectivity_mean_abs_delta']:.3f}")
+    return results
+
+
+def child_peak_rss_mb():
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def timed_analysis(html, parser):
+    start = time.perf_counter()
+    pa.analyze_document("https://bench.example", html, parser)
+    return time.perf_counter() - start, child_peak_rss_mb()
+
+
+def bench_streaming(sections):
+    # Each mode runs in a fresh process so its peak RSS is not hidden by the other's
+    html = generate_page(sections).encode()
+    print(f"Tree vs event-based parsing ({len(html) / 1e6:.1f} MB HTML, full analysis, fresh process each)")
+    results = {}
+    for parser in ("lxml", pa.STREAM_PARSER):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            idle_rss = pool.submit(child_peak_rss_mb).result()
+            elapsed, peak_rss = pool.submit(timed_analysis, html, parser).result()
+        print(f"  {parser:12s} {elapsed * 1000:8.1f} ms  peak RSS +{peak_rss - idle_rss:6.0f} MB")
+        results[f"{parser}_ms"] = elapsed * 1000
+        results[f"{parser}_peak_rss_mb"] = peak_rss - idle_rss
+    return results
+
+
+def bench_parse_scaling(pages, sections):
+    url = "https://bench.example"
+    corpus = [generate_page(sections, seed=i).encode() for i in range(pages)]
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, 16, cpu_count} & set(range(1, cpu_count + 1)))
+    print(f"Parse + analyze in a process pool ({pages} pages of {len(corpus[0]) / 1e3:.0f} KB, {cpu_count} CPUs)")
+    baseline = None
+    results = {}
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            # Warm the workers up so process start-up and imports are not timed
+            list(pool.map(pa.analyze_document, [url] * workers, corpus[:workers]))
+            start = time.perf_counter()
+            list(pool.map(pa.analyze_document, [url] * pages, corpus))
+            elapsed = time.perf_counter() - start
+        throughput = pages / elapsed
+        baseline = baseline or throughput
+        print(f"  {workers:3d} workers: {throughput:7.1f} pages/s  ({throughput / baseline:4.2f}x)")
+        results[f"{workers}_workers_pages_per_second"] = throughput
+    return results
+
+
+def bench_field_profiles(sections, repeat):
+    import streamlit_app as app
+
+    url = "https://bench.example"
+    html = generate_page(sections)
+    # Warm the language profiles and the allocator up so the first profile is not penalized
+    pa.analyze_document(url, html)
+    print(f"analyze_document per field profile ({len(html) / 1e6:.1f} MB HTML, best of {repeat})")
+    results = {}
+    for profile in app.FIELD_PROFILES:
+        fields = app.field_set(profile)
+        document_fields = None if fields is None else app.resolve_fields(fields)[1]
+        totals, extraction = [], []
+        for _ in range(repeat):
+            gc.collect()
+            elapsed, (_, _, _, stages) = timed(pa.analyze_document, url, html, fields=document_fields)
+            totals.append(elapsed)
+            # Parsing and the DOM walk are shared by every profile; the rest is what a profile saves
+            extraction.append(sum(timing["wall_time"] for stage, timing in stages.items() if stage not in ("parse", "dom_walk")))
+        results[f"{profile}_ms"] = min(totals) * 1000
+        results[f"{profile}_extraction_ms"] = min(extraction) * 1000
+        print(f"  {profile:6s} {results[f'{profile}_ms']:8.1f} ms, after the DOM walk {results[f'{profile}_extraction_ms']:7.1f} ms")
+    return results
+
+
+def export_result(sections):
+    # One realistic scrape_website result; every exported page shares it
+    fields, assets, _, _ = pa.analyze_document("https://bench.example", generate_page(sections))
+    fields.update({
+        "HTTP Info": {"status_code": 200, "headers": {"Content-Type": "text/html; charset=utf-8"}, "truncated": False},
+        "HTTP Response Time": 0.05,
+        "Broken Images": assets["media"][:5],
+        "Broken Assets": {kind: urls[:5] for kind, urls in assets.items()},
+        "Page Load Time": 0.1,
+        "Score": 90,
+        "Max Score": 100,
+        "Metrics": {"stages": {"fetch": {"wall_time": 0.05}}, "requests": 3, "response_bytes": 100000}
+    })
+    return fields
+
+
+def legacy_export(scraped, extension):
+    # The old download path: the nested comparison dict through pandas, all in memory
+    import io
+
+    import pandas as pd
+
+    import streamlit_app as app
+
+    df = pd.json_normalize(app.compare_websites(scraped))
+    if extension == ".csv":
+        df.to_csv(io.StringIO(), index=False)
+    else:
+        with pd.ExcelWriter(io.BytesIO(), engine="xlsxwriter") as writer:
+            df.to_excel(writer, index=False, sheet_name="Data")
+
+
+def timed_export(mode, extension, pages, sections, directory):
+    import streamlit_app as app
+
+    result = export_result(sections)
+    idle_rss = child_peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "legacy":
+        with warnings.catch_warnings():
+            # Excel truncates long cells and warns about each one
+            warnings.simplefilter("ignore", UserWarning)
+            legacy_export({f"https://bench.example/{index}": result for index in range(pages)}, extension)
+    else:
+        records = ({"url": f"https://bench.example/{index}", "result": result} for index in range(pages))
+        app.export_records(records, os.path.join(directory, f"results{extension}"))
+    return time.perf_counter() - start, child_peak_rss_mb() - idle_rss
+
+
+def bench_exporters(pages, legacy_pages, sections):
+    # Each export runs in a fresh process so its peak RSS is its own
+    import tempfile
+
+    import streamlit_app as app
+
+    print(f"Exporters ({sections}-section pages, wall time and peak RSS growth, fresh process each)")
+    runs = [("legacy", extension, legacy_pages) for extension in (".csv", ".xlsx")]
+    runs += [("streaming", extension, count) for extension in app.EXPORT_FORMATS for count in (legacy_pages, pages)]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, extension, count in runs:
+            name = f"{mode}_{extension[1:]}_{count}"
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                try:
+                    elapsed, rss = pool.submit(timed_export, mode, extension, count, sections, directory).result()
+                except ValueError as e:
+                    # The legacy Excel export needs a column per field and page and runs out of them
+                    print(f"  {mode:9s} {extension:8s} {count:6d} pages failed: {e}")
+                    continue
+            results[f"{name}_ms"] = elapsed * 1000
+            results[f"{name}_peak_rss_mb"] = rss
+            print(f"  {mode:9s} {extension:8s} {count:6d} pages {elapsed * 1000:9.1f} ms  peak RSS +{rss:6.0f} MB")
+    return results
+
+
+def scraped_sites(count, sections=20, seed=0):
+    # count results varied around one real analysis, as the dashboard would hold them
+    base = export_result(sections)
+    rng = random.Random(seed)
+    scraped = {}
+    for index in range(count):
+        result = dict(base)
+        result["Score"] = rng.randrange(0, 101, 10)
+        result["Page Load Time"] = rng.random()
+        result["Word Count"] = rng.randint(10, 5000)
+        result["Detected Language"] = rng.choice(["en", "de", "fr", "es"])
+        result["Internal Links"] = base["Internal Links"][:rng.randint(0, len(base["Internal Links"]))]
+        scraped[f"https://site{index}.example/"] = result
+    return scraped
+
+
+def bench_dashboard(sizes):
+    # Runs the app script headless with the results already in session state
+    from streamlit.testing.v1 import AppTest
+
+    print("Comparison dashboard render time (Streamlit AppTest, first run and a rerun after changing page)")
+    results = {}
+    for count in sizes:
+        app_test = AppTest.from_file("streamlit_app.py", default_timeout=600)
+        app_test.session_state["scraped_data"] = scraped_sites(count)
+        first, _ = timed(app_test.run)
+        rerun, _ = timed(app_test.number_input(key="sites_page").set_value(min(2, math.ceil(count / 50))).run)
+        if app_test.exception:
+            raise SystemExit(f"Dashboard failed with {count} sites: {app_test.exception[0].value}")
+        results[f"{count}_sites"] = {"first_run_ms": first * 1000, "rerun_ms": rerun * 1000}
+        print(f"  {count:6d} sites  first run {first * 1000:8.1f} ms  rerun {rerun * 1000:8.1f} ms")
+    return results
+
+
+def near_duplicate_corpus(originals, variants, changed=0.01, words=300, seed=0):
+    # originals random texts, each followed by variants copies with a share of its words replaced
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(5000)]
+    corpus = []
+    for original in range(originals):
+        tokens = [rng.choice(vocabulary) for _ in range(words)]
+        corpus.append((f"https://dup.example/{original}", tokens))
+        for variant in range(variants):
+            copy = list(tokens)
+            for position in rng.sample(range(words), int(words * changed)):
+                copy[position] = rng.choice(vocabulary)
+            corpus.append((f"https://dup.example/{original}/{variant}", copy))
+    rng.shuffle(corpus)
+    return corpus
+
+
+def template_site(pages, sections=40):
+    # Pages of one site sharing a template: a marked-up menu and a cookie notice that is not
+    template = (
+        "<nav><p>menu home products pricing careers menu</p></nav>"
+        "<div class='notice'><p>cookies consent cookies privacy cookies newsletter cookies</p></div>"
+    )
+    return [generate_page(sections, seed=page).replace("<body>", "<body>" + template, 1) for page in range(pages)]
+
+
+def bench_fingerprints(sections, pages, repeat):
+    import streamlit_app as app
+
+    url = "https://bench.example"
+    html = generate_page(sections)
+    pa.analyze_document(url, html, fields=["Fingerprint"])
+    fingerprint_times = []
+    for _ in range(repeat):
+        _, (_, _, _, stages) = timed(pa.analyze_document, url, html, fields=["Fingerprint"])
+        fingerprint_times.append(stages["fingerprint"]["wall_time"])
+    results = {"fingerprint_ms": min(fingerprint_times) * 1000}
+    print(f"Fingerprint stage ({len(html) / 1e6:.1f} MB HTML, best of {repeat}): {results['fingerprint_ms']:.1f} ms")
+
+    corpus = near_duplicate_corpus(pages // 5, 4)
+    signatures = [(page_url, pa.minhash(pa.shingle_hashes(tokens, pa.TEXT_SHINGLE_SIZE))) for page_url, tokens in corpus]
+    index = app.NearDuplicateIndex()
+    lsh_time, flagged = timed(lambda: {page_url for page_url, signature in signatures if index.check(page_url, {"Fingerprint": {"minhash": signature}})})
+
+    def pairwise():
+        # Every page against every page kept before it, vectorized
+        values = np.array([np.frombuffer(bytes.fromhex(signature), dtype=np.uint32) for _, signature in signatures])
+        kept, duplicates = [], set()
+        for position, (page_url, _) in enumerate(signatures):
+            if kept and ((values[kept] == values[position]).mean(axis=1) >= app.NEAR_DUPLICATE_SIMILARITY).any():
+                duplicates.add(page_url)
+            else:
+                kept.append(position)
+        return duplicates
+
+    brute_time, expected = timed(pairwise)
+    results.update({
+        "lsh_ms": lsh_time * 1000,
+        "pairwise_ms": brute_time * 1000,
+        "recall": len(flagged & expected) / len(expected) if expected else 1.0,
+        "precision": len(flagged & expected) / len(flagged) if flagged else 1.0
+    })
+    print(f"Near-duplicate lookup over {len(signatures)} pages ({len(expected)} near duplicates)")
+    print(f"  LSH index      {results['lsh_ms']:9.1f} ms")
+    print(f"  pairwise       {results['pairwise_ms']:9.1f} ms")
+    print(f"  recall {results['recall']:.3f}, precision {results['precision']:.3f}")
+
+    site = template_site(30)
+    template_words = {"menu", "cookies", "consent", "privacy", "newsletter"}
+    for learned in (False, True):
+        boilerplate_filter = app.BoilerplateFilter() if learned else None
+        polluted = 0
+        for page, page_html in enumerate(site):
+            boilerplate = boilerplate_filter.paragraphs(url) if learned else None
+            output, _, _, _ = pa.analyze_document(url, page_html, fields=["Keyword Density", "paragraph_hashes"], boilerplate=boilerplate)
+            if learned:
+                boilerplate_filter.learn(url, output["paragraph_hashes"])
+            polluted += bool(template_words & set(output["Keyword Density"]))
+        name = "learned_boilerplate" if learned else "template_regions_only"
+        results[f"{name}_polluted_pages"] = polluted
+        print(f"  {name:22s} {polluted} of {len(site)} pages have template words among their top keywords")
+    return results
+
+
+# Libraries streamlit_app imports on first use rather than at startup
+STARTUP_DEFERRED_MODULES = ["numpy", "pandas", "pyarrow", "plotly.express", "textblob", "nltk", "langdetect", "xlsxwriter"]
+STARTUP_CASES = {
+    "streamlit": "streamlit",
+    "app": "streamlit_app",
+    # What every start paid when these were imported at module level
+    "app_eager": "streamlit_app, numpy, pandas, plotly.express, textblob.en.sentiments, langdetect, xlsxwriter"
+}
+
+
+def startup_run(modules):
+    # A fresh interpreter each time, so nothing is already in sys.modules
+    code = (
+        "import json, resource, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {modules}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "scale = 1024 * 1024 if sys.platform == 'darwin' else 1024\n"
+        "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale\n"
+        f"print(json.dumps([elapsed, rss, [name for name in {STARTUP_DEFERRED_MODULES!r} if name in sys.modules]]))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def bench_startup(repeat):
+    print(f"Cold import time and baseline RSS (fresh interpreter, best of {repeat})")
+    results = {}
+    for name, modules in STARTUP_CASES.items():
+        runs = [startup_run(modules) for _ in range(repeat)]
+        results[f"{name}_import_ms"] = min(run[0] for run in runs) * 1000
+        results[f"{name}_rss_mb"] = min(run[1] for run in runs)
+        loaded = ", ".join(runs[0][2]) or "none"
+        print(f"  {name:10s} {results[f'{name}_import_ms']:7.0f} ms  {results[f'{name}_rss_mb']:6.1f} MB  deferred libraries loaded: {loaded}")
+    return results
+
+
+def nested_page(depth=400):
+    return "<html><body>" + "<div><span>level</span>" * depth + "<p>deep text</p>" + "</div>" * depth + "</body></html>"
+
+
+def image_page(images=300):
+    tags = "".join(f'<img src="/img/{i}.png" alt="image {i}">' for i in range(images))
+    return f"<html><body><p>A gallery of pictures for the benchmark page.</p>{tags}</body></html>"
+
+
+def table_page(tables=200, rows=20):
+    table = "<table>" + "".join(f"<tr><th>row {r}</th><td>{r * 3}</td><td>value {r}</td></tr>" for r in range(rows)) + "</table>"
+    return "<html><body><p>Quarterly numbers for every region and product line.</p>" + table * tables + "</body></html>"
+
+
+def fixture_corpus():
+    # path -> (status, body, delay in seconds)
+    return {
+        "/small": (200, generate_page(5, seed=1), 0),
+        "/huge": (200, generate_page(3000, seed=2), 0),
+        "/images": (200, image_page(), 0),
+        "/tables": (200, table_page(), 0),
+        "/nested": (200, nested_page(), 0),
+        "/slow": (200, generate_page(5, seed=3), 0.3),
+        "/error": (500, "<html><body><p>Internal server error</p></body></html>", 0),
+    }
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    corpus = {}
+
+    def respond(self, send_body):
+        path = self.path.split("?", 1)[0]
+        if path == "/robots.txt":
+            status, body, delay = 200, "User-agent: *\nAllow: /\n", 0
+        elif path.startswith(("/img/", "/css/", "/js/", "/frame/", "/audio/", "/video/")):
+            status, body, delay = 200, "asset", 0
+        else:
+            status, body, delay = self.corpus.get(path, (404, "not found", 0))
+        if delay:
+            time.sleep(delay)
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if send_body:
+            try:
+                self.wfile.write(payload)
+            except ConnectionError:
+                # The client stops reading bodies past its size limit
+                pass
+
+    def do_GET(self):
+        self.respond(True)
+
+    def do_HEAD(self):
+        self.respond(False)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server():
+    FixtureHandler.corpus = fixture_corpus()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(samples):
+    return {
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p90_ms": percentile(samples, 90) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS; children are the parse workers
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return {"peak_rss_mb": own, "peak_child_rss_mb": children}
+
+
+def bench_end_to_end(requests, throughput_pages, workers):
+    import streamlit.logger as streamlit_logger
+
+    import streamlit_app as app
+
+    # The engine and caches are used outside a Streamlit session here
+    streamlit_logger.set_log_level("error")
+    server, base_url = start_fixture_server()
+    engine = app.get_engine()
+    # Politeness limits exist for real sites; against the local fixture they would only measure the throttle
+    engine.client.scheduler.requests_per_second = 0
+    engine.client.scheduler.asset_requests_per_second = 0
+    engine.client.scheduler.max_concurrency = workers
+    results = {}
+    try:
+        # Warm the parse workers and the language profiles up so they are not timed
+        app.scrape_website(f"{base_url}/small")
+
+        print(f"End to end against a local fixture server ({requests} requests per page, asset checks uncached)")
+        scraped = {}
+        for path in FixtureHandler.corpus:
+            url = f"{base_url}{path}"
+            samples = []
+            for _ in range(requests):
+                engine.head_cache.clear()
+                elapsed, scraped[url] = timed(app.scrape_website, url)
+                samples.append(elapsed)
+            summary = latency_summary(samples)
+            results[f"scrape_website{path}"] = summary
+            print(f"  {path:10s} p50 {summary['p50_ms']:8.1f} ms  p90 {summary['p90_ms']:8.1f} ms  p99 {summary['p99_ms']:8.1f} ms")
+
+        profiles = {}
+        for profile in app.FIELD_PROFILES:
+            samples = []
+            for _ in range(requests):
+                engine.head_cache.clear()
+                samples.append(timed(app.scrape_website, f"{base_url}/images", fields=profile)[0])
+            profiles[profile] = latency_summary(samples)
+            print(f"  /images --fields {profile:6s} p50 {profiles[profile]['p50_ms']:8.1f} ms")
+        results["field_profiles"] = profiles
+
+        urls = [f"{base_url}/small", f"{base_url}/tables", f"{base_url}/images"]
+        samples = []
+        for _ in range(requests):
+            engine.head_cache.clear()
+            samples.append(timed(app.analyze_urls, urls, use_cache=False)[0])
+        summary = latency_summary(samples)
+        results["analyze_urls"] = summary
+        print(f"  analyze_urls (3 URLs) p50 {summary['p50_ms']:8.1f} ms  p90 {summary['p90_ms']:8.1f} ms")
+
+        mix = [f"{base_url}{path}" for path in ("/small", "/tables", "/images", "/nested")]
+        batch = [f"{mix[i % len(mix)]}?page={i}" for i in range(throughput_pages)]
+        engine.head_cache.clear()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            elapsed, _ = timed(lambda: list(pool.map(app.scrape_website, batch)))
+        results["throughput"] = {"pages_per_second": throughput_pages / elapsed}
+        print(f"  throughput: {throughput_pages / elapsed:7.1f} pages/s ({throughput_pages} pages, {workers} threads)")
+
+        comparison = app.compare_websites(scraped)
+        exporters = {"json_ms": best_of(lambda: app.convert_to_json(comparison), 3) * 1000}
+        for extension in app.EXPORT_FORMATS:
+            exporters[f"{extension[1:]}_ms"] = best_of(lambda: app.export_download(scraped, extension), 3) * 1000
+        results["exporters"] = exporters
+        print("  exporters: " + ", ".join(f"{name[:-3]} {value:.1f} ms" for name, value in exporters.items()))
+    finally:
+        server.shutdown()
+        engine.close()
+    results["memory"] = peak_rss_mb()
+    print("  peak RSS: {peak_rss_mb:.0f} MB, parse workers {peak_child_rss_mb:.0f} MB".format(**results["memory"]))
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare_results(baseline, current, threshold):
+    # Timings, memory and deltas regress when they grow; throughputs, speedups and agreement when they shrink
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    print(f"Compared with {baseline['revision']} ({baseline['timestamp']}), regressions beyond {threshold:.0%}:")
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        if not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        higher_is_better = key.endswith(("per_second", "speedup", "agreement"))
+        regressed = -change > threshold if higher_is_better else change > threshold
+        if regressed:
+            regressions += 1
+            print(f"  {key}: {old[key]:.2f} -> {new[key]:.2f} ({change:+.0%})")
+    if not regressions:
+        print("  none")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the web scraping tool")
+    parser.add_argument("--sections", type=int, default=2000, help="Number of sections in the generated page")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed repetitions")
+    parser.add_argument("--pages", type=int, default=32, help="Number of pages in the parse scaling benchmark")
+    parser.add_argument("--page-sections", type=int, default=200, help="Number of sections per page in the parse scaling benchmark")
+    parser.add_argument("--contact-sections", type=int, default=500, help="Number of sections in the script-heavy contact extraction page")
+    parser.add_argument("--stream-sections", type=int, default=8000, help="Number of sections in the streaming benchmark page")
+    parser.add_argument("--tfidf-pages", type=int, default=5000, help="Pages in the large corpus TF-IDF benchmark")
+    parser.add_argument("--language-pages", type=int, default=40, help="Number of pages in the language and sentiment benchmark")
+    parser.add_argument("--export-pages", type=int, default=1000, help="Pages written by the streaming exporters")
+    parser.add_argument("--legacy-export-pages", type=int, default=200, help="Pages exported through both the old and the streaming path")
+    parser.add_argument("--dashboard-sites", type=int, nargs="+", default=[3, 100, 1000, 5000],
+                        help="Numbers of sites the dashboard benchmark renders")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Fresh interpreters started per case in the startup benchmark")
+    parser.add_argument("--fingerprint-pages", type=int, default=5000, help="Pages in the near-duplicate lookup benchmark")
+    parser.add_argument("--suite", nargs="+", choices=["dom", "parsers", "contact", "text", "language", "streaming", "scaling", "profiles", "export", "dashboard", "fingerprints", "startup", "e2e"],
+                        default=["dom", "parsers", "contact", "text", "language", "streaming", "scaling", "profiles", "export", "dashboard", "fingerprints", "startup", "e2e"], help="Benchmarks to run")
+    parser.add_argument("--requests", type=int, default=5, help="Requests per fixture page in the end-to-end benchmark")
+    parser.add_argument("--throughput-pages", type=int, default=40, help="Pages scraped concurrently in the throughput benchmark")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent scrape_website calls in the throughput benchmark")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON from an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change reported as a regression (default: 0.1)")
+    args = parser.parse_args()
+
+    results = {}
+    if "dom" in args.suite:
+        results["dom_extraction"] = bench_dom_extraction(args.sections, args.repeat)
+    if "parsers" in args.suite:
+        results["parsers"] = bench_parsers(args.repeat)
+    if "contact" in args.suite:
+        results["contact_extraction"] = bench_contact_extraction(args.contact_sections, args.repeat)
+    if "text" in args.suite:
+        results["text_analytics"] = bench_text_analytics(args.sections, args.repeat, args.tfidf_pages)
+    if "language" in args.suite:
+        results["analysis_modes"] = bench_analysis_modes(args.language_pages)
+    if "streaming" in args.suite:
+        results["streaming"] = bench_streaming(args.stream_sections)
+    if "scaling" in args.suite:
+        results["parse_scaling"] = bench_parse_scaling(args.pages, args.page_sections)
+    if "profiles" in args.suite:
+        results["field_profiles"] = bench_field_profiles(args.sections, args.repeat)
+    if "export" in args.suite:
+        results["exporters"] = bench_exporters(args.export_pages, args.legacy_export_pages, args.page_sections)
+    if "dashboard" in args.suite:
+        results["dashboard"] = bench_dashboard(args.dashboard_sites)
+    if "fingerprints" in args.suite:
+        results["fingerprints"] = bench_fingerprints(args.sections, args.fingerprint_pages, args.repeat)
+    if "startup" in args.suite:
+        results["startup"] = bench_startup(args.startup_runs)
+    if "e2e" in args.suite:
+        results["end_to_end"] = bench_end_to_end(args.requests, args.throughput_pages, args.workers)
+
+    run = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "results": results
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"Results written to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_results(baseline, run, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
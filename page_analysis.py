@@ -0,0 +1,1049 @@
+import contextlib
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict, deque
+from urllib.parse import unquote
+
+from bs4 import BeautifulSoup, Comment, FeatureNotFound, Tag
+from bs4.dammit import EncodingDetector
+from bs4.element import NavigableString, PreformattedString
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# numpy, langdetect and textblob (which loads nltk) are imported by the
+# functions that use them, so importing this module stays fast and a
+# process only loads the analysis libraries it actually runs.
+
+def detect_language(text):
+    if not text or len(text.split()) < 3:
+        return "Insufficient text for detection"
+    from langdetect import DetectorFactory, LangDetectException, detect
+
+    DetectorFactory.seed = 0
+    try:
+        return detect(text)
+    except LangDetectException:
+        return "Detection failed"
+
+def extract_meta_tags(soup):
+    meta_info = {}
+    for tag in soup.find_all("meta"):
+        if tag.get("name"):
+            meta_info[tag.get("name")] = tag.get("content")
+        elif tag.get("property"):
+            meta_info[tag.get("property")] = tag.get("content")
+    return meta_info
+
+def extract_links(url, soup):
+    internal_links, external_links = [], []
+    for link in soup.find_all("a", href=True):
+        if link["href"].startswith("http"):
+            if url in link["href"]:
+                internal_links.append(link["href"])
+            else:
+                external_links.append(link["href"])
+    return internal_links, external_links
+
+def extract_json_ld(soup):
+    json_ld_data = []
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            json_ld_data.append(json.loads(script.string))
+        except json.JSONDecodeError:
+            continue
+    return json_ld_data
+
+def form_to_dict(form):
+    form_data = {
+        "action": form.get("action"),
+        "method": form.get("method"),
+        "inputs": []
+    }
+    for input_tag in form.find_all("input"):
+        input_data = {
+            "type": input_tag.get("type"),
+            "name": input_tag.get("name"),
+            "value": input_tag.get("value")
+        }
+        form_data["inputs"].append(input_data)
+    return form_data
+
+def extract_forms(soup):
+    return [form_to_dict(form) for form in soup.find_all("form")]
+
+def extract_scripts_and_tracking(soup):
+    tracking_scripts = []
+    for script in soup.find_all("script"):
+        src = script.get("src")
+        if src:
+            if "analytics" in src or "tracking" in src:
+                tracking_scripts.append(src)
+    return tracking_scripts
+
+def extract_media(soup):
+    media_data = []
+    images = [{"src": img.get("src"), "alt": img.get("alt", "No alt text")} for img in soup.find_all("img", src=True)]
+    media_data.extend(images)
+    videos = [{"src": video.get("src")} for video in soup.find_all("video", src=True)]
+    media_data.extend(videos)
+    return media_data
+
+def extract_comments(soup):
+    comments = []
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comments.append(comment)
+    return comments
+
+def extract_tables(soup):
+    tables = []
+    for table in soup.find_all("table"):
+        table_data = [[cell.get_text() for cell in row.find_all(["th", "td"])] for row in table.find_all("tr")]
+        tables.append(table_data)
+    return tables
+
+def extract_headings(soup):
+    headings = {}
+    for level in range(1, 7):
+        headings[f"h{level}"] = [h.get_text() for h in soup.find_all(f"h{level}")]
+    return headings
+
+def extract_social_media_links(external_links):
+    social_links = []
+    social_media_domains = ["facebook", "twitter", "instagram", "linkedin", "youtube"]
+    for link in external_links:
+        if any(domain in link for domain in social_media_domains):
+            social_links.append(link)
+    return social_links
+
+def extract_audio_files(soup):
+    audio_files = []
+    for audio in soup.find_all("audio"):
+        src = audio.get("src")
+        if src:
+            audio_files.append(src)
+    return audio_files
+
+def extract_stylesheets(soup):
+    stylesheets = []
+    for link in soup.find_all("link", rel="stylesheet"):
+        href = link.get("href")
+        if href:
+            stylesheets.append(href)
+    return stylesheets
+
+def extract_iframes(soup):
+    iframes = []
+    for iframe in soup.find_all("iframe"):
+        src = iframe.get("src")
+        if src:
+            iframes.append(src)
+    return iframes
+
+def extract_external_js(soup):
+    external_js = []
+    for script in soup.find_all("script", src=True):
+        external_js.append(script.get("src"))
+    return external_js
+
+def extract_meta_keywords(soup):
+    meta_keywords = []
+    meta_tags = soup.find_all("meta", {"name": "keywords"})
+    for meta_tag in meta_tags:
+        if meta_tag.get("content"):
+            meta_keywords.extend(meta_tag["content"].split(","))
+    return meta_keywords
+
+def extract_contact_info(soup, contact_forms=None):
+    contact_info = {
+        "emails": [],
+        "phone_numbers": [],
+        "contact_forms": []
+    }
+    markup = str(soup)
+
+    emails = set(re.findall(r'mailto:([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', markup))
+    contact_info["emails"] = list(emails)
+
+    phone_numbers = set(re.findall(r'(\+?\(?\d{1,4}\)?[\s\-]?\d{1,3}[\s\-]?\d{3}[\s\-]?\d{4})', markup))
+    contact_info["phone_numbers"] = list(phone_numbers)
+
+    if contact_forms is not None:
+        contact_info["contact_forms"] = list(contact_forms)
+    else:
+        for form in soup.find_all("form"):
+            action = form.get("action", "").lower()
+            if "contact" in action:
+                contact_info["contact_forms"].append(form_to_dict(form))
+
+    return contact_info
+
+# Contact details come from visible text and mailto:/tel: links only, never
+# from scripts or styles, whose long digit runs used to pass for phone numbers.
+EMAIL_PATTERN = re.compile(r"(?<![\w.%+-])[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}(?![\w-])")
+# Same shape as the old pattern, plus an optional "+1 " style country code and
+# "(555) 123-4567" style numbers; the area code is optional, so numbers start
+# at PHONE_MIN_DIGITS digits ("867-5309"). Separators
+# never span a line break (text nodes are joined with newlines), and the number cannot
+# be part of a longer run of digits or digit groups.
+PHONE_PATTERN = re.compile(
+    r"(?<![\w+])(?<!\d[ .\-])(?:\+\d{1,3}[ .\-]?)?(?:\(?\d{1,4}\)?[ .\-]?)?(?:\d{1,3}[ .\-]?)?\d{3}[ .\-]?\d{4}(?![\w+]|[ .\-]\d)"
+)
+PHONE_MIN_DIGITS = 7
+PHONE_MAX_DIGITS = 15
+# Digit runs written without separators or a + are only taken for phone numbers
+# at these lengths (a national number with its area code); others are more likely IDs or dates
+PHONE_PLAIN_DIGITS = range(10, 12)
+NON_DIGITS = re.compile(r"\D")
+
+def normalize_email(email):
+    local, _, domain = email.strip().partition("@")
+    if not EMAIL_PATTERN.fullmatch(f"{local}@{domain}"):
+        return None
+    return f"{local}@{domain.lower()}"
+
+def normalize_phone(number):
+    # E.164-style: digits only, keeping a leading + for international numbers
+    digits = NON_DIGITS.sub("", number)
+    if not PHONE_MIN_DIGITS <= len(digits) <= PHONE_MAX_DIGITS or len(set(digits)) == 1:
+        return None
+    return "+" + digits if number.strip().startswith("+") else digits
+
+def merge_phone_numbers(numbers):
+    # One entry per number. "+1 555 867 5309", "1-555-867-5309" and "(555) 867-5309"
+    # normalize to digit strings that differ only in a leading +, a country code of
+    # up to 3 digits or a national trunk 0; the longest form, + first, is kept.
+    by_digits = {}
+    for number in numbers:
+        digits = number.lstrip("+")
+        if number.startswith("+") or digits not in by_digits:
+            by_digits[digits] = number
+    shorter_forms = set()
+    for digits in by_digits:
+        shorter_forms.update(digits[cut:] for cut in range(1, 4))
+        shorter_forms.update("0" + digits[cut:] for cut in range(2, 4))
+    return {number for digits, number in by_digits.items() if digits not in shorter_forms}
+
+def extract_contact_details(text_nodes, hrefs, contact_forms):
+    emails, phone_numbers = set(), set()
+    text = "\n".join(text_nodes)
+    for match in EMAIL_PATTERN.findall(text):
+        emails.add(normalize_email(match))
+    for match in PHONE_PATTERN.findall(text):
+        if match.isdigit() and len(match) not in PHONE_PLAIN_DIGITS:
+            continue
+        phone_numbers.add(normalize_phone(match))
+    for href in hrefs:
+        scheme, _, target = href.strip().partition(":")
+        scheme = scheme.lower()
+        if scheme == "mailto":
+            for address in unquote(target.split("?", 1)[0]).split(","):
+                emails.add(normalize_email(address))
+        elif scheme == "tel":
+            phone_numbers.add(normalize_phone(unquote(target)))
+    emails.discard(None)
+    phone_numbers.discard(None)
+    return {
+        "emails": sorted(emails),
+        "phone_numbers": sorted(merge_phone_numbers(phone_numbers)),
+        "contact_forms": list(contact_forms)
+    }
+
+def analyze_word_count_and_density(content):
+    words = content.split()
+    word_count = len(words)
+    keyword_density = {}
+    for word in words:
+        word = word.lower()
+        if word in keyword_density:
+            keyword_density[word] += 1
+        else:
+            keyword_density[word] = 1
+    for word in keyword_density:
+        keyword_density[word] = (keyword_density[word] / word_count) * 100
+    return word_count, keyword_density
+
+# Keyword analytics: words are runs of letters, lowercased, with English
+# stopwords left out of the keyword and bigram rankings. Only the top
+# KEYWORD_TOP_K entries are kept per page.
+KEYWORD_TOP_K = 25
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+")
+ASCII_NON_LETTERS = str.maketrans({code: " " for code in range(128) if not chr(code).isalpha()})
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing don down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just ll let m me more
+most my myself no nor not now of off on once only or other our ours ourselves out over own re s same she
+should so some such t than that the their theirs them themselves then there these they this those
+through to too under until up us ve very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+""".split())
+
+def tokenize(text):
+    text = text.lower()
+    if text.isascii():
+        # Same tokens as TOKEN_PATTERN, several times faster
+        return text.translate(ASCII_NON_LETTERS).split()
+    return TOKEN_PATTERN.findall(text)
+
+def analyze_keywords(content, top_k=KEYWORD_TOP_K):
+    # Returns the word count, the top_k keywords and the top_k bigrams, each
+    # with its share of all words in percent. Words become integer ids in
+    # order of first use, so both rankings are counted with numpy and ties
+    # keep that order.
+    import numpy as np
+
+    tokens = tokenize(content)
+    word_count = len(tokens)
+    if not word_count:
+        return 0, {}, {}
+    index = {word: position for position, word in enumerate(dict.fromkeys(tokens))}
+    vocabulary = list(index)
+    ids = np.fromiter(map(index.__getitem__, tokens), dtype=np.int64, count=word_count)
+    is_stopword = np.fromiter((word in STOPWORDS for word in vocabulary), dtype=bool, count=len(vocabulary))
+
+    counts = np.bincount(ids, minlength=len(vocabulary))
+    counts[is_stopword] = 0
+    top = np.argsort(-counts, kind="stable")[:top_k]
+    keywords = {
+        vocabulary[word]: count / word_count * 100
+        for word, count in zip(top.tolist(), counts[top].tolist()) if count
+    }
+
+    # Every adjacent pair becomes one integer code, counted with a single np.unique
+    first, second = ids[:-1], ids[1:]
+    keep = ~(is_stopword[first] | is_stopword[second])
+    codes, counts = np.unique(first[keep] * len(vocabulary) + second[keep], return_counts=True)
+    top = np.argsort(-counts, kind="stable")[:top_k]
+    bigrams = {
+        f"{vocabulary[code // len(vocabulary)]} {vocabulary[code % len(vocabulary)]}": count / word_count * 100
+        for code, count in zip(codes[top].tolist(), counts[top].tolist())
+    }
+    return word_count, keywords, bigrams
+
+# TF-IDF over the "Keyword Density" of a set of pages. Terms are weighted by
+# smoothed IDF across the pages and each page's weights are L2-normalized.
+# Pages only carry their top keywords, so a term outside a page's top list
+# counts as absent from it. Weights are computed one page at a time from the
+# document frequencies, so memory grows with the vocabulary, not pages x terms.
+def document_frequencies(keyword_densities):
+    # keyword_densities is an iterable of per-page "Keyword Density" dicts
+    frequencies = Counter()
+    pages = 0
+    for densities in keyword_densities:
+        frequencies.update(densities.keys())
+        pages += 1
+    return frequencies, pages
+
+def tfidf_weights(densities, frequencies, pages, top_k=10):
+    weights = {
+        term: density / 100 * (math.log((1 + pages) / (1 + frequencies[term])) + 1)
+        for term, density in densities.items()
+    }
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    if not norm:
+        return {}
+    top = sorted(weights.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return {term: weight / norm for term, weight in top if weight > 0}
+
+def corpus_tfidf(keyword_densities, top_k=10):
+    # keyword_densities maps each URL to its "Keyword Density"
+    frequencies, pages = document_frequencies(keyword_densities.values())
+    return {url: tfidf_weights(densities, frequencies, pages, top_k) for url, densities in keyword_densities.items()}
+
+# TextBlob's default analyzer, built once per process, on first use, instead of once per page
+SENTIMENT_ANALYZER = None
+
+def analyze_sentiment(content):
+    global SENTIMENT_ANALYZER
+    if SENTIMENT_ANALYZER is None:
+        from textblob.en.sentiments import PatternAnalyzer
+
+        SENTIMENT_ANALYZER = PatternAnalyzer()
+    sentiment = SENTIMENT_ANALYZER.analyze(content)
+    return sentiment.polarity, sentiment.subjectivity
+
+# "exact" (the default) runs language detection and sentiment over the whole
+# page text. "fast" runs them over evenly spaced samples of it, which bounds
+# their cost on long articles; benchmark.py --suite language reports the
+# accuracy delta.
+ANALYSIS_MODES = ["exact", "fast"]
+ANALYSIS_MODE = os.environ.get("SCRAPER_ANALYSIS_MODE", "exact")
+LANGUAGE_SAMPLE_CHARS = 2000
+SENTIMENT_SAMPLE_CHARS = 20000
+SAMPLE_WINDOWS = 4
+
+def sample_text(text, max_chars, windows=SAMPLE_WINDOWS):
+    # Windows spread over the whole text, cut at spaces, so one long intro or footer does not decide alone
+    if len(text) <= max_chars:
+        return text
+    size = max_chars // windows
+    step = (len(text) - size) / (windows - 1)
+    parts = []
+    for window in range(windows):
+        start = int(window * step)
+        chunk = text[start:start + size]
+        if start and " " in chunk:
+            chunk = chunk.partition(" ")[2]
+        if start + size < len(text) and " " in chunk:
+            chunk = chunk.rpartition(" ")[0]
+        parts.append(chunk)
+    return " ".join(parts)
+
+def analysis_text(text, mode, sample_chars):
+    # The text language detection or sentiment looks at in the given mode
+    mode = mode or ANALYSIS_MODE
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    return sample_text(text, sample_chars) if mode == "fast" else text
+
+def analyze_language(text, mode=None):
+    return detect_language(analysis_text(text, mode, LANGUAGE_SAMPLE_CHARS))
+
+def analyze_text_sentiment(text, mode=None):
+    # Returns (polarity, subjectivity)
+    return analyze_sentiment(analysis_text(text, mode, SENTIMENT_SAMPLE_CHARS))
+
+def analyze_text(text, mode=None):
+    # Returns (language, sentiment polarity, sentiment subjectivity)
+    polarity, subjectivity = analyze_text_sentiment(text, mode)
+    return analyze_language(text, mode), polarity, subjectivity
+
+# Page fingerprints for near-duplicate detection: 64-bit SimHashes of the
+# text's word shingles and of the tag sequence, and a MinHash signature of
+# the text shingles that estimates Jaccard similarity. Every hash is stable
+# across processes and runs, so signatures can be stored and compared later.
+TEXT_SHINGLE_SIZE = 5
+STRUCTURE_SHINGLE_SIZE = 4
+MINHASH_PERMUTATIONS = 64
+FINGERPRINT_CHUNK = 4096
+# Multiply-shift hash functions (a * x + b) >> 32 with odd a, on wrapping uint64; see minhash_parameters
+MINHASH_PARAMETERS = None
+
+def minhash_parameters():
+    global MINHASH_PARAMETERS
+    if MINHASH_PARAMETERS is None:
+        import numpy as np
+
+        a, b = np.random.default_rng(1).integers(0, 1 << 63, (2, MINHASH_PERMUTATIONS), dtype=np.uint64) * np.uint64(2)
+        MINHASH_PARAMETERS = a | np.uint64(1), b
+    return MINHASH_PARAMETERS
+
+def stable_hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+def paragraph_hash(paragraph):
+    return stable_hash64(" ".join(paragraph.lower().split()))
+
+def mix64(values):
+    # splitmix64 finalizer; uint64 arithmetic wraps around
+    import numpy as np
+
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+def shingle_hashes(items, size):
+    # One 64-bit hash per run of size consecutive items. Each distinct item
+    # is hashed once; runs are combined with vectorized mixing.
+    import numpy as np
+
+    if not items:
+        return np.empty(0, dtype=np.uint64)
+    codes = {}
+    ids = np.fromiter((codes.setdefault(item, len(codes)) for item in items), dtype=np.int64, count=len(items))
+    item_hashes = np.fromiter(map(stable_hash64, codes), dtype=np.uint64, count=len(codes))[ids]
+    count = len(items) - min(size, len(items)) + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for offset in range(min(size, len(items))):
+        combined = mix64(combined ^ item_hashes[offset:offset + count])
+    return combined
+
+def simhash(hashes):
+    # Bit i of the result is set when most hashes have bit i set
+    import numpy as np
+
+    votes = np.zeros(64, dtype=np.int64)
+    for start in range(0, len(hashes), FINGERPRINT_CHUNK):
+        chunk = hashes[start:start + FINGERPRINT_CHUNK].astype("<u8").view(np.uint8)
+        votes += np.unpackbits(chunk.reshape(-1, 8), axis=1, bitorder="little").sum(axis=0, dtype=np.int64)
+    return sum(1 << int(bit) for bit in np.flatnonzero(votes * 2 > len(hashes)))
+
+def minhash(hashes):
+    # Hex of MINHASH_PERMUTATIONS 32-bit minimums, or None for a page without text
+    import numpy as np
+
+    values = np.unique(hashes)
+    if not len(values):
+        return None
+    a, b = minhash_parameters()
+    signature = np.full(MINHASH_PERMUTATIONS, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(values), FINGERPRINT_CHUNK):
+        chunk = values[start:start + FINGERPRINT_CHUNK, None]
+        signature = np.minimum(signature, (chunk * a + b).min(axis=0))
+    return (signature >> np.uint64(32)).astype(">u4").tobytes().hex()
+
+def check_viewport_meta(soup):
+    viewport = soup.find("meta", attrs={"name": "viewport"})
+    return viewport["content"] if viewport else "Not found"
+
+def extract_canonical_link(soup):
+    canonical = soup.find("link", rel="canonical")
+    return canonical["href"] if canonical else "Not found"
+
+def check_favicon(soup):
+    favicon = soup.find("link", rel="icon")
+    return favicon["href"] if favicon else "Not found"
+
+def extract_schema_markup(soup):
+    schema_data = []
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            schema_data.append(json.loads(script.string))
+        except json.JSONDecodeError:
+            continue
+    return schema_data
+
+# Single-pass DOM extraction: every tag handler below is registered for the
+# tag names it cares about, and walk_dom visits the tree exactly once,
+# dispatching each element to its handlers. The per-function extract_*
+# helpers above are kept as the reference implementation.
+TAG_HANDLERS = defaultdict(list)
+
+def tag_handler(*names):
+    def decorator(func):
+        for name in names:
+            TAG_HANDLERS[name].append(func)
+        return func
+    return decorator
+
+def attr_matches(tag, attr, value):
+    # Mirrors BeautifulSoup's matching rules for multi-valued attributes such as rel
+    actual = tag.get(attr)
+    if isinstance(actual, list):
+        return value in actual or " ".join(actual) == value
+    return actual == value
+
+def new_dom_state(url):
+    return {
+        "url": url,
+        "meta_tags": {},
+        "meta_keywords": [],
+        "viewport": None,
+        "paragraphs": [],
+        "template_paragraphs": [],
+        "tags": [],
+        "internal_links": [],
+        "external_links": [],
+        "hrefs": [],
+        "text_nodes": [],
+        "json_ld": [],
+        "forms": [],
+        "contact_forms": [],
+        "tracking_scripts": [],
+        "external_js": [],
+        "images": [],
+        "videos": [],
+        "comments": [],
+        "tables": [],
+        "headings": {f"h{level}": [] for level in range(1, 7)},
+        "audio_files": [],
+        "stylesheets": [],
+        "iframes": [],
+        "canonical": None,
+        "favicon": None,
+    }
+
+@tag_handler("meta")
+def visit_meta(tag, state):
+    if tag.get("name"):
+        state["meta_tags"][tag.get("name")] = tag.get("content")
+    elif tag.get("property"):
+        state["meta_tags"][tag.get("property")] = tag.get("content")
+    if tag.get("name") == "keywords" and tag.get("content"):
+        state["meta_keywords"].extend(tag["content"].split(","))
+    if state["viewport"] is None and tag.get("name") == "viewport":
+        state["viewport"] = tag["content"]
+
+# Page template regions; their paragraphs are left out of the text analytics
+TEMPLATE_CONTAINERS = ["nav", "header", "footer", "aside"]
+
+@tag_handler("p")
+def visit_paragraph(tag, state):
+    if tag.find_parent(TEMPLATE_CONTAINERS) is not None:
+        state["template_paragraphs"].append(len(state["paragraphs"]))
+    state["paragraphs"].append(tag.get_text())
+
+@tag_handler("a")
+def visit_anchor(tag, state):
+    href = tag.get("href")
+    if href is not None:
+        state["hrefs"].append(href)
+    if href is not None and href.startswith("http"):
+        if state["url"] in href:
+            state["internal_links"].append(href)
+        else:
+            state["external_links"].append(href)
+
+@tag_handler("script")
+def visit_script(tag, state):
+    if tag.get("type") == "application/ld+json":
+        try:
+            state["json_ld"].append(json.loads(tag.string))
+        except json.JSONDecodeError:
+            pass
+    src = tag.get("src")
+    if src is not None:
+        state["external_js"].append(src)
+        if "analytics" in src or "tracking" in src:
+            state["tracking_scripts"].append(src)
+
+@tag_handler("form")
+def visit_form(tag, state):
+    form_data = form_to_dict(tag)
+    state["forms"].append(form_data)
+    if "contact" in tag.get("action", "").lower():
+        state["contact_forms"].append(form_data)
+
+@tag_handler("img")
+def visit_image(tag, state):
+    if tag.get("src") is not None:
+        state["images"].append({"src": tag.get("src"), "alt": tag.get("alt", "No alt text")})
+
+@tag_handler("video")
+def visit_video(tag, state):
+    if tag.get("src") is not None:
+        state["videos"].append({"src": tag.get("src")})
+
+@tag_handler("table")
+def visit_table(tag, state):
+    state["tables"].append(
+        [[cell.get_text() for cell in row.find_all(["th", "td"])] for row in tag.find_all("tr")]
+    )
+
+@tag_handler("h1", "h2", "h3", "h4", "h5", "h6")
+def visit_heading(tag, state):
+    state["headings"][tag.name].append(tag.get_text())
+
+@tag_handler("audio")
+def visit_audio(tag, state):
+    if tag.get("src"):
+        state["audio_files"].append(tag.get("src"))
+
+@tag_handler("iframe")
+def visit_iframe(tag, state):
+    if tag.get("src"):
+        state["iframes"].append(tag.get("src"))
+
+@tag_handler("link")
+def visit_link(tag, state):
+    if attr_matches(tag, "rel", "stylesheet") and tag.get("href"):
+        state["stylesheets"].append(tag.get("href"))
+    if state["canonical"] is None and attr_matches(tag, "rel", "canonical"):
+        state["canonical"] = tag["href"]
+    if state["favicon"] is None and attr_matches(tag, "rel", "icon"):
+        state["favicon"] = tag["href"]
+
+# Text directly inside these tags is code, not visible text
+HIDDEN_TEXT_PARENTS = {"script", "style", "template"}
+
+def walk_dom(url, soup):
+    state = new_dom_state(url)
+    handlers = TAG_HANDLERS
+    text_nodes = state["text_nodes"]
+    tags = state["tags"]
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            tags.append(node.name)
+            for handler in handlers.get(node.name, ()):
+                handler(node, state)
+        elif isinstance(node, Comment):
+            state["comments"].append(node)
+        elif isinstance(node, NavigableString) and not isinstance(node, PreformattedString):
+            if node.parent.name not in HIDDEN_TEXT_PARENTS:
+                text_nodes.append(node)
+    return state
+
+# Tree builders walk_dom can run on. lxml is C-backed and much faster;
+# html.parser is pure Python and always available. Set SCRAPER_PARSER to
+# pin one (e.g. html.parser in tests).
+PARSER_BACKENDS = ["lxml", "html.parser"]
+# Bump when analyze_document's output changes, so cached and stored analyses are redone
+ANALYSIS_VERSION = 3
+DEFAULT_PARSER = os.environ.get("SCRAPER_PARSER", "lxml")
+
+def available_parsers():
+    parsers = []
+    for parser in PARSER_BACKENDS:
+        try:
+            BeautifulSoup("", parser)
+        except FeatureNotFound:
+            continue
+        parsers.append(parser)
+    return parsers
+
+def parse_html(content, parser=None):
+    parser = parser or DEFAULT_PARSER
+    if parser not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {parser}")
+    try:
+        return BeautifulSoup(content, parser)
+    except FeatureNotFound:
+        return BeautifulSoup(content, "html.parser")
+
+# Event-based parsing: lxml's pull parser is fed the body in chunks and the
+# same tag handlers consume each element once it is complete. Elements are
+# then dropped from the tree, so memory follows the largest element still
+# needed by a handler (a table, a form, a paragraph) instead of the page.
+# Used for SCRAPER_PARSER=lxml-stream and for any body over
+# STREAM_PARSE_THRESHOLD bytes.
+STREAM_PARSER = "lxml-stream"
+STREAM_PARSE_THRESHOLD = int(os.environ.get("SCRAPER_STREAM_THRESHOLD", 5 * 1024 * 1024))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Attributes BeautifulSoup splits into lists; StreamTag does the same so handlers see identical values
+MULTI_VALUED_ATTRIBUTES = {"class", "rel", "rev", "accept-charset", "headers", "accesskey", "dropzone"}
+# BeautifulSoup turns whitespace-only strings into a single space or newline, except under these tags
+PRESERVE_WHITESPACE_TAGS = ("pre", "textarea")
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+def soup_string(text, parent):
+    # text as BeautifulSoup would store it inside parent
+    if text.strip(ASCII_SPACES) or parent.tag in PRESERVE_WHITESPACE_TAGS:
+        return text
+    for _ in parent.iterancestors(*PRESERVE_WHITESPACE_TAGS):
+        return text
+    return "\n" if "\n" in text else " "
+
+class StreamTag:
+    # The subset of the bs4 Tag interface the tag handlers use, over an lxml element
+    def __init__(self, element):
+        self.element = element
+        self.name = element.tag
+
+    def get(self, attr, default=None):
+        value = self.element.get(attr)
+        if value is None:
+            return default
+        return value.split() if attr in MULTI_VALUED_ATTRIBUTES else value
+
+    def __getitem__(self, attr):
+        value = self.get(attr)
+        if value is None:
+            raise KeyError(attr)
+        return value
+
+    @property
+    def string(self):
+        return self.element.text if len(self.element) == 0 else None
+
+    def get_text(self):
+        # Like bs4, leaves out comments and text inside HIDDEN_TEXT_PARENTS, keeping their tails
+        for _ in self.element.iterancestors("template"):
+            # bs4 stores every string under a <template> as a TemplateString, which get_text skips
+            return ""
+        parts = []
+        stack = [self.element]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+            elif isinstance(item.tag, str) and item.tag not in HIDDEN_TEXT_PARENTS:
+                if item.text:
+                    parts.append(soup_string(item.text, item))
+                for child in reversed(item):
+                    if child.tail:
+                        stack.append(soup_string(child.tail, item))
+                    stack.append(child)
+        return "".join(parts)
+
+    def find_all(self, names):
+        names = [names] if isinstance(names, str) else names
+        return [StreamTag(element) for element in self.element.iterdescendants(*names)]
+
+    def find_parent(self, names):
+        names = [names] if isinstance(names, str) else names
+        for element in self.element.iterancestors(*names):
+            return StreamTag(element)
+        return None
+
+def sniff_encoding(content):
+    # The encoding BeautifulSoup would pick for most pages: byte order mark, then <meta charset>, then UTF-8
+    sample, bom_encoding = EncodingDetector.strip_byte_order_mark(content[:STREAM_CHUNK_SIZE])
+    return bom_encoding or EncodingDetector.find_declared_encoding(sample, is_html=True) or "utf-8"
+
+def stream_dom(url, content, encoding=None):
+    # Same result as walk_dom(url, parse_html(content, "lxml")), without building the whole tree
+    encoding = encoding or sniff_encoding(content)
+    # huge_tree lifts libxml2's nesting limit, which BeautifulSoup's own tree does not have
+    events = ("start", "end", "comment")
+    try:
+        parser = etree.HTMLPullParser(events=events, encoding=encoding, huge_tree=True)
+    except LookupError:
+        parser = etree.HTMLPullParser(events=events, encoding="utf-8", huge_tree=True)
+    state = new_dom_state(url)
+    handlers = TAG_HANDLERS
+    text_nodes = state["text_nodes"]
+    # Handled elements in document order, so results come out in the order walk_dom produces them
+    pending = deque()
+    open_entries = {}
+
+    def collect_text(text, parent):
+        if text and parent.tag not in HIDDEN_TEXT_PARENTS:
+            text_nodes.append(soup_string(text, parent))
+
+    def consume():
+        for event, element in parser.read_events():
+            if event == "comment":
+                state["comments"].append(element.text or "")
+            elif event == "start":
+                state["tags"].append(element.tag)
+                if element.tag in handlers:
+                    entry = [element, False]
+                    pending.append(entry)
+                    open_entries[element] = entry
+            else:
+                # An element's own text and its children's tails are complete once it ends.
+                # Tails of children dropped earlier were collected when they were dropped.
+                collect_text(element.text, element)
+                for child in element:
+                    collect_text(child.tail, element)
+                entry = open_entries.pop(element, None)
+                if entry is not None:
+                    entry[1] = True
+                while pending and pending[0][1]:
+                    done = pending.popleft()[0]
+                    tag = StreamTag(done)
+                    for handler in handlers[done.tag]:
+                        handler(tag, state)
+                if not pending:
+                    # No open element still needs this subtree; its tail is still owed to the parent
+                    element.clear(keep_tail=True)
+                    parent = element.getparent()
+                    while parent is not None and element.getprevious() is not None:
+                        collect_text(parent[0].tail, parent)
+                        del parent[0]
+
+    view = memoryview(content)
+    for start in range(0, len(content), STREAM_CHUNK_SIZE):
+        parser.feed(bytes(view[start:start + STREAM_CHUNK_SIZE]))
+        consume()
+    parser.close()
+    consume()
+    return state
+
+def use_stream_parser(content, parser):
+    return etree is not None and (parser == STREAM_PARSER or len(content) > STREAM_PARSE_THRESHOLD)
+
+@contextlib.contextmanager
+def timed_stage(stages, name, cpu=True):
+    # Adds the wall time (and CPU time of the calling thread) spent in the block to stages[name]
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        stage = stages.setdefault(name, {"wall_time": 0.0, "cpu_time": 0.0} if cpu else {"wall_time": 0.0})
+        stage["wall_time"] += time.perf_counter() - wall_start
+        if cpu:
+            stage["cpu_time"] += time.thread_time() - cpu_start
+
+# Extractor registry: every value analyze_document can produce is registered
+# under a name with the names of the values it reads, and is computed on
+# first use, so a caller asking for a few fields only pays for those and
+# their dependencies. "url", "dom", "mode" and "boilerplate" are given; lowercase names are
+# intermediate values shared by several fields.
+EXTRACTORS = {}
+DOCUMENT_FIELDS = []
+
+def extractor(name, *requires, stage=None, field=True):
+    def decorator(func):
+        EXTRACTORS[name] = (func, requires, stage)
+        if field:
+            DOCUMENT_FIELDS.append(name)
+        return func
+    return decorator
+
+def dom_field(name, key, default=None):
+    # Fields read straight off the DOM walk
+    def read(dom):
+        value = dom[key]
+        return default if value is None else value
+    extractor(name, "dom")(read)
+
+class LazyPage:
+    # Memoized extractor values of one page
+    def __init__(self, stages, **given):
+        self.values = given
+        self.stages = stages
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            func, requires, stage = EXTRACTORS[name]
+            inputs = [self[dependency] for dependency in requires]
+            if stage is None:
+                self.values[name] = func(*inputs)
+            else:
+                with timed_stage(self.stages, stage):
+                    self.values[name] = func(*inputs)
+        return self.values[name]
+
+@extractor("paragraph_hashes", "dom", field=False)
+def paragraph_hashes(dom):
+    return [paragraph_hash(paragraph) for paragraph in dom["paragraphs"]]
+
+@extractor("page_paragraphs", "dom", stage="boilerplate", field=False)
+def page_paragraphs(dom):
+    # Paragraphs outside template regions (navigation, header, footer, sidebars)
+    skipped = set(dom["template_paragraphs"])
+    return [paragraph for position, paragraph in enumerate(dom["paragraphs"]) if position not in skipped]
+
+@extractor("content_paragraphs", "page_paragraphs", "boilerplate", stage="boilerplate", field=False)
+def content_paragraphs(paragraphs, boilerplate):
+    # Also drops the paragraphs the caller knows to repeat across the site, by paragraph_hash
+    if not boilerplate:
+        return paragraphs
+    return [paragraph for paragraph in paragraphs if paragraph_hash(paragraph) not in boilerplate]
+
+@extractor("text", "content_paragraphs", field=False)
+def page_text(paragraphs):
+    return " ".join(paragraphs)
+
+@extractor("keyword_analysis", "text", stage="keywords", field=False)
+def keyword_analysis(text):
+    return analyze_keywords(text)
+
+# Separate stages, so fields that need only the language never pay for sentiment
+@extractor("language", "text", "mode", stage="language", field=False)
+def language(text, mode):
+    return analyze_language(text, mode)
+
+@extractor("sentiment", "text", "mode", stage="sentiment", field=False)
+def sentiment(text, mode):
+    return analyze_text_sentiment(text, mode)
+
+dom_field("Meta Tags", "meta_tags")
+
+@extractor("Main Content", "text")
+def main_content(text):
+    return text[:1000] + "..."
+
+@extractor("Detected Language", "language")
+def detected_language(language):
+    return language
+
+dom_field("Internal Links", "internal_links")
+dom_field("External Links", "external_links")
+dom_field("JSON-LD Data", "json_ld")
+dom_field("Forms", "forms")
+dom_field("Tracking Scripts", "tracking_scripts")
+
+@extractor("Media", "dom")
+def media(dom):
+    return dom["images"] + dom["videos"]
+
+@extractor("Comments", "dom")
+def comments(dom):
+    return [str(comment) for comment in dom["comments"]]
+
+dom_field("Tables", "tables")
+dom_field("Headings", "headings")
+
+@extractor("Social Media Links", "External Links")
+def social_media_links(external_links):
+    return extract_social_media_links(external_links)
+
+dom_field("Audio Files", "audio_files")
+dom_field("Stylesheets", "stylesheets")
+dom_field("iFrames", "iframes")
+dom_field("External JavaScript", "external_js")
+dom_field("Meta Keywords", "meta_keywords")
+
+@extractor("Contact Info", "dom", stage="contact_info")
+def contact_info(dom):
+    return extract_contact_details(dom["text_nodes"], dom["hrefs"], dom["contact_forms"])
+
+@extractor("Word Count", "keyword_analysis")
+def word_count(analysis):
+    return analysis[0]
+
+@extractor("Keyword Density", "keyword_analysis")
+def keyword_density(analysis):
+    return analysis[1]
+
+@extractor("Top Bigrams", "keyword_analysis")
+def top_bigrams(analysis):
+    return analysis[2]
+
+@extractor("Sentiment Polarity", "sentiment")
+def sentiment_polarity(sentiment):
+    return sentiment[0]
+
+@extractor("Sentiment Subjectivity", "sentiment")
+def sentiment_subjectivity(sentiment):
+    return sentiment[1]
+
+dom_field("Viewport Meta Tag", "viewport", "Not found")
+dom_field("Canonical Link", "canonical", "Not found")
+dom_field("Favicon", "favicon", "Not found")
+
+@extractor("Schema Markup", "JSON-LD Data")
+def schema_markup(json_ld):
+    return list(json_ld)
+
+@extractor("Fingerprint", "dom", "page_paragraphs", "content_paragraphs", "text", stage="fingerprint")
+def fingerprint(dom, paragraphs, content, text):
+    # Known boilerplate depends on the pages analyzed before this one, so the
+    # text is fingerprinted as it was before that boilerplate was removed
+    if len(content) != len(paragraphs):
+        text = " ".join(paragraphs)
+    text_shingles = shingle_hashes(tokenize(text), TEXT_SHINGLE_SIZE)
+    return {
+        "text_simhash": f"{simhash(text_shingles):016x}",
+        "structure_simhash": f"{simhash(shingle_hashes(dom['tags'], STRUCTURE_SHINGLE_SIZE)):016x}",
+        "minhash": minhash(text_shingles),
+        "template_paragraphs": len(dom["paragraphs"]) - len(paragraphs)
+    }
+
+# Asset URLs for the broken asset check, which runs outside analyze_document
+@extractor("assets", "dom", "Media", field=False)
+def asset_urls(dom, media):
+    return {
+        "media": [item["src"] for item in media],
+        "stylesheets": dom["stylesheets"],
+        "scripts": dom["external_js"],
+        "iframes": dom["iframes"],
+        "audio": dom["audio_files"]
+    }
+
+def analyze_document(url, content, parser=None, mode=None, fields=None, boilerplate=None):
+    # CPU-bound half of scrape_website. Takes the raw body and returns only
+    # plain, picklable data so it can run in a worker process: the output
+    # fields, the asset URLs to check, every raw anchor href (for crawling)
+    # and the wall and CPU time of each stage. fields limits the output to
+    # the named extractors (and "assets"); None computes every field.
+    # boilerplate is a set of paragraph_hash values to leave out of the text.
+    stages = {}
+    parser = parser or DEFAULT_PARSER
+    names = DOCUMENT_FIELDS + ["assets"] if fields is None else list(fields)
+    unknown = [name for name in names if name not in EXTRACTORS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if use_stream_parser(content, parser):
+        with timed_stage(stages, "stream_parse"):
+            dom = stream_dom(url, content)
+    else:
+        with timed_stage(stages, "parse"):
+            soup = parse_html(content, parser if parser != STREAM_PARSER else "html.parser")
+        with timed_stage(stages, "dom_walk"):
+            dom = walk_dom(url, soup)
+    page = LazyPage(stages, url=url, dom=dom, mode=mode, boilerplate=boilerplate or frozenset())
+    output = {name: page[name] for name in names if name != "assets"}
+    assets = page["assets"] if "assets" in names else {}
+    return output, assets, dom["hrefs"], stages
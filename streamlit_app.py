@@ -1,23 +1,44 @@
 import streamlit as st 
-import requests
-from bs4 import BeautifulSoup, Comment
+import streamlit.logger as streamlit_logger
+import aiohttp
+import asyncio
+from multidict import CIMultiDict
+import argparse
+import contextlib
+import contextvars
+import cProfile
+import csv
+import hashlib
 import json
+import math
+import os
+import sys
 import random
 import re
-from requests_html import HTMLSession
-from urllib.parse import urlparse
+import sqlite3
+import tempfile
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlsplit, urlunsplit
 from urllib.robotparser import RobotFileParser
-from langdetect import detect, LangDetectException
 import validators
-import pandas as pd
 import io
-from concurrent.futures import ThreadPoolExecutor
-from textblob import TextBlob
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import multiprocessing
+from collections import Counter, OrderedDict, defaultdict, deque
+import threading
 import time
-import plotly.express as px
+import zipfile
+import zlib
+from dataclasses import dataclass, replace
+from email.utils import parsedate_to_datetime
+import pstats
 
-from langdetect import DetectorFactory
-DetectorFactory.seed = 0
+# pandas, plotly.express, xlsxwriter and pyarrow are imported by the
+# functions that use them, so a cold start (and the batch CLI) does not
+# pay for dashboard and export libraries before they are needed.
+from page_analysis import (
+    ANALYSIS_MODE, ANALYSIS_VERSION, DEFAULT_PARSER, DOCUMENT_FIELDS, analyze_document, corpus_tfidf,
+    document_frequencies, tfidf_weights, timed_stage
+)
 
 # The imports should be added manually as per the instructions.
 
@@ -120,319 +141,1292 @@ def get_random_user_agent():
 
 def is_valid_url(url):
     return validators.url(url)
-def is_scraping_allowed(url):
-    parsed_url = urlparse(url)
-    robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
-    rp = RobotFileParser()
-    rp.set_url(robots_url)
-    try:
-        rp.read()
-        return rp.can_fetch("*", url)
-    except:
-        return False
-        
-def detect_language(text):
-    if not text or len(text.split()) < 3:
-        return "Insufficient text for detection"
-    try:
-        return detect(text)
-    except LangDetectException:
-        return "Detection failed"
-
-def extract_meta_tags(soup):
-    meta_info = {}
-    for tag in soup.find_all("meta"):
-        if tag.get("name"):
-            meta_info[tag.get("name")] = tag.get("content")
-        elif tag.get("property"):
-            meta_info[tag.get("property")] = tag.get("content")
-    return meta_info
-
-def extract_links(url, soup):
-    internal_links, external_links = [], []
-    for link in soup.find_all("a", href=True):
-        if link["href"].startswith("http"):
-            if url in link["href"]:
-                internal_links.append(link["href"])
-            else:
-                external_links.append(link["href"])
-    return internal_links, external_links
 
-def extract_json_ld(soup):
-    json_ld_data = []
-    for script in soup.find_all("script", type="application/ld+json"):
+def normalize_url(url):
+    parsed = urlsplit(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    if parsed.port is not None and (scheme, parsed.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parsed.port}"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parsed.path or "/", query, ""))
+
+def extract_http_info(fetch):
+    return {
+        "status_code": fetch.status_code,
+        "headers": dict(fetch.headers),
+        "truncated": fetch.truncated
+    }
+
+def extract_http_response_time(fetch):
+    return fetch.elapsed
+
+class TTLCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+HEAD_CACHE_TTL = 3600
+HEAD_CACHE_ERROR_TTL = 60
+HEAD_CACHE_SIZE = 10000
+
+RESULT_CACHE_TTL = 3600
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE_DISK_SIZE = 10000
+RESULT_CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR")
+
+class ResultCache:
+    # Analysis results keyed on normalized URL and extractor configuration.
+    # A bounded in-memory LRU sits in front of an optional directory of JSON
+    # files that survives restarts.
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_SIZE,
+                 directory=RESULT_CACHE_DIR, max_disk_entries=RESULT_CACHE_DISK_SIZE):
+        self.ttl = ttl
+        self.memory = TTLCache(ttl, max_entries)
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(url, config):
+        payload = json.dumps({"url": normalize_url(url), "config": config}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, url, config):
+        key = self.key(url, config)
+        result = self.memory.get(key)
+        if result is not None or not self.directory:
+            return result
+        path = self._path(key)
         try:
-            json_ld_data.append(json.loads(script.string))
-        except json.JSONDecodeError:
-            continue
-    return json_ld_data
-
-def extract_forms(soup):
-    forms = []
-    for form in soup.find_all("form"):
-        form_data = {
-            "action": form.get("action"),
-            "method": form.get("method"),
-            "inputs": []
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        age = time.time() - entry["stored_at"]
+        if age > self.ttl:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return None
+        # Touch the file so disk eviction drops the least recently used entries
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        self.memory.set(key, entry["result"], ttl=self.ttl - age)
+        return entry["result"]
+
+    def set(self, url, config, result):
+        key = self.key(url, config)
+        self.memory.set(key, result)
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stored_at": time.time(), "result": result}, f, default=str)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_disk_entries]:
+            with contextlib.suppress(OSError):
+                os.remove(entry.path)
+
+class ValidatorStore:
+    # Persists, per URL, the HTTP validators and body hash of the last fetch
+    # together with its analysis, so unchanged pages are not re-analyzed.
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.stats = {"not_modified": 0, "unchanged": 0, "reanalyzed": 0}
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_validators (
+                    url TEXT PRIMARY KEY,
+                    config TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT NOT NULL,
+                    status_code INTEGER NOT NULL,
+                    headers TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    assets TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(page_validators)")}
+            if "links" not in columns:
+                self._conn.execute("ALTER TABLE page_validators ADD COLUMN links TEXT NOT NULL DEFAULT '[]'")
+
+    def get(self, url, config):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, status_code, headers, fields, assets, links "
+                "FROM page_validators WHERE url = ? AND config = ?",
+                (normalize_url(url), json.dumps(config, sort_keys=True))
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_hash, status_code, headers, fields, assets, links = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": content_hash,
+            "status_code": status_code,
+            "headers": json.loads(headers),
+            "fields": json.loads(fields),
+            "assets": json.loads(assets),
+            "links": json.loads(links)
         }
-        for input_tag in form.find_all("input"):
-            input_data = {
-                "type": input_tag.get("type"),
-                "name": input_tag.get("name"),
-                "value": input_tag.get("value")
-            }
-            form_data["inputs"].append(input_data)
-        forms.append(form_data)
-    return forms
-
-def extract_scripts_and_tracking(soup):
-    tracking_scripts = []
-    for script in soup.find_all("script"):
-        src = script.get("src")
-        if src:
-            if "analytics" in src or "tracking" in src:
-                tracking_scripts.append(src)
-    return tracking_scripts
-
-def extract_media(soup):
-    media_data = []
-    images = [{"src": img.get("src"), "alt": img.get("alt", "No alt text")} for img in soup.find_all("img", src=True)]
-    media_data.extend(images)
-    videos = [{"src": video.get("src")} for video in soup.find_all("video", src=True)]
-    media_data.extend(videos)
-    return media_data
-
-def extract_comments(soup):
-    comments = []
-    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
-        comments.append(comment)
-    return comments
-
-def extract_http_info(url):
-    try:
-        response = requests.get(url)
+
+    def put(self, url, config, fetch, content_hash, fields, assets, links):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_validators "
+                "(url, config, etag, last_modified, content_hash, status_code, headers, fields, assets, updated_at, links) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    normalize_url(url),
+                    json.dumps(config, sort_keys=True),
+                    fetch.headers.get("ETag"),
+                    fetch.headers.get("Last-Modified"),
+                    content_hash,
+                    fetch.status_code,
+                    json.dumps(dict(fetch.headers)),
+                    json.dumps(fields, default=str),
+                    json.dumps(assets),
+                    time.time(),
+                    json.dumps(links)
+                )
+            )
+
+    def record(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def close(self):
+        self._conn.close()
+
+# Fields that differ on every fetch and would make every run look changed
+HISTORY_VOLATILE_FIELDS = {"Metrics", "Page Load Time", "HTTP Response Time", "Near Duplicates"}
+# List fields whose items are hashed one by one, so diffs can say what was added or removed
+HISTORY_ITEM_FIELDS = [
+    "Broken Images", "Internal Links", "External Links", "Social Media Links",
+    "Stylesheets", "External JavaScript", "Tracking Scripts"
+]
+
+def stable_hash(value):
+    return hashlib.blake2b(json.dumps(value, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+def comparable_fields(result):
+    fields = {field: value for field, value in result.items() if field not in HISTORY_VOLATILE_FIELDS}
+    if isinstance(fields.get("HTTP Info"), dict):
+        # Headers such as Date change on every response; the status is what matters
+        fields["HTTP Info"] = fields["HTTP Info"].get("status_code")
+    return fields
+
+# Near-duplicate lookup: MinHash signatures are split into bands, and only
+# pages agreeing on a whole band are compared. With 16 bands of 4 values,
+# pages at 0.8 similarity share a band almost surely and pages below 0.3
+# rarely do, so a lookup compares a handful of candidates, not every page.
+MINHASH_BANDS = 16
+NEAR_DUPLICATE_SIMILARITY = 0.8
+NEAR_DUPLICATE_MAX_MATCHES = 10
+# Pages kept in a run's NearDuplicateIndex, about 4 KB each
+NEAR_DUPLICATE_INDEX_SIZE = 10000
+# Pages whose structure SimHashes differ in at most this many bits share a template;
+# split into 4 bands of 16 bits, such pages agree on at least one band
+STRUCTURE_SIMHASH_DISTANCE = 3
+STRUCTURE_BANDS = 4
+
+def minhash_bands(signature):
+    width = len(signature) // MINHASH_BANDS
+    return [(band, signature[band * width:(band + 1) * width]) for band in range(MINHASH_BANDS)]
+
+def structure_bands(structure_simhash):
+    return [
+        (MINHASH_BANDS + band, ((structure_simhash >> (16 * band)) & 0xFFFF).to_bytes(2, "little"))
+        for band in range(STRUCTURE_BANDS)
+    ]
+
+def minhash_similarity(signature, other):
+    # Share of equal MinHash values, an estimate of the Jaccard similarity of the two pages' shingles
+    values, other_values = memoryview(signature).cast("I"), memoryview(other).cast("I")
+    return sum(value == other_value for value, other_value in zip(values, other_values)) / len(values)
+
+class NearDuplicateIndex:
+    # In-memory MinHash LSH over the pages of one run. A page that matches
+    # an indexed page is not indexed itself, so a large cluster of copies
+    # stays one entry and later copies match its first page. At most
+    # max_entries pages are kept; past that the earliest indexed page is
+    # dropped, so memory stays flat however many pages a run has.
+    def __init__(self, similarity=NEAR_DUPLICATE_SIMILARITY, max_entries=NEAR_DUPLICATE_INDEX_SIZE):
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.buckets = defaultdict(list)
+        # entry id -> (url, signature), oldest first
+        self.entries = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def query(self, signature):
+        signature = bytes.fromhex(signature)
+        candidates = set()
+        for key in minhash_bands(signature):
+            candidates.update(self.buckets.get(key, ()))
+        matches = []
+        for candidate in candidates:
+            url, other = self.entries[candidate]
+            similarity = minhash_similarity(signature, other)
+            if similarity >= self.similarity:
+                matches.append({"url": url, "similarity": round(similarity, 3)})
+        matches.sort(key=lambda match: match["similarity"], reverse=True)
+        return matches[:NEAR_DUPLICATE_MAX_MATCHES]
+
+    def add(self, url, signature):
+        signature = bytes.fromhex(signature)
+        entry_id = self._next_id
+        self._next_id += 1
+        for key in minhash_bands(signature):
+            self.buckets[key].append(entry_id)
+        self.entries[entry_id] = (url, signature)
+        while len(self.entries) > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        entry_id, (_, signature) = self.entries.popitem(last=False)
+        for key in minhash_bands(signature):
+            bucket = self.buckets[key]
+            bucket.remove(entry_id)
+            if not bucket:
+                del self.buckets[key]
+
+    def check(self, url, result):
+        # Sets result["Near Duplicates"] for a result with a fingerprint; True if it has any
+        fingerprint = result.get("Fingerprint")
+        if not fingerprint or not fingerprint["minhash"]:
+            return False
+        matches = self.query(fingerprint["minhash"])
+        result["Near Duplicates"] = matches
+        if not matches:
+            self.add(url, fingerprint["minhash"])
+        return bool(matches)
+
+BOILERPLATE_MIN_PAGES = 5
+# Paragraph counts kept per host; past this, paragraphs seen on a single page are forgotten
+BOILERPLATE_MAX_TRACKED = 200000
+
+class BoilerplateFilter:
+    # Learns, per host, the paragraphs repeated on many pages of a run
+    # (menus, cookie notices, footers not marked up as such) and leaves
+    # them out of the text of the host's pages analyzed afterwards.
+    def __init__(self, min_pages=BOILERPLATE_MIN_PAGES):
+        self.min_pages = min_pages
+        self.counts = defaultdict(Counter)
+        self.boilerplate = {}
+
+    def paragraphs(self, url):
+        return self.boilerplate.get(urlsplit(url).netloc, frozenset())
+
+    def learn(self, url, hashes):
+        host = urlsplit(url).netloc
+        counts = self.counts[host]
+        hashes = set(hashes)
+        counts.update(hashes)
+        known = self.boilerplate.get(host, frozenset())
+        repeated = {value for value in hashes if counts[value] >= self.min_pages and value not in known}
+        if repeated:
+            self.boilerplate[host] = known | repeated
+        if len(counts) > BOILERPLATE_MAX_TRACKED:
+            for value in [value for value, count in counts.items() if count == 1]:
+                del counts[value]
+
+class ResultStore:
+    # History of scrape_website results per URL. Each analysis keeps the
+    # full result (compressed) plus a hash per field and per item of the
+    # HISTORY_ITEM_FIELDS lists; diffs only read the hashes and scores.
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    host TEXT NOT NULL,
+                    analyzed_at REAL NOT NULL,
+                    score INTEGER,
+                    field_hashes TEXT NOT NULL,
+                    item_hashes TEXT NOT NULL,
+                    result BLOB NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_url ON analyses (url, analyzed_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_host ON analyses (host, analyzed_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_score ON analyses (score)")
+            # Fingerprints of analyses that have one, and their LSH band buckets (see minhash_bands)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    analysis_id INTEGER PRIMARY KEY,
+                    minhash BLOB NOT NULL,
+                    structure_simhash TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprint_bands (
+                    band INTEGER NOT NULL,
+                    bucket BLOB NOT NULL,
+                    analysis_id INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS fingerprint_bands_bucket ON fingerprint_bands (band, bucket)")
+
+    def record(self, url, result, analyzed_at=None):
+        url = normalize_url(url)
+        fields = comparable_fields(result)
+        field_hashes = {field: stable_hash(value) for field, value in fields.items()}
+        item_hashes = {
+            field: sorted({stable_hash(item) for item in fields[field]})
+            for field in HISTORY_ITEM_FIELDS if isinstance(fields.get(field), list)
+        }
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO analyses (url, host, analyzed_at, score, field_hashes, item_hashes, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    urlsplit(url).netloc,
+                    analyzed_at if analyzed_at is not None else time.time(),
+                    result.get("Score"),
+                    json.dumps(field_hashes),
+                    json.dumps(item_hashes),
+                    zlib.compress(json.dumps(result, default=str).encode())
+                )
+            )
+            fingerprint = result.get("Fingerprint")
+            if fingerprint and fingerprint["minhash"]:
+                signature = bytes.fromhex(fingerprint["minhash"])
+                bands = minhash_bands(signature) + structure_bands(int(fingerprint["structure_simhash"], 16))
+                self._conn.execute(
+                    "INSERT INTO fingerprints (analysis_id, minhash, structure_simhash) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, signature, fingerprint["structure_simhash"])
+                )
+                self._conn.executemany(
+                    "INSERT INTO fingerprint_bands (band, bucket, analysis_id) VALUES (?, ?, ?)",
+                    [(band, bucket, cursor.lastrowid) for band, bucket in bands]
+                )
+        return cursor.lastrowid
+
+    def history(self, url, limit=20):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, analyzed_at, score FROM analyses WHERE url = ? ORDER BY analyzed_at DESC LIMIT ?",
+                (normalize_url(url), limit)
+            ).fetchall()
+        return [{"id": row[0], "analyzed_at": row[1], "score": row[2]} for row in rows]
+
+    def get(self, analysis_id):
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row is not None else None
+
+    def _summary(self, analysis_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, analyzed_at, score, field_hashes, item_hashes FROM analyses WHERE id = ?", (analysis_id,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(analysis_id)
         return {
-            "status_code": response.status_code,
-            "headers": dict(response.headers)
+            "url": row[0],
+            "analyzed_at": row[1],
+            "score": row[2],
+            "field_hashes": json.loads(row[3]),
+            "item_hashes": json.loads(row[4])
+        }
+
+    def diff(self, old_id, new_id, details=False):
+        # Field-level changes from one analysis to another. With details, the
+        # added and removed items themselves are looked up in both results.
+        old, new = self._summary(old_id), self._summary(new_id)
+        changes = {
+            "url": new["url"],
+            "from": old["analyzed_at"],
+            "to": new["analyzed_at"],
+            "score": {"old": old["score"], "new": new["score"], "delta": (new["score"] or 0) - (old["score"] or 0)},
+            "changed_fields": sorted(
+                field for field in old["field_hashes"].keys() | new["field_hashes"].keys()
+                if old["field_hashes"].get(field) != new["field_hashes"].get(field)
+            ),
+            "items": {}
         }
-    except requests.RequestException as e:
-        return {"error": str(e)}
-
-def extract_tables(soup):
-    tables = []
-    for table in soup.find_all("table"):
-        table_data = [[cell.get_text() for cell in row.find_all(["th", "td"])] for row in table.find_all("tr")]
-        tables.append(table_data)
-    return tables
-
-def extract_headings(soup):
-    headings = {}
-    for level in range(1, 7):
-        headings[f"h{level}"] = [h.get_text() for h in soup.find_all(f"h{level}")]
-    return headings
-
-def extract_social_media_links(external_links):
-    social_links = []
-    social_media_domains = ["facebook", "twitter", "instagram", "linkedin", "youtube"]
-    for link in external_links:
-        if any(domain in link for domain in social_media_domains):
-            social_links.append(link)
-    return social_links
-
-def extract_audio_files(soup):
-    audio_files = []
-    for audio in soup.find_all("audio"):
-        src = audio.get("src")
-        if src:
-            audio_files.append(src)
-    return audio_files
-
-def extract_stylesheets(soup):
-    stylesheets = []
-    for link in soup.find_all("link", rel="stylesheet"):
-        href = link.get("href")
-        if href:
-            stylesheets.append(href)
-    return stylesheets
-
-def extract_iframes(soup):
-    iframes = []
-    for iframe in soup.find_all("iframe"):
-        src = iframe.get("src")
-        if src:
-            iframes.append(src)
-    return iframes
-
-def extract_external_js(soup):
-    external_js = []
-    for script in soup.find_all("script", src=True):
-        external_js.append(script.get("src"))
-    return external_js
-
-def extract_http_response_time(url):
+        for field in HISTORY_ITEM_FIELDS:
+            old_items = set(old["item_hashes"].get(field, []))
+            new_items = set(new["item_hashes"].get(field, []))
+            if old_items != new_items:
+                changes["items"][field] = {"added": len(new_items - old_items), "removed": len(old_items - new_items)}
+        if details and changes["items"]:
+            old_result, new_result = self.get(old_id), self.get(new_id)
+            for field, counts in changes["items"].items():
+                old_values = {stable_hash(item): item for item in old_result.get(field) or []}
+                new_values = {stable_hash(item): item for item in new_result.get(field) or []}
+                counts["added_items"] = [item for key, item in new_values.items() if key not in old_values]
+                counts["removed_items"] = [item for key, item in old_values.items() if key not in new_values]
+        return changes
+
+    def diff_latest(self, url, details=False):
+        # Changes in the most recent analysis of url compared with the one before it
+        runs = self.history(url, limit=2)
+        if len(runs) < 2:
+            return None
+        return self.diff(runs[1]["id"], runs[0]["id"], details=details)
+
+    def score_drops(self, min_drop=10, host=None):
+        # Latest analysis of each URL whose score fell by at least min_drop since the analysis before it
+        query = """
+            SELECT url, analyzed_at, previous_score, score FROM (
+                SELECT url, analyzed_at, score,
+                       LAG(score) OVER (PARTITION BY url ORDER BY analyzed_at) AS previous_score,
+                       ROW_NUMBER() OVER (PARTITION BY url ORDER BY analyzed_at DESC) AS recency
+                FROM analyses {where}
+            )
+            WHERE recency = 1 AND previous_score - score >= ?
+            ORDER BY previous_score - score DESC
+        """.format(where="WHERE host = ?" if host else "")
+        params = (host, min_drop) if host else (min_drop,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {"url": row[0], "analyzed_at": row[1], "previous_score": row[2], "score": row[3]}
+            for row in rows
+        ]
+
+    def near_duplicates(self, url, similarity=NEAR_DUPLICATE_SIMILARITY):
+        # Other URLs with an analysis of nearly the same text as url's latest
+        # one, and those built from the same template; for each URL, the
+        # most recent of its matching analyses is compared
+        url = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT f.analysis_id, f.minhash, f.structure_simhash FROM fingerprints f "
+                "JOIN analyses a ON a.id = f.analysis_id WHERE a.url = ? ORDER BY a.analyzed_at DESC LIMIT 1",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            analysis_id, signature, structure_simhash = row[0], row[1], int(row[2], 16)
+            candidates = {}
+            for band, bucket in minhash_bands(signature) + structure_bands(structure_simhash):
+                for candidate in self._conn.execute(
+                    "SELECT a.url, a.analyzed_at, f.minhash, f.structure_simhash FROM fingerprint_bands b "
+                    "JOIN fingerprints f ON f.analysis_id = b.analysis_id JOIN analyses a ON a.id = b.analysis_id "
+                    "WHERE b.band = ? AND b.bucket = ? AND b.analysis_id != ?",
+                    (band, bucket, analysis_id)
+                ):
+                    if candidate[0] != url and candidate[1] >= candidates.get(candidate[0], (None, 0))[1]:
+                        candidates[candidate[0]] = candidate
+        near_duplicates, same_template = [], []
+        for other_url, analyzed_at, other_signature, other_structure in candidates.values():
+            match = {"url": other_url, "analyzed_at": analyzed_at}
+            text_similarity = minhash_similarity(signature, other_signature)
+            if text_similarity >= similarity:
+                near_duplicates.append({**match, "similarity": round(text_similarity, 3)})
+            distance = bin(structure_simhash ^ int(other_structure, 16)).count("1")
+            if distance <= STRUCTURE_SIMHASH_DISTANCE:
+                same_template.append({**match, "distance": distance})
+        near_duplicates.sort(key=lambda match: match["similarity"], reverse=True)
+        same_template.sort(key=lambda match: match["distance"])
+        return {"url": url, "near_duplicates": near_duplicates, "same_template": same_template}
+
+    def close(self):
+        self._conn.close()
+
+class RobotsUnavailable(Exception):
+    pass
+
+class RobotsCache(TTLCache):
+    def __init__(self, ttl, max_entries):
+        super().__init__(ttl, max_entries)
+        # host -> [lock, number of checks holding or waiting for it]
+        self._host_locks = {}
+
+    @contextlib.asynccontextmanager
+    async def host_lock(self, host):
+        # Lets concurrent checks for the same host share one robots.txt download.
+        # The lock is dropped once no check holds or waits for it, so hosts seen
+        # once in a long crawl do not each keep one.
+        with self._lock:
+            entry = self._host_locks.get(host)
+            if entry is None:
+                entry = self._host_locks[host] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._host_locks[host]
+
+ROBOTS_CACHE_TTL = 86400
+ROBOTS_CACHE_MAX_TTL = 7 * 86400
+ROBOTS_CACHE_SIZE = 1000
+# A robots.txt that could not be fetched is remembered this long, so the
+# other checks for the host share one retry cycle instead of each running one
+ROBOTS_FAILURE_TTL = 60
+
+def robots_cache_ttl(headers):
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    max_age = re.search(r"max-age=(\d+)", cache_control)
+    if max_age:
+        return min(int(max_age.group(1)), ROBOTS_CACHE_MAX_TTL)
+    if headers.get("Expires"):
+        try:
+            expires = parsedate_to_datetime(headers["Expires"])
+            return max(0, min(expires.timestamp() - time.time(), ROBOTS_CACHE_MAX_TTL))
+        except (TypeError, ValueError):
+            pass
+    return ROBOTS_CACHE_TTL
+
+async def fetch_robots_txt(engine, robots_url):
+    rp = RobotFileParser(robots_url)
+    # Connection errors and 5xx responses are already retried with backoff by the client
     try:
-        response = requests.get(url)
-        return response.elapsed.total_seconds()
-    except requests.RequestException as e:
-        return {"error": str(e)}
-
-def check_broken_images(media):
-    broken_images = []
-    for media_item in media:
-        if media_item.get("src"):
-            try:
-                response = requests.head(media_item["src"], timeout=5)
-                if response.status_code != 200:
-                    broken_images.append(media_item["src"])
-            except:
-                broken_images.append(media_item["src"])
-    return broken_images
-
-def extract_meta_keywords(soup):
-    meta_keywords = []
-    meta_tags = soup.find_all("meta", {"name": "keywords"})
-    for meta_tag in meta_tags:
-        if meta_tag.get("content"):
-            meta_keywords.extend(meta_tag["content"].split(","))
-    return meta_keywords
-
-def extract_contact_info(soup):
-    contact_info = {
-        "emails": [],
-        "phone_numbers": [],
-        "contact_forms": []
+        response = await engine.client.get(robots_url)
+    except HTTP_ERRORS as e:
+        raise RobotsUnavailable(f"Could not fetch {robots_url}: {str(e) or type(e).__name__}") from e
+    if response.status_code >= 500:
+        raise RobotsUnavailable(f"Could not fetch {robots_url}: HTTP {response.status_code}")
+    # Same rules as RobotFileParser.read()
+    if response.status_code in (401, 403):
+        rp.disallow_all = True
+    elif response.status_code >= 400:
+        rp.allow_all = True
+    else:
+        rp.parse(response.text.splitlines())
+    return rp, robots_cache_ttl(response.headers)
+
+async def get_robots_parser(engine, url):
+    cache = engine.robots_cache
+    parsed_url = urlparse(url)
+    origin = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    rp = cache.get(origin)
+    if rp is None:
+        async with cache.host_lock(origin):
+            rp = cache.get(origin)
+            if rp is None:
+                try:
+                    rp, ttl = await fetch_robots_txt(engine, f"{origin}/robots.txt")
+                except RobotsUnavailable as e:
+                    cache.set(origin, e, ttl=ROBOTS_FAILURE_TTL)
+                    raise
+                if ttl > 0:
+                    cache.set(origin, rp, ttl=ttl)
+                crawl_delay = rp.crawl_delay("*")
+                if crawl_delay:
+                    engine.client.scheduler.set_crawl_delay(parsed_url.netloc, crawl_delay)
+    if isinstance(rp, RobotsUnavailable):
+        raise RobotsUnavailable(str(rp))
+    return rp
+
+async def is_scraping_allowed_async(engine, url):
+    return (await get_robots_parser(engine, url)).can_fetch("*", url)
+
+def is_scraping_allowed(url):
+    engine = get_engine()
+    return engine.run(is_scraping_allowed_async(engine, url))
+
+def resolve_asset_urls(page_url, srcs):
+    resolved = []
+    seen = set()
+    for src in srcs:
+        if not src:
+            continue
+        absolute = urljoin(page_url, src.strip())
+        if urlparse(absolute).scheme not in ("http", "https") or absolute in seen:
+            continue
+        seen.add(absolute)
+        resolved.append(absolute)
+    return resolved
+
+# Asset checks are not retried, and a page's checks stop after
+# ASSET_CHECK_DEADLINE seconds; assets with no answer by then count as broken
+ASSET_CHECK_RETRIES = 0
+ASSET_CHECK_DEADLINE = 30
+
+async def fetch_asset_status(engine, url, timeout=5):
+    try:
+        response = await engine.client.head(url, timeout=timeout, lane="asset", retries=ASSET_CHECK_RETRIES)
+        if response.status_code in (405, 501):
+            # Some servers refuse HEAD; fall back to a GET without reading the body
+            response = await engine.client.get(url, timeout=timeout, read_body=False, lane="asset",
+                                               retries=ASSET_CHECK_RETRIES)
+        return response.status_code
+    except HTTP_ERRORS:
+        return None
+
+def is_broken_status(status):
+    return status is None or status >= 400
+
+async def check_broken_assets_async(engine, page_url, assets, timeout=5, deadline=ASSET_CHECK_DEADLINE):
+    # engine.head_cache is shared by every page and run, so a CDN asset used site-wide is checked once
+    cache = engine.head_cache
+    resolved = {kind: resolve_asset_urls(page_url, srcs) for kind, srcs in assets.items()}
+
+    statuses = {}
+    pending = []
+    for url in dict.fromkeys(url for urls in resolved.values() for url in urls):
+        status = cache.get(url, default=False)
+        if status is False:
+            pending.append(url)
+        else:
+            statuses[url] = status
+
+    if pending:
+        # Per-host concurrency and pacing come from the asset lane of the client's HostScheduler
+        checks = [asyncio.ensure_future(fetch_asset_status(engine, url, timeout)) for url in pending]
+        await asyncio.wait(checks, timeout=deadline)
+        unfinished = [check for check in checks if not check.done()]
+        for check in unfinished:
+            check.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        for url, check in zip(pending, checks):
+            if check.cancelled():
+                # Not cached, so a later page checks it again
+                statuses[url] = None
+                continue
+            statuses[url] = status = check.result()
+            cache.set(url, status, ttl=HEAD_CACHE_ERROR_TTL if status is None else None)
+
+    return {
+        kind: [url for url in urls if is_broken_status(statuses[url])]
+        for kind, urls in resolved.items()
     }
 
-    emails = set(re.findall(r'mailto:([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', str(soup)))
-    contact_info["emails"] = list(emails)
+def check_broken_assets(page_url, assets):
+    engine = get_engine()
+    return engine.run(check_broken_assets_async(engine, page_url, assets))
+
+def check_broken_images(media, page_url=""):
+    return check_broken_assets(page_url, {"media": [item.get("src") for item in media]})["media"]
+
+HTTP_POOL_CONNECTIONS = 100
+HTTP_PER_HOST_CONNECTIONS = 8
+HTTP_TIMEOUT = 10
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+HTTP_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+# Bodies are streamed and cut off at this size, so one huge page cannot exhaust memory
+HTTP_MAX_BODY_SIZE = int(os.environ.get("SCRAPER_MAX_BODY_BYTES", 10 * 1024 * 1024))
+HTTP_READ_CHUNK_SIZE = 64 * 1024
+
+class HttpClientStats:
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
 
-    phone_numbers = set(re.findall(r'(\+?\(?\d{1,4}\)?[\s\-]?\d{1,3}[\s\-]?\d{3}[\s\-]?\d{4})', str(soup)))
-    contact_info["phone_numbers"] = list(phone_numbers)
+    def record_connection(self):
+        with self._lock:
+            self.connections_opened += 1
 
-    for form in soup.find_all("form"):
-        action = form.get("action", "").lower()
-        if "contact" in action:
-            contact_info["contact_forms"].append(form)
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(0, self.requests - self.connections_opened)
+            }
+
+class PageMetrics:
+    # Per-page instrumentation, attached to scrape_website results as "Metrics"
+    def __init__(self):
+        self.stages = {}
+        self.requests = 0
+        self.response_bytes = 0
+
+    def stage(self, name):
+        # These stages mostly await on the shared event loop, whose CPU time
+        # belongs to every page in flight, so only wall time is recorded
+        return timed_stage(self.stages, name, cpu=False)
+
+    def add_stages(self, stages):
+        for name, timings in stages.items():
+            self.stages[name] = dict(timings)
+
+    def record_request(self, response_bytes):
+        self.requests += 1
+        self.response_bytes += response_bytes
+
+    def to_dict(self):
+        return {
+            "stages": self.stages,
+            "cpu_time": sum(timings.get("cpu_time", 0.0) for timings in self.stages.values()),
+            "requests": self.requests,
+            "response_bytes": self.response_bytes
+        }
+
+# The PageMetrics of the page being scraped. Tasks started while scraping it
+# inherit the value, so the client can attribute every request, retries and
+# asset checks included, to its page.
+current_page_metrics = contextvars.ContextVar("current_page_metrics", default=None)
+
+@dataclass
+class HttpResponse:
+    url: str
+    status_code: int
+    headers: CIMultiDict
+    content: bytes
+    elapsed: float
+    truncated: bool = False
 
-    return contact_info
+    @property
+    def text(self):
+        charset = re.search(r"charset=([\w-]+)", self.headers.get("Content-Type", ""))
+        try:
+            return self.content.decode(charset.group(1) if charset else "utf-8", errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+HOST_MAX_CONCURRENCY = 4
+HOST_REQUESTS_PER_SECOND = 10.0
+# Asset checks (HEAD requests for a page's images, scripts and stylesheets)
+# have their own lane per host, so hundreds of same-host assets on one page
+# do not hold up the host's next pages
+HOST_ASSET_REQUESTS_PER_SECOND = 50.0
+HOST_MAX_CRAWL_DELAY = 30.0
+HOST_LANES = ("page", "asset")
+# Crawl-delays outlive the longest cached robots.txt that sets them
+HOST_CRAWL_DELAY_TTL = 7 * 86400
+HOST_CRAWL_DELAY_HOSTS = 10000
+
+class HostState:
+    def __init__(self, max_concurrency):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.next_slot = 0.0
+        self.queued = 0
+        self.active = 0
+        self.requests = 0
+        self.wait_time = 0.0
+        # Slots entered and not yet left, whether queued, pacing or active
+        self.users = 0
+
+class HostScheduler:
+    # Politeness per host: each host has its own queue of waiting requests,
+    # at most max_concurrency of them in flight, and starts spaced by
+    # 1 / requests_per_second or the robots.txt Crawl-delay, whichever is
+    # longer. Waiting on one host never blocks requests to other hosts.
+    # Asset checks queue separately in the host's "asset" lane, spaced by
+    # 1 / asset_requests_per_second or the Crawl-delay. A host's lane is
+    # dropped once no request uses it and its next start is due, so hosts
+    # seen once in a long crawl do not each keep one.
+    def __init__(self, max_concurrency=HOST_MAX_CONCURRENCY, requests_per_second=HOST_REQUESTS_PER_SECOND,
+                 asset_requests_per_second=HOST_ASSET_REQUESTS_PER_SECOND):
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.asset_requests_per_second = asset_requests_per_second
+        self._hosts = {}
+        self._crawl_delays = TTLCache(HOST_CRAWL_DELAY_TTL, HOST_CRAWL_DELAY_HOSTS)
+
+    def _host(self, host, lane):
+        if lane not in HOST_LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+        state = self._hosts.get((host, lane))
+        if state is None:
+            state = self._hosts[(host, lane)] = HostState(self.max_concurrency)
+        return state
 
-def analyze_word_count_and_density(content):
-    words = content.split()
-    word_count = len(words)
-    keyword_density = {}
-    for word in words:
-        word = word.lower()
-        if word in keyword_density:
-            keyword_density[word] += 1
+    def set_crawl_delay(self, host, delay):
+        self._crawl_delays.set(host, min(float(delay), HOST_MAX_CRAWL_DELAY))
+
+    def interval(self, host, lane="page"):
+        rate = self.asset_requests_per_second if lane == "asset" else self.requests_per_second
+        rate_interval = 1 / rate if rate else 0.0
+        return max(rate_interval, self._crawl_delays.get(host) or 0.0)
+
+    def _drop_if_idle(self, key, state):
+        if state.users or self._hosts.get(key) is not state:
+            return
+        # Dropping the lane before its next start is due would let the next
+        # request skip the wait, so wait for that first
+        delay = state.next_slot - time.monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._drop_if_idle, key, state)
         else:
-            keyword_density[word] = 1
-    for word in keyword_density:
-        keyword_density[word] = (keyword_density[word] / word_count) * 100
-    return word_count, keyword_density
-
-def analyze_sentiment(content):
-    blob = TextBlob(content)
-    return blob.sentiment.polarity, blob.sentiment.subjectivity
-
-def check_viewport_meta(soup):
-    viewport = soup.find("meta", attrs={"name": "viewport"})
-    return viewport["content"] if viewport else "Not found"
-
-def extract_canonical_link(soup):
-    canonical = soup.find("link", rel="canonical")
-    return canonical["href"] if canonical else "Not found"
-
-def check_favicon(soup):
-    favicon = soup.find("link", rel="icon")
-    return favicon["href"] if favicon else "Not found"
-
-def extract_schema_markup(soup):
-    schema_data = []
-    for script in soup.find_all("script", type="application/ld+json"):
+            del self._hosts[key]
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host, lane="page"):
+        state = self._host(host, lane)
+        state.users += 1
         try:
-            schema_data.append(json.loads(script.string))
-        except json.JSONDecodeError:
-            continue
-    return schema_data
+            queued_at = time.monotonic()
+            state.queued += 1
+            try:
+                await state.semaphore.acquire()
+            finally:
+                state.queued -= 1
+            try:
+                now = time.monotonic()
+                start_at = max(now, state.next_slot)
+                state.next_slot = start_at + self.interval(host, lane)
+                if start_at > now:
+                    await asyncio.sleep(start_at - now)
+                state.wait_time += time.monotonic() - queued_at
+                state.requests += 1
+                state.active += 1
+                try:
+                    yield
+                finally:
+                    state.active -= 1
+            finally:
+                state.semaphore.release()
+        finally:
+            state.users -= 1
+            self._drop_if_idle((host, lane), state)
+
+    def snapshot(self):
+        # One row per host and lane in use; asset lanes are listed as "host (assets)"
+        return {
+            host if lane == "page" else f"{host} (assets)": {
+                "queued": state.queued,
+                "active": state.active,
+                "requests": state.requests,
+                "wait_time": state.wait_time,
+                "average_wait": state.wait_time / state.requests if state.requests else 0.0,
+                "crawl_delay": self._crawl_delays.get(host),
+                "interval": self.interval(host, lane)
+            }
+            for (host, lane), state in list(self._hosts.items())
+        }
+
+class AsyncHttpClient:
+    # Must only be used from the engine's event loop
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, per_host=HTTP_PER_HOST_CONNECTIONS,
+                 timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR,
+                 max_in_flight=None, scheduler=None, max_body_size=HTTP_MAX_BODY_SIZE):
+        self.pool_connections = pool_connections
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.stats = HttpClientStats()
+        self.scheduler = scheduler or HostScheduler()
+        self._budget = asyncio.Semaphore(max_in_flight or pool_connections)
+        self._session = None
+
+    def _trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self.stats.record_request()
+
+        async def on_connection_create_end(session, context, params):
+            self.stats.record_connection()
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        return trace_config
+
+    def _get_session(self):
+        if self._session is None:
+            # limit_per_host caps open connections per host; idle ones are kept alive for reuse
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_connections, limit_per_host=self.per_host),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._trace_config()]
+            )
+        return self._session
+
+    async def _read_body(self, response, max_body_size):
+        # Returns (body, truncated). Past max_body_size the rest is not downloaded
+        # and the connection is closed instead of being returned to the pool.
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(HTTP_READ_CHUNK_SIZE):
+            if size + len(chunk) > max_body_size:
+                chunks.append(chunk[:max_body_size - size])
+                response.close()
+                return b"".join(chunks), True
+            chunks.append(chunk)
+            size += len(chunk)
+        return b"".join(chunks), False
+
+    async def request(self, method, url, headers=None, timeout=None, read_body=True, max_body_size=None, lane="page",
+                      retries=None, **kwargs):
+        retries = self.retries if retries is None else retries
+        headers = {"User-Agent": get_random_user_agent(), **(headers or {})}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        host = urlsplit(url).netloc
+        metrics = current_page_metrics.get()
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            try:
+                # Wait for the host's turn first so a throttled host does not hold the global budget
+                async with self.scheduler.slot(host, lane), self._budget:
+                    start_time = time.monotonic()
+                    async with self._get_session().request(method, url, headers=headers, **kwargs) as response:
+                        elapsed = time.monotonic() - start_time
+                        content, truncated = b"", False
+                        if read_body:
+                            content, truncated = await self._read_body(response, max_body_size or self.max_body_size)
+                        result = HttpResponse(
+                            url=str(response.url),
+                            status_code=response.status,
+                            headers=CIMultiDict(response.headers),
+                            content=content,
+                            elapsed=elapsed,
+                            truncated=truncated
+                        )
+            except HTTP_ERRORS:
+                if metrics is not None:
+                    metrics.record_request(0)
+                if attempt == retries:
+                    raise
+                continue
+            if metrics is not None:
+                metrics.record_request(len(result.content))
+            if result.status_code in HTTP_RETRY_STATUSES and attempt < retries:
+                continue
+            return result
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url, allow_redirects=True, **kwargs):
+        return await self.request("HEAD", url, allow_redirects=allow_redirects, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+ENGINE_CONCURRENCY = 256
+PARSE_PROCESSES = os.environ.get("SCRAPER_PARSE_PROCESSES", "1") != "0"
+
+class ScrapeEngine:
+    # Runs one event loop in a background thread. Page fetches, robots checks
+    # and asset checks from every caller share it and its global budget of
+    # in-flight requests; parsing and text analysis run in parse_pool, a
+    # process pool by default so they are not serialized by the GIL. SQLite
+    # stores are read and written one call at a time in store_pool, so their
+    # disk I/O does not block the loop.
+    def __init__(self, concurrency=ENGINE_CONCURRENCY, parse_workers=None, parse_processes=PARSE_PROCESSES):
+        self.client = AsyncHttpClient(max_in_flight=concurrency)
+        self.head_cache = TTLCache(HEAD_CACHE_TTL, HEAD_CACHE_SIZE)
+        self.robots_cache = RobotsCache(ROBOTS_CACHE_TTL, ROBOTS_CACHE_SIZE)
+        self.result_cache = ResultCache()
+        parse_workers = parse_workers or os.cpu_count()
+        if parse_processes:
+            # spawn rather than fork: this process already runs the event loop and Streamlit threads
+            self.parse_pool = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.parse_pool = ThreadPoolExecutor(max_workers=parse_workers)
+        self.store_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scrape-store")
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="scrape-engine", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        return self.submit(coro).result()
+
+    async def parse(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.parse_pool, func, *args)
+
+    async def store(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.store_pool, func, *args)
+
+    def close(self):
+        self.run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.parse_pool.shutdown()
+        self.store_pool.shutdown()
+
+@st.cache_resource
+def get_engine():
+    return ScrapeEngine()
+
+def get_http_client():
+    return get_engine().client
+
+# Set SCRAPER_HISTORY_DB to an SQLite file to keep every analysis made in the app
+HISTORY_DB = os.environ.get("SCRAPER_HISTORY_DB")
+
+@st.cache_resource
+def get_result_store():
+    return ResultStore(HISTORY_DB) if HISTORY_DB else None
+
+# Each check is worth SCORE_POINTS when the field passes it
+SCORE_POINTS = 10
+SCORE_CHECKS = {
+    "Meta Tags": bool,
+    "Detected Language": lambda value: value != "Detection failed",
+    "Internal Links": bool,
+    "External Links": bool,
+    "Forms": bool,
+    "Media": bool,
+    "Tables": bool,
+    "Headings": bool,
+    "Social Media Links": bool,
+    "HTTP Info": lambda value: bool(value) and value.get("status_code") == 200
+}
+
+def score_breakdown(data):
+    return {field: SCORE_POINTS if check(data.get(field)) else 0 for field, check in SCORE_CHECKS.items()}
 
 def score_website(data):
-    score = 0
-    max_score = 100
-    
-    if data.get("Meta Tags"):
-        score += 10
-    if data.get("Detected Language") != "Detection failed":
-        score += 10
-    if data.get("Internal Links"):
-        score += 10
-    if data.get("External Links"):
-        score += 10
-    if data.get("Forms"):
-        score += 10
-    if data.get("Media"):
-        score += 10
-    if data.get("Tables"):
-        score += 10
-    if data.get("Headings"):
-        score += 10
-    if data.get("Social Media Links"):
-        score += 10
-    if data.get("HTTP Info") and data["HTTP Info"].get("status_code") == 200:
-        score += 10
-    
-    return score, max_score
+    return sum(score_breakdown(data).values()), SCORE_POINTS * len(SCORE_CHECKS)
 
-def scrape_website(url):
-    session = HTMLSession()
-    headers = {"User-Agent": get_random_user_agent()}
+@dataclass
+class FetchResult:
+    url: str
+    final_url: str
+    status_code: int
+    headers: dict
+    content: bytes
+    elapsed: float
+    load_time: float
+    truncated: bool = False
+
+async def fetch_page_async(engine, url, previous=None):
+    headers = {}
+    if previous is not None:
+        if previous["etag"]:
+            headers["If-None-Match"] = previous["etag"]
+        if previous["last_modified"]:
+            headers["If-Modified-Since"] = previous["last_modified"]
     start_time = time.time()
-    response = session.get(url, headers=headers)
+    response = await engine.client.get(url, headers=headers)
     load_time = time.time() - start_time
-    soup = BeautifulSoup(response.content, "html.parser")
-    
-    data = {}
-
-    data["Meta Tags"] = extract_meta_tags(soup)
-    content = " ".join([p.get_text() for p in soup.find_all("p")])
-    data["Main Content"] = content[:1000] + "..."
-    data["Detected Language"] = detect_language(content)
-    internal_links, external_links = extract_links(url, soup)
-    data["Internal Links"] = internal_links
-    data["External Links"] = external_links
-    data["JSON-LD Data"] = extract_json_ld(soup)
-    data["Forms"] = extract_forms(soup)
-    data["Tracking Scripts"] = extract_scripts_and_tracking(soup)
-    data["Media"] = extract_media(soup)
-    data["Comments"] = extract_comments(soup)
-    data["HTTP Info"] = extract_http_info(url)
-    data["Tables"] = extract_tables(soup)
-    data["Headings"] = extract_headings(soup)
-    data["Social Media Links"] = extract_social_media_links(external_links)
-    data["Audio Files"] = extract_audio_files(soup)
-    data["Stylesheets"] = extract_stylesheets(soup)
-    data["iFrames"] = extract_iframes(soup)
-    data["External JavaScript"] = extract_external_js(soup)
-    data["HTTP Response Time"] = extract_http_response_time(url)
-    data["Broken Images"] = check_broken_images(data.get("Media", []))
-    data["Meta Keywords"] = extract_meta_keywords(soup)
-    data["Contact Info"] = extract_contact_info(soup)
-    
-    word_count, keyword_density = analyze_word_count_and_density(content)
-    sentiment_polarity, sentiment_subjectivity = analyze_sentiment(content)
-    data["Word Count"] = word_count
-    data["Keyword Density"] = keyword_density
-    data["Sentiment Polarity"] = sentiment_polarity
-    data["Sentiment Subjectivity"] = sentiment_subjectivity
-    data["Page Load Time"] = load_time
-    data["Viewport Meta Tag"] = check_viewport_meta(soup)
-    data["Canonical Link"] = extract_canonical_link(soup)
-    data["Favicon"] = check_favicon(soup)
-    data["Schema Markup"] = extract_schema_markup(soup)
-
-    data["Score"], data["Max Score"] = score_website(data)
+    return FetchResult(
+        url=url,
+        final_url=response.url,
+        status_code=response.status_code,
+        headers=response.headers,
+        content=response.content,
+        elapsed=response.elapsed,
+        load_time=load_time,
+        truncated=response.truncated
+    )
+
+def fetch_page(url):
+    engine = get_engine()
+    return engine.run(fetch_page_async(engine, url))
+
+# Field order of a scrape_website result
+PAGE_FIELDS = [
+    "Meta Tags", "Main Content", "Detected Language", "Internal Links", "External Links",
+    "JSON-LD Data", "Forms", "Tracking Scripts", "Media", "Comments", "HTTP Info", "Tables",
+    "Headings", "Social Media Links", "Audio Files", "Stylesheets", "iFrames",
+    "External JavaScript", "HTTP Response Time", "Broken Images", "Broken Assets",
+    "Meta Keywords", "Contact Info", "Word Count", "Keyword Density", "Top Bigrams", "Sentiment Polarity",
+    "Sentiment Subjectivity", "Page Load Time", "Viewport Meta Tag", "Canonical Link",
+    "Favicon", "Schema Markup", "Fingerprint"
+]
+
+# Fields scrape_page_async fills in itself, with the values they need.
+# "assets" is analyze_document's list of asset URLs; every other document
+# field resolves its own dependencies inside analyze_document.
+APP_FIELD_REQUIRES = {
+    "HTTP Info": (),
+    "HTTP Response Time": (),
+    "Page Load Time": (),
+    "Broken Images": ("Broken Assets",),
+    "Broken Assets": ("assets",),
+    "Score": tuple(SCORE_CHECKS)
+}
 
+# Named field sets; "Score" also adds "Max Score"
+FIELD_PROFILES = {
+    "full": PAGE_FIELDS + ["Score"],
+    "links": ["Meta Tags", "Meta Keywords", "Canonical Link", "Internal Links", "External Links", "Social Media Links"],
+    "score": ["Score"]
+}
+
+def resolve_fields(fields):
+    # Everything needed to produce fields: the set of app-level values and
+    # the document values to ask analyze_document for
+    needed = set()
+    pending = list(fields)
+    while pending:
+        field = pending.pop()
+        if field in needed:
+            continue
+        if field in APP_FIELD_REQUIRES:
+            pending.extend(APP_FIELD_REQUIRES[field])
+        elif field != "assets" and field not in DOCUMENT_FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        needed.add(field)
+    document_fields = sorted(field for field in needed if field not in APP_FIELD_REQUIRES)
+    return needed, document_fields
+
+def field_set(fields):
+    # A profile name or an iterable of field names; None means every field
+    if fields is None or fields == "full":
+        return None
+    if isinstance(fields, str):
+        if fields not in FIELD_PROFILES:
+            raise ValueError(f"Unknown field profile: {fields}")
+        fields = FIELD_PROFILES[fields]
+    fields = sorted(set(fields))
+    resolve_fields(fields)
+    return fields
+
+async def fetch_and_analyze(engine, url, parser=None, validator_store=None, metrics=None, fields=None,
+                            boilerplate_filter=None):
+    # With a validator store, a 304 or a byte-identical body reuses the stored analysis.
+    # With a boilerplate filter, the page's text leaves out the host's known
+    # boilerplate, and the page's paragraphs are counted towards it.
+    metrics = metrics if metrics is not None else PageMetrics()
+    config = scrape_config(parser, fields, boilerplate_filter)
+    document_fields = None if config["fields"] is None else resolve_fields(config["fields"])[1]
+    boilerplate = None
+    if boilerplate_filter is not None:
+        boilerplate = boilerplate_filter.paragraphs(url)
+        document_fields = (DOCUMENT_FIELDS + ["assets"] if document_fields is None else document_fields) + ["paragraph_hashes"]
+    previous = await engine.store(validator_store.get, url, config) if validator_store is not None else None
+    with metrics.stage("fetch"):
+        fetch = await fetch_page_async(engine, url, previous)
+    if previous is not None and fetch.status_code == 304:
+        # A 304 carries updated headers only; report the stored response they refresh
+        headers = CIMultiDict(previous["headers"])
+        headers.update(fetch.headers)
+        fetch = replace(fetch, status_code=previous["status_code"], headers=headers)
+        content_hash = previous["content_hash"]
+        outcome = "not_modified"
+    else:
+        content_hash = hashlib.sha256(fetch.content).hexdigest()
+        outcome = "unchanged" if previous is not None and previous["content_hash"] == content_hash else "reanalyzed"
+
+    if outcome == "reanalyzed":
+        # "analyze" includes waiting for a free parse worker; the worker reports its own stages
+        with metrics.stage("analyze"):
+            fields, assets, links, stages = await engine.parse(
+                analyze_document, url, fetch.content, parser, config["analysis_mode"], document_fields, boilerplate
+            )
+        metrics.add_stages(stages)
+        if boilerplate_filter is not None:
+            boilerplate_filter.learn(url, fields.pop("paragraph_hashes"))
+    else:
+        fields, assets, links = previous["fields"], previous["assets"], previous["links"]
+
+    if validator_store is not None:
+        validator_store.record(outcome)
+        if 200 <= fetch.status_code < 300:
+            await engine.store(validator_store.put, url, config, fetch, content_hash, fields, assets, links)
+    return fetch, dict(fields), assets, links
+
+async def scrape_page_async(engine, url, parser=None, validator_store=None, fields=None, boilerplate_filter=None):
+    # Returns the scrape_website result plus the fetch and the page's raw hrefs.
+    # fields (see field_set) limits the result, and the work done, to those
+    # fields and what they depend on.
+    fields = field_set(fields)
+    needed = None if fields is None else resolve_fields(fields)[0]
+    metrics = PageMetrics()
+    token = current_page_metrics.set(metrics)
+    try:
+        with metrics.stage("total"):
+            fetch, values, assets, links = await fetch_and_analyze(
+                engine, url, parser, validator_store, metrics, fields, boilerplate_filter
+            )
+            if needed is None or "Broken Assets" in needed:
+                with metrics.stage("broken_assets"):
+                    broken_assets = await check_broken_assets_async(engine, fetch.final_url, assets)
+                values["Broken Images"] = broken_assets["media"]
+                values["Broken Assets"] = broken_assets
+    finally:
+        current_page_metrics.reset(token)
+    values.update({
+        "HTTP Info": extract_http_info(fetch),
+        "HTTP Response Time": extract_http_response_time(fetch),
+        "Page Load Time": fetch.load_time
+    })
+    data = {field: values[field] for field in PAGE_FIELDS if fields is None or field in fields}
+
+    if fields is None or "Score" in fields:
+        data["Score"], data["Max Score"] = score_website(values)
+    data["Metrics"] = metrics.to_dict()
+
+    return data, fetch, links
+
+async def scrape_website_async(engine, url, parser=None, validator_store=None, fields=None, boilerplate_filter=None):
+    data, _, _ = await scrape_page_async(engine, url, parser, validator_store, fields, boilerplate_filter)
     return data
 
+def scrape_config(parser=None, fields=None, boilerplate_filter=None):
+    # Everything besides the URL that changes what scrape_website returns
+    return {
+        "parser": parser or DEFAULT_PARSER,
+        "max_body_size": HTTP_MAX_BODY_SIZE,
+        "analysis": ANALYSIS_VERSION,
+        "analysis_mode": ANALYSIS_MODE,
+        "fields": field_set(fields),
+        "boilerplate_pages": boilerplate_filter.min_pages if boilerplate_filter is not None else None
+    }
+
+def scrape_website(url, parser=None, fields=None):
+    engine = get_engine()
+    return engine.run(scrape_website_async(engine, url, parser, fields=fields))
+
 def compare_websites(scraped_data):
     comparison = {}
     keys = scraped_data[list(scraped_data.keys())[0]].keys()
@@ -442,82 +1436,332 @@ def compare_websites(scraped_data):
         
     return comparison
 
+# Typed columnar view of many results, one row per URL, built once per
+# analysis. Numeric fields are kept as they are and list fields become
+# counts, so dashboards aggregate columns instead of walking result dicts.
+COMPARISON_NUMERIC_FIELDS = {
+    "Score": "Int64", "Max Score": "Int64", "Word Count": "Int64", "Page Load Time": "Float64",
+    "HTTP Response Time": "Float64", "Sentiment Polarity": "Float64", "Sentiment Subjectivity": "Float64"
+}
+COMPARISON_COUNT_FIELDS = [
+    "Meta Tags", "Internal Links", "External Links", "Social Media Links", "Media", "Forms", "Tables",
+    "Headings", "Tracking Scripts", "External JavaScript", "Stylesheets", "iFrames", "Audio Files",
+    "Broken Images", "Comments", "JSON-LD Data", "Meta Keywords"
+]
+
+def count_items(value):
+    # Headings is a dict of lists per level; Meta Tags a dict of one value per tag
+    if isinstance(value, dict):
+        return sum(len(item) if isinstance(item, list) else 1 for item in value.values())
+    return len(value)
+
+def comparison_table(scraped_data):
+    import pandas as pd
+
+    columns = {
+        name: [] for name in
+        ["URL", "Error", "Status Code", "Detected Language", *COMPARISON_NUMERIC_FIELDS, *COMPARISON_COUNT_FIELDS]
+    }
+    for url, data in scraped_data.items():
+        columns["URL"].append(url)
+        columns["Error"].append(data.get("error"))
+        columns["Status Code"].append((data.get("HTTP Info") or {}).get("status_code"))
+        columns["Detected Language"].append(data.get("Detected Language"))
+        for field in COMPARISON_NUMERIC_FIELDS:
+            columns[field].append(data.get(field))
+        for field in COMPARISON_COUNT_FIELDS:
+            columns[field].append(count_items(data[field]) if field in data else None)
+    dtypes = {"Status Code": "Int64", "Detected Language": "category", **COMPARISON_NUMERIC_FIELDS}
+    dtypes.update({field: "Int64" for field in COMPARISON_COUNT_FIELDS})
+    return pd.DataFrame(columns).astype(dtypes)
+
+def near_duplicate_table(scraped_data):
+    # One row per page nearly the same as a page before it, and which page that is
+    import pandas as pd
+
+    index = NearDuplicateIndex()
+    rows = []
+    for url, data in scraped_data.items():
+        fingerprint = data.get("Fingerprint")
+        if not fingerprint or not fingerprint["minhash"]:
+            continue
+        matches = index.query(fingerprint["minhash"])
+        if matches:
+            rows.extend({"URL": url, "Near Duplicate Of": match["url"], "Similarity": match["similarity"]} for match in matches)
+        else:
+            index.add(url, fingerprint["minhash"])
+    return pd.DataFrame(rows, columns=["URL", "Near Duplicate Of", "Similarity"])
+
+def profile_page(url, output_path, parser=None):
+    # cProfile only sees the calling thread, so the page is fetched on the
+    # engine first and the CPU-bound analysis is then profiled in this thread
+    engine = get_engine()
+    fetch = engine.run(fetch_page_async(engine, url))
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        analyze_document(url, fetch.content, parser)
+    finally:
+        profiler.disable()
+    profiler.dump_stats(output_path)
+    return pstats.Stats(profiler)
+
+PROMETHEUS_METRICS = [
+    ("scraper_stage_wall_seconds", "Wall-clock time spent in a scrape stage"),
+    ("scraper_stage_cpu_seconds", "CPU time spent in a scrape stage"),
+    ("scraper_page_requests", "HTTP requests made for a page, retries and asset checks included"),
+    ("scraper_page_response_bytes", "Response body bytes downloaded for a page")
+]
+
+def prometheus_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def metrics_to_prometheus(scraped_data):
+    samples = defaultdict(list)
+    for url, data in scraped_data.items():
+        metrics = data.get("Metrics")
+        if metrics is None:
+            continue
+        page = f'url="{prometheus_label(url)}"'
+        for stage, timings in metrics["stages"].items():
+            labels = f'{page},stage="{prometheus_label(stage)}"'
+            samples["scraper_stage_wall_seconds"].append(f"{{{labels}}} {timings['wall_time']}")
+            if "cpu_time" in timings:
+                samples["scraper_stage_cpu_seconds"].append(f"{{{labels}}} {timings['cpu_time']}")
+        samples["scraper_page_requests"].append(f"{{{page}}} {metrics['requests']}")
+        samples["scraper_page_response_bytes"].append(f"{{{page}}} {metrics['response_bytes']}")
+
+    lines = []
+    for name, help_text in PROMETHEUS_METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f"{name}{sample}" for sample in samples[name])
+    return "\n".join(lines) + "\n"
+
+def metrics_to_json(scraped_data):
+    return json.dumps({url: data["Metrics"] for url, data in scraped_data.items() if "Metrics" in data}, indent=4)
+
 def convert_to_json(data):
     return json.dumps(data, indent=4)
 
-def convert_to_csv(data):
-    output = io.StringIO()
-    df = pd.json_normalize(data)
-    df.to_csv(output, index=False)
-    return output.getvalue()
-
-def convert_to_excel(data):
-    output = io.BytesIO()
-    df = pd.json_normalize(data)
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Data')
-    return output.getvalue()
-
-st.set_page_config(page_title="Comprehensive Web Scraping Tool", layout="wide", initial_sidebar_state="expanded")
-
-hide_streamlit_style = """
-    <style>
-        .css-1r6p8d1 {display: none;} 
-        .css-1v3t3fg {display: none;} 
-        .css-1r6p8d1 .st-ae {display: none;} 
-        header {visibility: hidden;} 
-        .css-1tqja98 {visibility: hidden;} 
-    </style>
-"""
-st.markdown(hide_streamlit_style, unsafe_allow_html=True)
-
-st.markdown("""
-    <style>
-        .main {
-            background-color: #1e1e1e;
-            color: #ffffff;
-            padding: 2rem;
-            border-radius: 10px;
-        }
-        .stButton>button {
-            background-color: #0078d4;
-            color: white;
-            border-radius: 5px;
-            padding: 0.5rem 1rem;
-            font-size: 1rem;
-        }
-        .stTextInput>div>div>input {
-            background-color: #333333;
-            color: #ffffff;
-            border: 1px solid #555555;
-            padding: 0.5rem;
-            border-radius: 5px;
-        }
-        .stAlert {
-            border-radius: 5px;
-        }
-        .css-1aumxhk {
-            padding-top: 2rem;
+# Flattened export schema. Each page is one row of the pages table, with
+# scalar fields as typed columns and nested fields as JSON text. List fields
+# go to the items table and keyword weights to the terms table, one row per
+# element, so no table grows a column per keyword or link.
+EXPORT_SCALAR_COLUMNS = [
+    ("url", "string"), ("depth", "int"), ("error", "string"), ("Score", "int"), ("Max Score", "int"),
+    ("Detected Language", "string"), ("Word Count", "int"), ("Sentiment Polarity", "float"),
+    ("Sentiment Subjectivity", "float"), ("Page Load Time", "float"), ("HTTP Response Time", "float"),
+    ("Viewport Meta Tag", "string"), ("Canonical Link", "string"), ("Favicon", "string"), ("Main Content", "string")
+]
+EXPORT_JSON_FIELDS = [
+    "Meta Tags", "HTTP Info", "Headings", "JSON-LD Data", "Schema Markup", "Forms", "Media", "Tables",
+    "Contact Info", "Broken Assets", "Fingerprint", "Near Duplicates", "Metrics"
+]
+EXPORT_ITEM_FIELDS = [
+    "Internal Links", "External Links", "Social Media Links", "Meta Keywords", "Tracking Scripts",
+    "External JavaScript", "Stylesheets", "iFrames", "Audio Files", "Broken Images", "Comments"
+]
+EXPORT_TERM_FIELDS = {"Keyword Density": "keyword", "Top Bigrams": "bigram"}
+EXPORT_TABLES = {
+    "pages": EXPORT_SCALAR_COLUMNS + [(field, "json") for field in EXPORT_JSON_FIELDS],
+    "items": [("url", "string"), ("field", "string"), ("position", "int"), ("value", "string")],
+    "terms": [("url", "string"), ("kind", "string"), ("term", "string"), ("weight", "float")]
+}
+
+def export_rows(record):
+    # (table, row) pairs for one batch or crawl record, rows in EXPORT_TABLES column order
+    url = record["url"]
+    result = record.get("result", {})
+    page = {"url": url, "depth": record.get("depth"), "error": record.get("error")}
+    row = [page[name] if name in page else result.get(name) for name, _ in EXPORT_SCALAR_COLUMNS]
+    row.extend(json.dumps(result[field], default=str) if field in result else None for field in EXPORT_JSON_FIELDS)
+    yield "pages", row
+    for field in EXPORT_ITEM_FIELDS:
+        for position, value in enumerate(result.get(field) or ()):
+            yield "items", [url, field, position, value]
+    for field, kind in EXPORT_TERM_FIELDS.items():
+        for term, weight in (result.get(field) or {}).items():
+            yield "terms", [url, kind, term, weight]
+
+def export_table_path(path, table):
+    # results.csv holds the pages table, results.items.csv and results.terms.csv the others
+    if table == "pages":
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{table}{extension}"
+
+class JsonLinesExporter:
+    # Nested records as they are, one per line, like batch mode's output
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, default=str) + "\n")
+
+    def close(self):
+        self.file.close()
+
+class CsvExporter:
+    def __init__(self, path):
+        self.files = {}
+        self.writers = {}
+        for table, columns in EXPORT_TABLES.items():
+            self.files[table] = open(export_table_path(path, table), "w", encoding="utf-8", newline="")
+            self.writers[table] = csv.writer(self.files[table])
+            self.writers[table].writerow([name for name, _ in columns])
+
+    def write(self, record):
+        for table, row in export_rows(record):
+            self.writers[table].writerow(row)
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+PARQUET_ROW_GROUP_SIZE = 10000
+PARQUET_ROW_GROUP_BYTES = 16 * 1024 * 1024
+
+class ParquetExporter:
+    # Rows are buffered per table and written out as a row group every
+    # PARQUET_ROW_GROUP_SIZE rows or PARQUET_ROW_GROUP_BYTES of text, which
+    # bounds memory for any number of pages
+    def __init__(self, path, row_group_size=PARQUET_ROW_GROUP_SIZE, row_group_bytes=PARQUET_ROW_GROUP_BYTES):
+        # pyarrow is only needed for this format
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        types = {"string": pyarrow.string(), "json": pyarrow.string(), "int": pyarrow.int64(), "float": pyarrow.float64()}
+        self.row_group_size = row_group_size
+        self.row_group_bytes = row_group_bytes
+        self.schemas = {
+            table: pyarrow.schema([(name, types[kind]) for name, kind in columns])
+            for table, columns in EXPORT_TABLES.items()
         }
-        .reportview-container .main footer {
-            visibility: hidden;
+        self.writers = {
+            table: pyarrow.parquet.ParquetWriter(export_table_path(path, table), schema)
+            for table, schema in self.schemas.items()
         }
-    </style>
-""", unsafe_allow_html=True)
+        self.buffers = {table: [] for table in EXPORT_TABLES}
+        self.buffered_bytes = Counter()
+
+    def _flush(self, table):
+        rows = self.buffers[table]
+        if rows:
+            columns = [list(column) for column in zip(*rows)]
+            self.writers[table].write_batch(self.pyarrow.RecordBatch.from_arrays(columns, schema=self.schemas[table]))
+            self.buffers[table] = []
+            self.buffered_bytes[table] = 0
+
+    def write(self, record):
+        for table, row in export_rows(record):
+            self.buffers[table].append(row)
+            self.buffered_bytes[table] += sum(len(value) for value in row if isinstance(value, str))
+            if len(self.buffers[table]) >= self.row_group_size or self.buffered_bytes[table] >= self.row_group_bytes:
+                self._flush(table)
+
+    def close(self):
+        for table, writer in self.writers.items():
+            self._flush(table)
+            writer.close()
+
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_CELL_CHARS = 32767
+
+class ExcelExporter:
+    # One sheet per table, written row by row in xlsxwriter's constant memory
+    # mode. A table that outgrows a sheet continues on "items (2)" and so on;
+    # text past Excel's cell limit is cut off (the other formats keep it whole).
+    def __init__(self, path):
+        import xlsxwriter
+
+        options = {"constant_memory": True, "strings_to_urls": False, "strings_to_numbers": False, "strings_to_formulas": False}
+        self.workbook = xlsxwriter.Workbook(path, options)
+        self.sheets = {}
+        self.rows = {}
+        self.sheet_counts = Counter()
+        for table in EXPORT_TABLES:
+            self._add_sheet(table)
+
+    def _add_sheet(self, table):
+        self.sheet_counts[table] += 1
+        count = self.sheet_counts[table]
+        self.sheets[table] = self.workbook.add_worksheet(table if count == 1 else f"{table} ({count})")
+        self.sheets[table].write_row(0, 0, [name for name, _ in EXPORT_TABLES[table]])
+        self.rows[table] = 1
+
+    def write(self, record):
+        for table, row in export_rows(record):
+            if self.rows[table] == EXCEL_MAX_ROWS:
+                self._add_sheet(table)
+            row = [value[:EXCEL_MAX_CELL_CHARS] if isinstance(value, str) else value for value in row]
+            self.sheets[table].write_row(self.rows[table], 0, row)
+            self.rows[table] += 1
+
+    def close(self):
+        self.workbook.close()
+
+EXPORT_FORMATS = {
+    ".jsonl": JsonLinesExporter,
+    ".csv": CsvExporter,
+    ".parquet": ParquetExporter,
+    ".xlsx": ExcelExporter
+}
+
+def open_exporter(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {extension!r}; use one of {', '.join(EXPORT_FORMATS)}")
+    return EXPORT_FORMATS[extension](path)
+
+def export_records(records, path):
+    exporter = open_exporter(path)
+    try:
+        for record in records:
+            exporter.write(record)
+    finally:
+        exporter.close()
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def load_batch_results(file):
+    # Batch mode records as a scraped_data dict, read line by line from a binary file
+    scraped_data = {}
+    for line in file:
+        if line.strip():
+            record = json.loads(line)
+            scraped_data[record["url"]] = record["result"] if "result" in record else {"error": record["error"]}
+    return scraped_data
 
-st.title("Comprehensive Web Scraping Tool")
-st.subheader("Analyze and extract detailed information from any web page")
+def scraped_records(scraped_data):
+    for url, data in scraped_data.items():
+        yield {"url": url, "error": data["error"]} if "error" in data else {"url": url, "result": data}
 
-url1 = st.text_input("Enter the first URL for analysis", placeholder="https://example.com", key="url1")
-url2 = st.text_input("Enter the second URL for analysis (optional)", placeholder="https://example.com", key="url2")
-url3 = st.text_input("Enter the third URL for analysis (optional)", placeholder="https://example.com", key="url3")
+def export_download(scraped_data, extension):
+    # The export as bytes for a download button; formats with several tables come as a zip
+    with tempfile.TemporaryDirectory() as directory:
+        export_records(scraped_records(scraped_data), os.path.join(directory, f"results{extension}"))
+        names = sorted(os.listdir(directory))
+        if len(names) == 1:
+            with open(os.path.join(directory, names[0]), "rb") as f:
+                return f.read()
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name in names:
+                archive.write(os.path.join(directory, name), name)
+        return output.getvalue()
 
-urls = [url1, url2, url3]
-urls = [url for url in urls if url]
+# Larger sets are better analyzed in batch mode and loaded into the app from its output
+MAX_ANALYZE_URLS = 100
 
-def analyze_urls(urls):
-    if len(urls) > 3:
-        st.error("Please enter up to 3 URLs only.")
+def analyze_urls(urls, use_cache=True):
+    if len(urls) > MAX_ANALYZE_URLS:
+        st.error(f"Please enter up to {MAX_ANALYZE_URLS} URLs only.")
         return
 
     invalid_urls = [url for url in urls if not is_valid_url(url)]
@@ -525,106 +1769,687 @@ def analyze_urls(urls):
         st.error(f"Invalid URLs: {', '.join(invalid_urls)}")
         return
 
-    disallowed_urls = [url for url in urls if not is_scraping_allowed(url)]
+    engine = get_engine()
+
+    config = scrape_config()
+    result_store = get_result_store()
+
+    async def preflight_and_scrape(url):
+        if use_cache:
+            cached = engine.result_cache.get(url, config)
+            if cached is not None:
+                return cached
+        if not await is_scraping_allowed_async(engine, url):
+            return None
+        result = await scrape_website_async(engine, url)
+        engine.result_cache.set(url, config, result)
+        if result_store is not None:
+            await engine.store(result_store.record, url, result)
+        return result
+
+    results = {}
+    disallowed_urls = []
+    robots_errors = []
+    future_to_url = {engine.submit(preflight_and_scrape(url)): url for url in urls}
+    for future in future_to_url:
+        url = future_to_url[future]
+        try:
+            result = future.result()
+        except RobotsUnavailable as e:
+            robots_errors.append(str(e))
+            continue
+        except Exception as e:
+            results[url] = {"error": str(e)}
+            continue
+        if result is None:
+            disallowed_urls.append(url)
+        else:
+            results[url] = result
+
     if disallowed_urls:
         st.warning(f"Scraping not allowed on: {', '.join(disallowed_urls)}")
-        return
+    if robots_errors:
+        st.warning(f"Skipped because robots.txt could not be checked: {'; '.join(robots_errors)}")
 
-    results = {}
-    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
-        future_to_url = {executor.submit(scrape_website, url): url for url in urls}
-        for future in future_to_url:
-            url = future_to_url[future]
+    return results
+
+BATCH_WORKERS = 16
+BATCH_CHECKPOINT_EVERY = 50
+
+class BatchCheckpoint:
+    # Tracks finished input lines as a low-water mark plus the few finished
+    # lines above it, so the state stays as small as the in-flight window.
+    def __init__(self, path=None):
+        self.path = path
+        self.completed_through = -1
+        self.completed = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.completed_through = state["completed_through"]
+            self.completed = set(state["completed"])
+
+    def is_done(self, index):
+        return index <= self.completed_through or index in self.completed
+
+    def mark_done(self, index):
+        self.completed.add(index)
+        while self.completed_through + 1 in self.completed:
+            self.completed_through += 1
+            self.completed.remove(self.completed_through)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"completed_through": self.completed_through, "completed": sorted(self.completed)}, f)
+        os.replace(tmp_path, self.path)
+
+async def analyze_url_record_async(engine, url, validator_store=None, fields=None, boilerplate_filter=None):
+    if not is_valid_url(url):
+        return {"url": url, "error": "Invalid URL"}
+    try:
+        if not await is_scraping_allowed_async(engine, url):
+            return {"url": url, "error": "Scraping not allowed by robots.txt"}
+        result = await scrape_website_async(
+            engine, url, validator_store=validator_store, fields=fields, boilerplate_filter=boilerplate_filter
+        )
+        return {"url": url, "result": result}
+    except Exception as e:
+        return {"url": url, "error": str(e)}
+
+def run_batch(lines, output, workers=BATCH_WORKERS, checkpoint_path=None, checkpoint_every=BATCH_CHECKPOINT_EVERY,
+              validator_store=None, on_record=None, fields=None, boilerplate_filter=None):
+    # Pages nearly the same as one analyzed earlier in the run get a "Near Duplicates" list
+    checkpoint = BatchCheckpoint(checkpoint_path)
+    counts = {"analyzed": 0, "failed": 0, "skipped": 0, "duplicates": 0}
+    near_duplicates = NearDuplicateIndex()
+    in_flight = {}
+    unsaved = 0
+
+    def drain():
+        nonlocal unsaved
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = in_flight.pop(future)
+            record = future.result()
+            if "result" in record and near_duplicates.check(record["url"], record["result"]):
+                counts["duplicates"] += 1
+            output.write(json.dumps(record, default=str) + "\n")
+            if on_record is not None:
+                on_record(record)
+            counts["failed" if "error" in record else "analyzed"] += 1
+            checkpoint.mark_done(index)
+            unsaved += 1
+        output.flush()
+        if unsaved >= checkpoint_every:
+            checkpoint.save()
+            unsaved = 0
+
+    engine = get_engine()
+    for index, line in enumerate(lines):
+        url = line.strip()
+        if not url or url.startswith("#"):
+            checkpoint.mark_done(index)
+            continue
+        if checkpoint.is_done(index):
+            counts["skipped"] += 1
+            continue
+        # Only a bounded window of URLs is read ahead, so memory does not grow with the input
+        while len(in_flight) >= workers * 2:
+            drain()
+        in_flight[engine.submit(analyze_url_record_async(engine, url, validator_store, fields, boilerplate_filter))] = index
+    while in_flight:
+        drain()
+    checkpoint.save()
+    if validator_store is not None:
+        counts.update(validator_store.stats)
+    return counts
+
+CRAWL_MAX_DEPTH = 3
+CRAWL_MAX_PAGES = 1000
+CRAWL_MAX_FRONTIER = 100000
+CRAWL_SEEN_CAPACITY = 10_000_000
+CRAWL_PROGRESS_EVERY = 100
+
+class BloomFilter:
+    # Fixed-size seen-set: about 1.8 MB per million URLs at a 0.1% false
+    # positive rate, where a false positive only means a page is skipped.
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item):
+        return all(self.bits[position // 8] & (1 << position % 8) for position in self._positions(item))
+
+async def crawl_page_async(engine, url, validator_store=None, fields=None, boilerplate_filter=None):
+    try:
+        if not await is_scraping_allowed_async(engine, url):
+            return {"url": url, "error": "Scraping not allowed by robots.txt"}, [], url
+        data, fetch, links = await scrape_page_async(
+            engine, url, validator_store=validator_store, fields=fields, boilerplate_filter=boilerplate_filter
+        )
+        return {"url": url, "result": data}, links, fetch.final_url
+    except Exception as e:
+        return {"url": url, "error": str(e)}, [], url
+
+def crawl_site(seed, output, max_depth=CRAWL_MAX_DEPTH, max_pages=CRAWL_MAX_PAGES, max_per_host=None,
+               include_subdomains=False, workers=BATCH_WORKERS, max_frontier=CRAWL_MAX_FRONTIER,
+               seen_capacity=CRAWL_SEEN_CAPACITY, validator_store=None, progress=None, on_record=None, fields=None,
+               boilerplate_filter=None, skip_duplicates=False):
+    # Pages nearly the same as one crawled earlier get a "Near Duplicates"
+    # list; with skip_duplicates, their links are not followed
+    seed = normalize_url(seed)
+    seed_host = urlsplit(seed).hostname or ""
+
+    def in_scope(url):
+        parsed = urlsplit(url)
+        host = parsed.hostname or ""
+        return parsed.scheme in ("http", "https") and (
+            host == seed_host or (include_subdomains and host.endswith(f".{seed_host}"))
+        )
+
+    seen = BloomFilter(seen_capacity)
+    seen.add(seed)
+    frontier = deque([(seed, 0)])
+    host_counts = Counter()
+    counts = {"crawled": 0, "failed": 0, "dropped": 0, "duplicates": 0}
+    near_duplicates = NearDuplicateIndex()
+    in_flight = {}
+    scheduled = 0
+    start_time = time.monotonic()
+
+    def enqueue(links, base_url, depth):
+        for href in links:
             try:
-                result = future.result()
-                results[url] = result
-            except Exception as e:
-                results[url] = {"error": str(e)}
+                url = normalize_url(urljoin(base_url, href))
+            except ValueError:
+                # Malformed hrefs (a non-numeric port, unbalanced IPv6 brackets) are skipped
+                continue
+            if not in_scope(url) or url in seen:
+                continue
+            if len(frontier) >= max_frontier:
+                # Not marked as seen, so the URL can still be picked up from a later page
+                counts["dropped"] += 1
+                continue
+            seen.add(url)
+            frontier.append((url, depth))
 
-    return results
+    def drain():
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            url, depth = in_flight.pop(future)
+            record, links, final_url = future.result()
+            record["depth"] = depth
+            duplicate = "result" in record and near_duplicates.check(url, record["result"])
+            counts["duplicates"] += duplicate
+            output.write(json.dumps(record, default=str) + "\n")
+            if on_record is not None:
+                on_record(record)
+            counts["failed" if "error" in record else "crawled"] += 1
+            if depth < max_depth and not (duplicate and skip_duplicates):
+                enqueue(links, final_url, depth + 1)
+            finished = counts["crawled"] + counts["failed"]
+            if progress is not None and finished % CRAWL_PROGRESS_EVERY == 0:
+                progress(finished, len(frontier), finished / (time.monotonic() - start_time))
+        output.flush()
+
+    engine = get_engine()
+    while True:
+        while frontier and len(in_flight) < workers and scheduled < max_pages:
+            url, depth = frontier.popleft()
+            host = urlsplit(url).netloc
+            if max_per_host is not None and host_counts[host] >= max_per_host:
+                continue
+            host_counts[host] += 1
+            scheduled += 1
+            in_flight[engine.submit(crawl_page_async(engine, url, validator_store, fields, boilerplate_filter))] = (url, depth)
+        if not in_flight:
+            break
+        drain()
 
-if st.button("Analyze"):
-    if not urls:
-        st.error("Please enter at least one URL.")
+    elapsed = time.monotonic() - start_time
+    counts["seen"] = seen.count
+    counts["elapsed"] = elapsed
+    counts["pages_per_second"] = (counts["crawled"] + counts["failed"]) / elapsed if elapsed else 0.0
+    return counts
+
+def write_tfidf(spool, path):
+    # spool holds one JSON [url, "Keyword Density"] pair per line. One pass
+    # counts document frequencies and a second writes each page's weights,
+    # so no step holds every page in memory.
+    spool.seek(0)
+    frequencies, pages = document_frequencies(json.loads(line)[1] for line in spool)
+    spool.seek(0)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for position, line in enumerate(spool):
+            url, densities = json.loads(line)
+            f.write(",\n" if position else "\n")
+            f.write(f"  {json.dumps(url)}: {json.dumps(tfidf_weights(densities, frequencies, pages))}")
+        f.write("\n}\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze URLs without the Streamlit UI and write one JSON object per line.")
+    parser.add_argument("input", nargs="?", help="File with one URL per line, or - to read from stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSON Lines file to append results to (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS, help="Number of URLs analyzed concurrently")
+    parser.add_argument("--checkpoint", help="Checkpoint file; rerunning with the same input and checkpoint resumes where it stopped")
+    parser.add_argument("--state", help="SQLite file of per-URL validators; pages unchanged since the last run are not re-analyzed")
+    parser.add_argument("--history", help="SQLite file that keeps every analysis; see --changes")
+    parser.add_argument("--changes", metavar="URL", help="Print what changed on URL between its last two analyses in --history, then exit")
+    parser.add_argument("--duplicates", metavar="URL",
+                        help="Print the pages in --history with nearly the same text as URL, or the same template, then exit")
+    parser.add_argument("--tfidf", help="Also write the most distinctive terms of each page analyzed in this run, by TF-IDF across all of them, to this JSON file")
+    parser.add_argument("--export", metavar="PATH",
+                        help=f"Also write the results to PATH, in the format of its extension ({', '.join(EXPORT_FORMATS)})")
+    parser.add_argument("--convert", metavar="RESULTS", help="Write the JSON Lines results of an earlier run to --export, then exit")
+    parser.add_argument("--fields", default="full",
+                        help=f"Field profile ({', '.join(FIELD_PROFILES)}) or comma-separated field names to compute (default: full)")
+    parser.add_argument("--boilerplate-pages", type=int, default=0, metavar="N",
+                        help="Leave paragraphs found on N or more pages of a host out of the text of its later pages (default: off)")
+    crawl_group = parser.add_argument_group("crawl mode")
+    crawl_group.add_argument("--crawl", metavar="SEED_URL", help="Crawl the site starting at SEED_URL instead of reading a URL list")
+    crawl_group.add_argument("--max-depth", type=int, default=CRAWL_MAX_DEPTH, help="Maximum link depth from the seed")
+    crawl_group.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES, help="Maximum number of pages to crawl")
+    crawl_group.add_argument("--max-per-host", type=int, help="Maximum number of pages to crawl per host")
+    crawl_group.add_argument("--include-subdomains", action="store_true", help="Also follow links to subdomains of the seed host")
+    crawl_group.add_argument("--skip-duplicates", action="store_true",
+                             help="Do not follow links from pages nearly the same as one crawled before")
+    profile_group = parser.add_argument_group("profiling")
+    profile_group.add_argument("--profile", metavar="URL", help="Profile the analysis of a single URL with cProfile instead")
+    profile_group.add_argument("--profile-output", default="scrape.prof", help="Where to write the cProfile stats (default: scrape.prof)")
+    args = parser.parse_args(argv)
+    if args.changes and not args.history:
+        parser.error("--changes needs --history")
+    if args.duplicates and not args.history:
+        parser.error("--duplicates needs --history")
+    if args.convert and not args.export:
+        parser.error("--convert needs --export")
+    if not args.crawl and not args.input and not args.profile and not args.changes and not args.duplicates and not args.convert:
+        parser.error("an input file, --crawl SEED_URL, --profile URL, --changes URL, --duplicates URL or --convert RESULTS is required")
+    if args.export and os.path.splitext(args.export)[1].lower() not in EXPORT_FORMATS:
+        parser.error(f"--export: unknown format; use a file name ending in one of {', '.join(EXPORT_FORMATS)}")
+    fields = args.fields if args.fields in FIELD_PROFILES else [field.strip() for field in args.fields.split(",")]
+    try:
+        fields = field_set(fields)
+    except ValueError as e:
+        parser.error(str(e))
+    if fields is not None and args.history:
+        parser.error("--history keeps complete analyses and cannot be combined with --fields")
+    if fields is not None and args.tfidf:
+        fields = field_set(fields + ["Keyword Density"])
+    # Cached resources are used outside a Streamlit session here; that is expected
+    streamlit_logger.set_log_level("error")
+
+    if args.convert:
+        export_records(read_records(args.convert), args.export)
+        return 0
+
+    if args.profile:
+        try:
+            stats = profile_page(args.profile, args.profile_output)
+        finally:
+            get_engine().close()
+        stats.stream = sys.stderr
+        stats.sort_stats("cumulative").print_stats(20)
+        print(f"Profile written to {args.profile_output}", file=sys.stderr)
+        return 0
+
+    result_store = ResultStore(args.history) if args.history else None
+    if args.changes:
+        try:
+            changes = result_store.diff_latest(args.changes, details=True)
+        finally:
+            result_store.close()
+        if changes is None:
+            print(f"Fewer than two analyses of {args.changes} in {args.history}", file=sys.stderr)
+            return 1
+        print(json.dumps(changes, indent=2, default=str))
+        return 0
+    if args.duplicates:
+        try:
+            duplicates = result_store.near_duplicates(args.duplicates)
+        finally:
+            result_store.close()
+        if duplicates is None:
+            print(f"No fingerprinted analysis of {args.duplicates} in {args.history}", file=sys.stderr)
+            return 1
+        print(json.dumps(duplicates, indent=2))
+        return 0
+
+    output_file = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    validator_store = ValidatorStore(args.state) if args.state else None
+    boilerplate_filter = BoilerplateFilter(args.boilerplate_pages) if args.boilerplate_pages > 0 else None
+    exporter = open_exporter(args.export) if args.export else None
+    # Each page's keywords wait on disk for the TF-IDF pass at the end of the run
+    tfidf_spool = tempfile.TemporaryFile("w+", encoding="utf-8") if args.tfidf else None
+
+    def handle_record(record):
+        if exporter is not None:
+            exporter.write(record)
+        if "result" not in record:
+            return
+        if args.tfidf:
+            tfidf_spool.write(json.dumps([record["url"], record["result"]["Keyword Density"]]) + "\n")
+        if result_store is not None:
+            result_store.record(record["url"], record["result"])
+
+    try:
+        if args.crawl:
+            def report_progress(finished, queued, pages_per_second):
+                print(f"{finished} pages, {queued} queued, {pages_per_second:.1f} pages/s", file=sys.stderr)
+
+            counts = crawl_site(
+                args.crawl, output_file, max_depth=args.max_depth, max_pages=args.max_pages,
+                max_per_host=args.max_per_host, include_subdomains=args.include_subdomains,
+                workers=args.workers, validator_store=validator_store, progress=report_progress,
+                on_record=handle_record, fields=fields, boilerplate_filter=boilerplate_filter,
+                skip_duplicates=args.skip_duplicates
+            )
+            print(
+                f"Crawled {counts['crawled']}, failed {counts['failed']}, {counts['duplicates']} near duplicates, {counts['seen']} URLs seen "
+                f"in {counts['elapsed']:.1f}s ({counts['pages_per_second']:.1f} pages/s)", file=sys.stderr
+            )
+        else:
+            input_file = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            try:
+                counts = run_batch(input_file, output_file, workers=args.workers, checkpoint_path=args.checkpoint,
+                                   validator_store=validator_store, on_record=handle_record, fields=fields,
+                                   boilerplate_filter=boilerplate_filter)
+            finally:
+                if input_file is not sys.stdin:
+                    input_file.close()
+            print(
+                f"Analyzed {counts['analyzed']}, failed {counts['failed']}, skipped {counts['skipped']} (already done), "
+                f"{counts['duplicates']} near duplicates", file=sys.stderr
+            )
+        if args.tfidf:
+            write_tfidf(tfidf_spool, args.tfidf)
+        if validator_store is not None:
+            stats = validator_store.stats
+            print(
+                f"Not modified (304) {stats['not_modified']}, unchanged body {stats['unchanged']}, "
+                f"re-analyzed {stats['reanalyzed']}", file=sys.stderr
+            )
+    finally:
+        get_engine().close()
+        if validator_store is not None:
+            validator_store.close()
+        if result_store is not None:
+            result_store.close()
+        if exporter is not None:
+            exporter.close()
+        if tfidf_spool is not None:
+            tfidf_spool.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    return 0
+
+DASHBOARD_PAGE_SIZE = 50
+# Above this many sites, per-site bar charts give way to distributions and samples
+DASHBOARD_BAR_LIMIT = 50
+DASHBOARD_BINS = 20
+DASHBOARD_SAMPLE_SIZE = 1000
+DASHBOARD_METRICS = [*COMPARISON_NUMERIC_FIELDS, *COMPARISON_COUNT_FIELDS, "Detected Language", "Status Code"]
+DASHBOARD_DEFAULT_METRICS = ["Page Load Time", "Word Count", "Internal Links", "Detected Language"]
+
+def metric_distribution(column):
+    # Site counts per value, or per bin for continuous columns, so the chart has a fixed size
+    import pandas as pd
+
+    values = column.dropna()
+    if isinstance(values.dtype, pd.CategoricalDtype) or values.nunique() <= DASHBOARD_BINS:
+        counts = values.astype(str).value_counts().sort_index()
     else:
-        with st.spinner("Scraping and analyzing..."):
-            scraped_data = analyze_urls(urls)
-            if scraped_data:
-                st.success("Scraping completed successfully!")
-                
-                comparison = compare_websites(scraped_data)
-                st.header("Comparison Results")
-                st.json(comparison)
-                
-                st.download_button(
-                    label="Download Comparison JSON",
-                    data=convert_to_json(comparison),
-                    file_name='comparison_data.json',
-                    mime='application/json'
-                )
-                st.download_button(
-                    label="Download Comparison CSV",
-                    data=convert_to_csv(comparison),
-                    file_name='comparison_data.csv',
-                    mime='text/csv'
-                )
-                st.download_button(
-                    label="Download Comparison Excel",
-                    data=convert_to_excel(comparison),
-                    file_name='comparison_data.xlsx',
-                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-                
-                              # New section for visualizing the scoring metrics
-                st.header("Scoring Dashboard")
-                
-                score_data = {url: data["Score"] for url, data in scraped_data.items()}
-                max_score = list(scraped_data.values())[0]["Max Score"]
-                
-                score_df = pd.DataFrame(list(score_data.items()), columns=['URL', 'Score'])
-                score_df['Max Score'] = max_score
-                
-                fig = px.bar(score_df, x='URL', y='Score', title='Website Scores', range_y=[0, max_score])
-                st.plotly_chart(fig)
-                
-                # Detailed scoring for each metric
-                detailed_scores = []
-                for url, data in scraped_data.items():
-                    metrics = {
-                        "URL": url,
-                        "Meta Tags": 10 if data.get("Meta Tags") else 0,
-                        "Detected Language": 10 if data.get("Detected Language") != "Detection failed" else 0,
-                        "Internal Links": 10 if data.get("Internal Links") else 0,
-                        "External Links": 10 if data.get("External Links") else 0,
-                        "Forms": 10 if data.get("Forms") else 0,
-                        "Media": 10 if data.get("Media") else 0,
-                        "Tables": 10 if data.get("Tables") else 0,
-                        "Headings": 10 if data.get("Headings") else 0,
-                        "Social Media Links": 10 if data.get("Social Media Links") else 0,
-                        "HTTP Info": 10 if data.get("HTTP Info") and data["HTTP Info"].get("status_code") == 200 else 0
-                    }
-                    detailed_scores.append(metrics)
-                
-                detailed_score_df = pd.DataFrame(detailed_scores)
-                st.dataframe(detailed_score_df)
-                
-                # Additional dashboards for each metric
-                st.header("Detailed Metrics Dashboard")
-                
-                metric_list = [
-                    "Meta Tags", "Detected Language", "Internal Links", 
-                    "External Links", "Forms", "Media", "Tables", 
-                    "Headings", "Social Media Links", "HTTP Info",
-                    "Page Load Time", "Keyword Density", "Sentiment Polarity", "Sentiment Subjectivity"
-                ]
-
-                for metric in metric_list:
-                    st.subheader(f"{metric} Dashboard")
-                    metric_data = {url: data.get(metric) for url, data in scraped_data.items()}
-                    metric_df = pd.DataFrame(list(metric_data.items()), columns=['URL', metric])
-                    if metric in ["Page Load Time", "Sentiment Polarity", "Sentiment Subjectivity"]:
-                        fig = px.bar(metric_df, x='URL', y=metric, title=f'{metric} Metrics')
-                    else:
-                        metric_df[metric] = metric_df[metric].apply(lambda x: len(x) if isinstance(x, list) else 1 if x else 0)
-                        fig = px.bar(metric_df, x='URL', y=metric, title=f'{metric} Metrics')
-                    st.plotly_chart(fig)
+        counts = pd.cut(values.astype(float), DASHBOARD_BINS).value_counts(sort=False)
+        counts.index = counts.index.astype(str)
+    return pd.DataFrame({column.name: counts.index, "Sites": counts.to_numpy()})
+
+def metric_chart(table, metric):
+    import plotly.express as px
+
+    if len(table) <= DASHBOARD_BAR_LIMIT and metric not in ("Detected Language", "Status Code"):
+        return px.bar(table, x="URL", y=metric, title=f"{metric} Metrics")
+    return px.bar(metric_distribution(table[metric]), x=metric, y="Sites", title=f"{metric} across {len(table)} sites")
+
+def sites_page(table):
+    # Sorting and paging are applied to the table; per-site sections only render the current page
+    left, middle, right = st.columns(3)
+    sort_by = left.selectbox("Sort sites by", [*DASHBOARD_METRICS, "URL"], key="sites_sort")
+    descending = middle.checkbox("Descending", value=True, key="sites_descending")
+    pages = max(1, math.ceil(len(table) / DASHBOARD_PAGE_SIZE))
+    page = right.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="sites_page")
+    start = (page - 1) * DASHBOARD_PAGE_SIZE
+    ordered = table.sort_values(sort_by, ascending=not descending, na_position="last")
+    st.caption(f"Sites {start + 1}-{min(start + DASHBOARD_PAGE_SIZE, len(table))} of {len(table)}")
+    return ordered.iloc[start:start + DASHBOARD_PAGE_SIZE]
+
+def render_results(scraped_data, table):
+    import pandas as pd
+    import plotly.express as px
+
+    st.success("Scraping completed successfully!")
+    st.caption(
+        "HTTP client: {requests} requests, {connections_opened} connections opened, "
+        "{connections_reused} reused".format(**get_http_client().stats.snapshot())
+    )
+    with st.expander("Per-host request scheduler"):
+        st.dataframe(pd.DataFrame.from_dict(get_http_client().scheduler.snapshot(), orient="index"))
+    with st.expander("Timing breakdown"):
+        stage_times = pd.DataFrame.from_dict({
+            url: {stage: timings["wall_time"] * 1000 for stage, timings in data["Metrics"]["stages"].items()}
+            for url, data in scraped_data.items() if "Metrics" in data
+        }, orient="index")
+        st.caption("Wall time per stage across sites, in milliseconds")
+        if not stage_times.empty:
+            st.dataframe(stage_times.describe(percentiles=[0.5, 0.9, 0.99]).T)
+        st.download_button(
+            label="Download Metrics (Prometheus)",
+            data=lambda: metrics_to_prometheus(scraped_data),
+            file_name='scrape_metrics.prom',
+            mime='text/plain'
+        )
+        st.download_button(
+            label="Download Metrics JSON",
+            data=lambda: metrics_to_json(scraped_data),
+            file_name='scrape_metrics.json',
+            mime='application/json'
+        )
+
+    st.header("Comparison Results")
+    st.caption(f"{len(table)} sites; list fields are shown as item counts")
+    st.dataframe(table.describe().T)
+    page = sites_page(table)
+    st.dataframe(page, hide_index=True)
+    site = st.selectbox("Site details", page["URL"], key="site_details")
+    if site is not None:
+        st.json(scraped_data[site], expanded=False)
+
+    # Exports are built when a button is clicked, not on every rerun
+    st.download_button(
+        label="Download Comparison JSON",
+        data=lambda: convert_to_json(compare_websites(scraped_data)),
+        file_name='comparison_data.json',
+        mime='application/json'
+    )
+    downloads = [
+        ("JSON Lines", ".jsonl", "results.jsonl", "application/jsonl"),
+        ("CSV", ".csv", "results_csv.zip", "application/zip"),
+        ("Excel", ".xlsx", "results.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+        ("Parquet", ".parquet", "results_parquet.zip", "application/zip")
+    ]
+    for label, extension, file_name, mime in downloads:
+        st.download_button(
+            label=f"Download Results {label}",
+            data=lambda extension=extension: export_download(scraped_data, extension),
+            file_name=file_name,
+            mime=mime
+        )
+
+    result_store = get_result_store()
+    if result_store is not None:
+        st.header("Changes Since the Previous Analysis")
+        for url in page["URL"]:
+            changes = result_store.diff_latest(url, details=True)
+            if changes is None:
+                st.caption(f"{url}: first analysis on record")
+            else:
+                with st.expander(f"{url}: score {changes['score']['delta']:+d}, {len(changes['changed_fields'])} fields changed"):
+                    st.json(changes)
+
+    keyword_densities = {url: data["Keyword Density"] for url, data in scraped_data.items() if "Keyword Density" in data}
+    if len(keyword_densities) > 1:
+        st.header("Distinctive Terms")
+        st.caption("Each page's top keywords weighted by TF-IDF across the analyzed pages")
+        distinctive = corpus_tfidf(keyword_densities)
+        st.dataframe(pd.DataFrame({url: distinctive[url] for url in page["URL"] if url in distinctive}).fillna(0))
+
+    duplicates = near_duplicate_table(scraped_data)
+    if not duplicates.empty:
+        st.header("Near-Duplicate Pages")
+        st.caption(f"Pages whose text is at least {NEAR_DUPLICATE_SIMILARITY:.0%} the same as a page listed before them")
+        st.dataframe(duplicates, hide_index=True)
+
+    scored = table.dropna(subset=["Score"])
+    if scored.empty:
+        return
+
+    # New section for visualizing the scoring metrics
+    st.header("Scoring Dashboard")
+    max_score = int(scored["Max Score"].max())
+    if len(scored) <= DASHBOARD_BAR_LIMIT:
+        fig = px.bar(scored, x='URL', y='Score', title='Website Scores', range_y=[0, max_score])
+    else:
+        fig = px.bar(metric_distribution(scored["Score"]), x="Score", y="Sites", title=f"Scores of {len(scored)} sites")
+    st.plotly_chart(fig)
+
+    # Detailed scoring for each metric: the average over every site, and each site on this page
+    breakdown = pd.DataFrame([score_breakdown(data) for data in scraped_data.values() if "Score" in data])
+    average = breakdown.mean().rename_axis("Check").reset_index(name="Average Points")
+    st.plotly_chart(px.bar(average, x="Check", y="Average Points", title="Average Points per Check", range_y=[0, SCORE_POINTS]))
+    detailed_scores = [{"URL": url, **score_breakdown(scraped_data[url])} for url in page["URL"] if "Score" in scraped_data[url]]
+    st.dataframe(pd.DataFrame(detailed_scores), hide_index=True)
+
+    # Additional dashboards for each metric
+    st.header("Detailed Metrics Dashboard")
+    metrics = st.multiselect("Metrics", DASHBOARD_METRICS, default=DASHBOARD_DEFAULT_METRICS, key="dashboard_metrics")
+    for metric in metrics:
+        st.subheader(f"{metric} Dashboard")
+        st.plotly_chart(metric_chart(table, metric))
+    if len(table) > DASHBOARD_BAR_LIMIT:
+        sample = scored.sample(min(len(scored), DASHBOARD_SAMPLE_SIZE), random_state=0)
+        options = [metric for metric in DASHBOARD_METRICS if metric not in ("Score", "Max Score")]
+        metric = st.selectbox("Compare with the score", options, key="dashboard_scatter")
+        st.plotly_chart(px.scatter(
+            sample, x=metric, y="Score", hover_name="URL",
+            title=f"Score by {metric} ({len(sample)} of {len(scored)} sites sampled)"
+        ))
+
+def render_app():
+    st.set_page_config(page_title="Comprehensive Web Scraping Tool", layout="wide", initial_sidebar_state="expanded")
+
+    hide_streamlit_style = """
+        <style>
+            .css-1r6p8d1 {display: none;} 
+            .css-1v3t3fg {display: none;} 
+            .css-1r6p8d1 .st-ae {display: none;} 
+            header {visibility: hidden;} 
+            .css-1tqja98 {visibility: hidden;} 
+        </style>
+    """
+    st.markdown(hide_streamlit_style, unsafe_allow_html=True)
+
+    st.markdown("""
+        <style>
+            .main {
+                background-color: #1e1e1e;
+                color: #ffffff;
+                padding: 2rem;
+                border-radius: 10px;
+            }
+            .stButton>button {
+                background-color: #0078d4;
+                color: white;
+                border-radius: 5px;
+                padding: 0.5rem 1rem;
+                font-size: 1rem;
+            }
+            .stTextInput>div>div>input {
+                background-color: #333333;
+                color: #ffffff;
+                border: 1px solid #555555;
+                padding: 0.5rem;
+                border-radius: 5px;
+            }
+            .stAlert {
+                border-radius: 5px;
+            }
+            .css-1aumxhk {
+                padding-top: 2rem;
+            }
+            .reportview-container .main footer {
+                visibility: hidden;
+            }
+        </style>
+    """, unsafe_allow_html=True)
+
+    st.title("Comprehensive Web Scraping Tool")
+    st.subheader("Analyze and extract detailed information from any web page")
+
+    url1 = st.text_input("Enter the first URL for analysis", placeholder="https://example.com", key="url1")
+    url2 = st.text_input("Enter the second URL for analysis (optional)", placeholder="https://example.com", key="url2")
+    url3 = st.text_input("Enter the third URL for analysis (optional)", placeholder="https://example.com", key="url3")
+
+    more_urls = st.text_area(f"More URLs, one per line (up to {MAX_ANALYZE_URLS} in total)", key="more_urls")
+
+    urls = [url1, url2, url3] + more_urls.splitlines()
+    urls = [url.strip() for url in urls if url.strip()]
+
+    use_cache = not st.checkbox("Ignore cached results", help="Re-scrape every URL even if a recent result is cached")
+
+    if st.button("Analyze"):
+        if not urls:
+            st.error("Please enter at least one URL.")
+        else:
+            with st.spinner("Scraping and analyzing..."):
+                st.session_state["scraped_data"] = analyze_urls(urls, use_cache=use_cache)
+                st.session_state.pop("comparison_table", None)
+
+    batch_results = st.file_uploader("Or compare the results of a batch run or crawl (JSON Lines)", type=["jsonl"])
+    if batch_results is not None and st.button("Compare batch results"):
+        st.session_state["scraped_data"] = load_batch_results(batch_results)
+        st.session_state.pop("comparison_table", None)
+
+    # Kept in session state so that widget interactions rerun the script
+    # without dropping the results or scraping again
+    scraped_data = st.session_state.get("scraped_data")
+    if scraped_data:
+        if "comparison_table" not in st.session_state:
+            st.session_state["comparison_table"] = comparison_table(scraped_data)
+        render_results(scraped_data, st.session_state["comparison_table"])
+
+if st.runtime.exists():
+    render_app()
+elif __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Parse in threads: worker processes would re-import the app for every test run
+os.environ.setdefault("SCRAPER_PARSE_PROCESSES", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit.logger as streamlit_logger  # noqa: E402
+
+# Cached resources are used outside a Streamlit session here; that is expected
+streamlit_logger.set_log_level("error")
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        path = self.path.split("?", 1)[0]
+        if path == "/robots.txt" and path not in self.server.pages:
+            page = "User-agent: *\nAllow: /\n"
+        else:
+            page = self.server.pages.get(path)
+        if callable(page):
+            page = page(self)
+        if page is None:
+            status, headers, body = 404, {}, b"not found"
+        elif isinstance(page, tuple):
+            status, headers, body = page
+        else:
+            status, headers, body = 200, {"Content-Type": "text/html; charset=utf-8"}, page
+        body = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    # A local site; tests fill site.pages with path -> HTML, (status, headers, body) or a callable
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    server.daemon_threads = True
+    server.pages = {}
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def engine():
+    import streamlit_app as app
+
+    yield app.get_engine()
+    app.get_engine().close()
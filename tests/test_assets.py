@@ -0,0 +1,38 @@
+import socket
+import time
+
+import streamlit_app as app
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_dead_assets_are_not_retried(engine):
+    url = closed_port_url()
+    srcs = [f"{url}/img/{index}.png" for index in range(20)]
+    started = time.monotonic()
+    broken = app.check_broken_assets("https://example.com/page", {"media": srcs})
+    # One retry cycle per asset would back off for 3.5 seconds
+    assert time.monotonic() - started < 2
+    assert broken["media"] == srcs
+
+
+def test_asset_checks_stop_at_the_deadline(site, engine):
+    def hang(handler):
+        time.sleep(2)
+        return (200, {}, b"")
+
+    for index in range(8):
+        site.pages[f"/img/{index}.png"] = hang
+    site.pages["/img/ok.png"] = (200, {"Content-Type": "image/png"}, b"png")
+    srcs = ["/img/ok.png"] + [f"/img/{index}.png" for index in range(8)]
+    started = time.monotonic()
+    broken = engine.run(app.check_broken_assets_async(engine, f"{site.url}/page", {"media": srcs}, deadline=0.5))
+    assert time.monotonic() - started < 1.5
+    assert broken["media"] == [f"{site.url}/img/{index}.png" for index in range(8)]
+    # Assets cut off by the deadline are checked again on the next page
+    assert engine.head_cache.get(f"{site.url}/img/0.png", default=False) is False
+    assert engine.head_cache.get(f"{site.url}/img/ok.png") == 200
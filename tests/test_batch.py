@@ -0,0 +1,50 @@
+import io
+import json
+
+import streamlit_app as app
+
+
+def test_checkpoint_keeps_low_water_mark_and_gaps(tmp_path):
+    path = str(tmp_path / "batch.ckpt")
+    checkpoint = app.BatchCheckpoint(path)
+    for index in [0, 1, 3, 5]:
+        checkpoint.mark_done(index)
+    assert checkpoint.completed_through == 1
+    assert checkpoint.completed == {3, 5}
+    checkpoint.save()
+
+    resumed = app.BatchCheckpoint(path)
+    assert [index for index in range(7) if not resumed.is_done(index)] == [2, 4, 6]
+    resumed.mark_done(2)
+    assert resumed.completed_through == 3
+    assert resumed.completed == {5}
+
+
+def test_checkpoint_without_path_is_not_saved(tmp_path):
+    checkpoint = app.BatchCheckpoint()
+    checkpoint.mark_done(0)
+    checkpoint.save()
+    assert checkpoint.is_done(0)
+
+
+def test_run_batch_resumes_from_checkpoint(site, tmp_path):
+    for name in "abcde":
+        site.pages[f"/{name}"] = f"<html><body><p>Page {name} has some words.</p></body></html>"
+    lines = [f"{site.url}/{name}\n" for name in "abcde"]
+    path = str(tmp_path / "batch.ckpt")
+    # An earlier run stopped after finishing lines 0, 1 and 3
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"completed_through": 1, "completed": [3]}, f)
+
+    output = io.StringIO()
+    counts = app.run_batch(lines, output, workers=2, checkpoint_path=path, fields=["Word Count"])
+    assert counts["analyzed"] == 2
+    assert counts["skipped"] == 3
+    assert sorted(json.loads(line)["url"] for line in output.getvalue().splitlines()) == [f"{site.url}/c", f"{site.url}/e"]
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"completed_through": 4, "completed": []}
+
+    rerun = io.StringIO()
+    counts = app.run_batch(lines, rerun, checkpoint_path=path, fields=["Word Count"])
+    assert counts["skipped"] == 5
+    assert rerun.getvalue() == ""
@@ -0,0 +1,40 @@
+import pytest
+
+import page_analysis as pa
+
+
+def phones(*text_nodes, hrefs=()):
+    return pa.extract_contact_details(list(text_nodes), list(hrefs), [])["phone_numbers"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Call 867-5309 today", ["8675309"]),
+    ("(555) 867-5309", ["5558675309"]),
+    ("555.867.5309", ["5558675309"]),
+    ("5558675309", ["5558675309"]),
+    ("+44 20 7946 0958", ["+442079460958"]),
+    ("+15558675309", ["+15558675309"]),
+])
+def test_phone_formats(text, expected):
+    assert phones(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "Order 12345678 shipped", "Invoice 20240115", "Tracking code 123456789012", "Price 1.234.567",
+    "ISBN 978-3-16-148410-0", "Call 555-5555", "Version 1.2.3456"
+])
+def test_ids_and_numbers_are_not_phones(text):
+    assert phones(text) == []
+
+
+def test_phone_pattern_agrees_with_min_digits():
+    assert pa.PHONE_PATTERN.fullmatch("8" * (pa.PHONE_MIN_DIGITS - 4) + "-1234")
+    assert not pa.PHONE_PATTERN.fullmatch("8" * (pa.PHONE_MIN_DIGITS - 5) + "-1234")
+
+
+def test_same_number_in_several_formats_is_reported_once():
+    assert phones(
+        "+1 555 867 5309", "1-555-867-5309", "(555) 867-5309", "555.867.5309", hrefs=["tel:+1-555-867-5309"]
+    ) == ["+15558675309"]
+    assert phones("+44 20 7946 0958", "020 7946 0958") == ["+442079460958"]
+    assert phones("555-867-5309", "555-867-5310") == ["5558675309", "5558675310"]
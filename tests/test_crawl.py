@@ -0,0 +1,74 @@
+import io
+import json
+
+import streamlit_app as app
+
+
+def page(*hrefs):
+    links = "".join(f'<a href="{href}">link</a>' for href in hrefs)
+    return f"<html><body><p>A page with a few words of text.</p>{links}</body></html>"
+
+
+def crawled_urls(output):
+    return sorted(json.loads(line)["url"] for line in output.getvalue().splitlines())
+
+
+def test_crawl_skips_malformed_links(site):
+    site.pages["/"] = page("/a", "http://127.0.0.1:8799:x/", "http://[::1/broken", "/b")
+    site.pages["/a"] = page("/b", "https://[not-an-ip/")
+    site.pages["/b"] = page("/")
+    output = io.StringIO()
+    counts = app.crawl_site(site.url, output, fields="links")
+    assert counts["crawled"] == 3
+    assert counts["failed"] == 0
+    assert crawled_urls(output) == [f"{site.url}/", f"{site.url}/a", f"{site.url}/b"]
+
+
+def test_crawl_fetches_each_page_once(site):
+    # Spellings of the same URL, off-site links and other schemes are not queued again
+    site.pages["/"] = page("/a", "/a#top", "/b?y=2&x=1", "/b?x=1&y=2", "http://localhost:1/elsewhere", "mailto:x@example.com")
+    site.pages["/a"] = page("/", "/a", "/b?x=1&y=2")
+    site.pages["/b"] = page("/a#bottom", "/")
+    output = io.StringIO()
+    counts = app.crawl_site(site.url, output, fields="links")
+    assert counts["crawled"] == 3
+    assert counts["seen"] == 3
+    fetched = [path for command, path, headers in site.requests if command == "GET" and path != "/robots.txt"]
+    assert sorted(fetched) == ["/", "/a", "/b?x=1&y=2"]
+
+
+def test_crawl_stops_at_max_depth_and_max_pages(site):
+    for depth in range(5):
+        site.pages[f"/{depth}"] = page(f"/{depth + 1}")
+    output = io.StringIO()
+    app.crawl_site(f"{site.url}/0", output, max_depth=2, fields="links")
+    assert [json.loads(line)["depth"] for line in output.getvalue().splitlines()] == [0, 1, 2]
+    assert crawled_urls(output) == [f"{site.url}/0", f"{site.url}/1", f"{site.url}/2"]
+
+    counts = app.crawl_site(f"{site.url}/0", io.StringIO(), max_depth=10, max_pages=4, fields="links")
+    assert counts["crawled"] == 4
+
+
+def test_crawl_drops_links_beyond_the_frontier_cap(site):
+    site.pages["/"] = page("/a", "/b", "/c")
+    site.pages["/a"] = page("/c")
+    for path in ["/b", "/c"]:
+        site.pages[path] = page()
+    output = io.StringIO()
+    counts = app.crawl_site(site.url, output, workers=1, max_frontier=1, fields="links")
+    # /b and /c do not fit in the frontier from /; /c is picked up again from /a
+    assert counts["dropped"] == 2
+    assert crawled_urls(output) == [f"{site.url}/", f"{site.url}/a", f"{site.url}/c"]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    seen = app.BloomFilter(10000, error_rate=0.01)
+    urls = [f"https://example.com/page/{index}" for index in range(10000)]
+    for url in urls:
+        seen.add(url)
+    assert all(url in seen for url in urls)
+    assert not seen.add(urls[0])
+    # An insert that collides with earlier ones is not counted, like a false positive
+    assert 9900 <= seen.count <= 10000
+    false_positives = sum(f"https://example.com/other/{index}" in seen for index in range(10000))
+    assert false_positives < 300
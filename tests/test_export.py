@@ -0,0 +1,143 @@
+import csv
+import re
+import zipfile
+
+import pytest
+from lxml import etree
+
+import streamlit_app as app
+
+RECORDS = [
+    {
+        "url": "https://example.com/",
+        "depth": 0,
+        "result": {
+            "Score": 70,
+            "Max Score": 100,
+            "Word Count": 120,
+            "Sentiment Polarity": 0.25,
+            "Detected Language": "en",
+            "Main Content": "Quotes \" and, commas\nand a second line...",
+            "Meta Tags": {"description": "Home"},
+            "Headings": {"h1": ["Welcome"], "h2": []},
+            "Internal Links": ["https://example.com/a", "https://example.com/b"],
+            "Comments": ["  a comment  "],
+            "Keyword Density": {"welcome": 2.5, "home": 1.25},
+            "Top Bigrams": {"welcome home": 1.0}
+        }
+    },
+    {"url": "https://example.com/missing", "depth": 1, "error": "404 Client Error"}
+]
+SPREADSHEET = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+
+def expected_tables(records):
+    tables = {table: [] for table in app.EXPORT_TABLES}
+    for record in records:
+        for table, row in app.export_rows(record):
+            tables[table].append(row)
+    return tables
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+def column_index(reference):
+    index = 0
+    for letter in re.match(r"[A-Z]+", reference).group():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def read_xlsx(path):
+    # Sheet name -> rows, blank cells as None; enough of the format for xlsxwriter's output
+    with zipfile.ZipFile(path) as archive:
+        shared = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            shared = ["".join(item.itertext()) for item in etree.fromstring(archive.read("xl/sharedStrings.xml"))]
+        targets = {rel.get("Id"): rel.get("Target") for rel in etree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))}
+        sheets = {}
+        for sheet in etree.fromstring(archive.read("xl/workbook.xml")).iter(f"{SPREADSHEET}sheet"):
+            rows = []
+            for row in etree.fromstring(archive.read(f"xl/{targets[sheet.get(RELATIONSHIP)]}")).iter(f"{SPREADSHEET}row"):
+                values = {}
+                for cell in row.iter(f"{SPREADSHEET}c"):
+                    if cell.get("t") == "s":
+                        value = shared[int(cell.findtext(f"{SPREADSHEET}v"))]
+                    elif cell.get("t") == "inlineStr":
+                        value = "".join(cell.find(f"{SPREADSHEET}is").itertext())
+                    else:
+                        value = float(cell.findtext(f"{SPREADSHEET}v"))
+                    values[column_index(cell.get("r"))] = value
+                rows.append([values.get(index) for index in range(max(values) + 1)] if values else [])
+            sheets[sheet.get("name")] = rows
+        return sheets
+
+
+def test_jsonl_round_trip(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    app.export_records(RECORDS, path)
+    assert list(app.read_records(path)) == RECORDS
+
+
+def test_csv_round_trip(tmp_path):
+    path = str(tmp_path / "results.csv")
+    app.export_records(RECORDS, path)
+    for table, rows in expected_tables(RECORDS).items():
+        header, *written = read_csv(app.export_table_path(path, table))
+        assert header == [name for name, _ in app.EXPORT_TABLES[table]]
+        assert written == [["" if value is None else str(value) for value in row] for row in rows]
+
+
+@pytest.mark.parametrize("row_group_size", [app.PARQUET_ROW_GROUP_SIZE, 1])
+def test_parquet_round_trip(tmp_path, row_group_size):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "results.parquet")
+    exporter = app.ParquetExporter(path, row_group_size=row_group_size)
+    for record in RECORDS:
+        exporter.write(record)
+    exporter.close()
+    for table, rows in expected_tables(RECORDS).items():
+        names = [name for name, _ in app.EXPORT_TABLES[table]]
+        written = parquet.read_table(app.export_table_path(path, table))
+        assert written.column_names == names
+        assert written.to_pylist() == [dict(zip(names, row)) for row in rows]
+    if row_group_size == 1:
+        assert parquet.ParquetFile(app.export_table_path(path, "items")).num_row_groups == 3
+
+
+def test_excel_round_trip(tmp_path):
+    pytest.importorskip("xlsxwriter")
+    path = str(tmp_path / "results.xlsx")
+    app.export_records(RECORDS, path)
+    sheets = read_xlsx(path)
+    assert list(sheets) == list(app.EXPORT_TABLES)
+    for table, rows in expected_tables(RECORDS).items():
+        header, *written = sheets[table]
+        assert header == [name for name, _ in app.EXPORT_TABLES[table]]
+        expected = [[float(value) if isinstance(value, int) else value for value in row] for row in rows]
+        # Trailing blank cells are not stored
+        assert written == [row[:len(written_row)] for row, written_row in zip(expected, written)]
+        assert all(value is None for row, written_row in zip(expected, written) for value in row[len(written_row):])
+
+
+def test_excel_splits_long_tables_and_cuts_long_cells(tmp_path, monkeypatch):
+    pytest.importorskip("xlsxwriter")
+    monkeypatch.setattr(app, "EXCEL_MAX_ROWS", 2)
+    monkeypatch.setattr(app, "EXCEL_MAX_CELL_CHARS", 10)
+    path = str(tmp_path / "results.xlsx")
+    app.export_records(RECORDS, path)
+    sheets = read_xlsx(path)
+    # One data row per sheet: two pages, three items and three terms
+    assert sorted(sheets) == ["items", "items (2)", "items (3)", "pages", "pages (2)", "terms", "terms (2)", "terms (3)"]
+    assert sheets["items"][1] == ["https://ex", "Internal L", 0.0, "https://ex"]
+    assert sheets["pages (2)"][0][:2] == ["url", "depth"]
+    assert sheets["pages (2)"][1][:3] == ["https://ex", 1.0, "404 Client"]
+
+
+def test_unknown_export_format(tmp_path):
+    with pytest.raises(ValueError, match="Unknown export format"):
+        app.open_exporter(str(tmp_path / "results.txt"))
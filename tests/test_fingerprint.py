@@ -0,0 +1,156 @@
+import io
+import json
+import random
+
+import page_analysis as pa
+import streamlit_app as app
+
+URL = "https://example.com/"
+# Letters only, so every word is a token
+WORDS = ["".join(random.Random(index).choices("abcdefghijklmnopqrstuvwxyz", k=7)) for index in range(500)]
+
+
+def paragraphs(seed, count=12):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=30)) for _ in range(count)]
+
+
+def html(paragraph_texts, template="article"):
+    body = "".join(f"<p>{text}</p>" for text in paragraph_texts)
+    if template == "article":
+        return f"<html><body><nav><a href='/'>Home</a></nav><article><h1>Title</h1>{body}</article></body></html>"
+    items = "".join(f"<li><span><p>{text}</p></span></li>" for text in paragraph_texts)
+    return f"<html><body><table><tr><td><ul>{items}</ul></td></tr></table></body></html>"
+
+
+def analyze(page, boilerplate=None):
+    fields = ["Fingerprint", "Main Content"]
+    return pa.analyze_document(URL, page.encode(), "lxml", fields=fields, boilerplate=boilerplate)[0]
+
+
+def bit_distance(first, second):
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+
+def text_similarity(first, second):
+    return app.minhash_similarity(bytes.fromhex(first["minhash"]), bytes.fromhex(second["minhash"]))
+
+
+def test_fingerprints_are_stable_and_separate_near_duplicates():
+    original = paragraphs(1)
+    edited = original[:-1] + ["a single rewritten closing paragraph"]
+    first = analyze(html(original))["Fingerprint"]
+    assert analyze(html(original))["Fingerprint"] == first
+    assert len(first["minhash"]) == pa.MINHASH_PERMUTATIONS * 8
+
+    near = analyze(html(edited))["Fingerprint"]
+    other = analyze(html(paragraphs(2)))["Fingerprint"]
+    assert text_similarity(first, near) >= app.NEAR_DUPLICATE_SIMILARITY
+    assert text_similarity(first, other) < 0.3
+    assert bit_distance(first["text_simhash"], near["text_simhash"]) < bit_distance(first["text_simhash"], other["text_simhash"])
+
+
+def test_structure_simhash_follows_the_template_not_the_text():
+    first = analyze(html(paragraphs(1)))["Fingerprint"]
+    same_template = analyze(html(paragraphs(2)))["Fingerprint"]
+    other_template = analyze(html(paragraphs(1), template="table"))["Fingerprint"]
+    assert bit_distance(first["structure_simhash"], same_template["structure_simhash"]) <= app.STRUCTURE_SIMHASH_DISTANCE
+    assert bit_distance(first["structure_simhash"], other_template["structure_simhash"]) > app.STRUCTURE_SIMHASH_DISTANCE
+
+
+def test_page_without_text_has_no_minhash():
+    assert analyze("<html><body><img src='/a.png'></body></html>")["Fingerprint"]["minhash"] is None
+    assert not app.NearDuplicateIndex().check(URL, {"Fingerprint": {"minhash": None}})
+
+
+def test_near_duplicate_index_keeps_one_entry_per_cluster():
+    original = paragraphs(1)
+    index = app.NearDuplicateIndex()
+    results = {
+        "https://example.com/a": {"Fingerprint": analyze(html(original))["Fingerprint"]},
+        "https://example.com/a?print=1": {"Fingerprint": analyze(html(original[:-1] + ["changed"]))["Fingerprint"]},
+        "https://example.com/a?page=1": {"Fingerprint": analyze(html(original[1:]))["Fingerprint"]},
+        "https://example.com/b": {"Fingerprint": analyze(html(paragraphs(2)))["Fingerprint"]}
+    }
+    duplicates = [url for url, result in results.items() if index.check(url, result)]
+    assert duplicates == ["https://example.com/a?print=1", "https://example.com/a?page=1"]
+    assert [url for url, _ in index.entries.values()] == ["https://example.com/a", "https://example.com/b"]
+    assert [match["url"] for match in results["https://example.com/a?page=1"]["Near Duplicates"]] == ["https://example.com/a"]
+    assert results["https://example.com/b"]["Near Duplicates"] == []
+
+
+def test_near_duplicate_index_stays_bounded():
+    index = app.NearDuplicateIndex(max_entries=50)
+    rng = random.Random(1)
+    signatures = [rng.randbytes(pa.MINHASH_PERMUTATIONS * 4).hex() for _ in range(500)]
+    for position, signature in enumerate(signatures):
+        assert not index.check(f"https://example.com/{position}", {"Fingerprint": {"minhash": signature}})
+        assert len(index) <= 50
+    assert sum(len(bucket) for bucket in index.buckets.values()) == 50 * app.MINHASH_BANDS
+    # Recent pages are still matched; evicted ones are not
+    assert index.query(signatures[-1])[0]["url"] == "https://example.com/499"
+    assert index.query(signatures[0]) == []
+
+
+def test_run_batch_near_duplicate_index_stays_bounded(site, monkeypatch):
+    indexes = []
+    index_class = app.NearDuplicateIndex
+
+    def bounded_index():
+        indexes.append(index_class(max_entries=3))
+        return indexes[-1]
+
+    monkeypatch.setattr(app, "NearDuplicateIndex", bounded_index)
+    for page in range(12):
+        site.pages[f"/{page}"] = html(paragraphs(page, count=3))
+    counts = app.run_batch([f"{site.url}/{page}\n" for page in range(12)], io.StringIO(), workers=2, fields=["Fingerprint"])
+    assert counts["analyzed"] == 12
+    assert len(indexes[0]) == 3
+
+
+def test_boilerplate_filter_learns_repeated_paragraphs_per_host():
+    notice = "We use cookies to improve this site"
+    boilerplate = app.BoilerplateFilter(min_pages=3)
+    for page in range(3):
+        assert boilerplate.paragraphs(f"https://example.com/{page}") == frozenset()
+        boilerplate.learn(f"https://example.com/{page}", [pa.paragraph_hash(notice), pa.paragraph_hash(f"page {page}")])
+    assert boilerplate.paragraphs("https://example.com/next") == {pa.paragraph_hash(notice)}
+    assert boilerplate.paragraphs("https://other.example/") == frozenset()
+
+    page = html([notice] + paragraphs(1, count=2))
+    cleaned = analyze(page, boilerplate=boilerplate.paragraphs("https://example.com/next"))
+    assert "cookies" in analyze(page)["Main Content"]
+    assert "cookies" not in cleaned["Main Content"]
+    # Fingerprints ignore learned boilerplate, so they do not depend on the pages seen before
+    assert cleaned["Fingerprint"]["minhash"] == analyze(page)["Fingerprint"]["minhash"]
+
+
+def test_result_store_finds_near_duplicates_and_shared_templates(tmp_path):
+    original = paragraphs(1)
+    store = app.ResultStore(str(tmp_path / "history.db"))
+    try:
+        for url, page in [
+            ("https://example.com/a", html(original)),
+            ("https://example.com/copy", html(original[:-1] + ["changed"])),
+            ("https://example.com/sibling", html(paragraphs(2))),
+            ("https://example.com/table", html(paragraphs(3), template="table"))
+        ]:
+            store.record(url, {"Fingerprint": analyze(page)["Fingerprint"]})
+        matches = store.near_duplicates("https://example.com/a")
+        assert store.near_duplicates("https://example.com/unknown") is None
+    finally:
+        store.close()
+    assert [match["url"] for match in matches["near_duplicates"]] == ["https://example.com/copy"]
+    assert sorted(match["url"] for match in matches["same_template"]) == ["https://example.com/copy", "https://example.com/sibling"]
+
+
+def test_run_batch_counts_near_duplicates(site):
+    original = paragraphs(1)
+    site.pages["/a"] = html(original)
+    site.pages["/b"] = html(original[:-1] + ["changed"])
+    site.pages["/c"] = html(paragraphs(2))
+    output = io.StringIO()
+    counts = app.run_batch([f"{site.url}/{name}\n" for name in "abc"], output, workers=1, fields=["Fingerprint"])
+    assert counts["duplicates"] == 1
+    records = {json.loads(line)["url"]: json.loads(line)["result"] for line in output.getvalue().splitlines()}
+    assert [match["url"] for match in records[f"{site.url}/b"]["Near Duplicates"]] == [f"{site.url}/a"]
@@ -0,0 +1,49 @@
+import json
+import math
+import tempfile
+
+import pytest
+
+import page_analysis as pa
+import streamlit_app as app
+
+
+def test_keywords_skip_stopwords_and_rank_by_count():
+    word_count, keywords, bigrams = pa.analyze_keywords("The cat sat. The cat ran, and the dog sat!")
+    assert word_count == 10
+    assert list(keywords) == ["cat", "sat", "ran", "dog"]
+    assert keywords["cat"] == 20.0
+    assert bigrams == {"cat sat": 10.0, "cat ran": 10.0, "dog sat": 10.0}
+
+
+def test_keywords_of_empty_text():
+    assert pa.analyze_keywords("") == (0, {}, {})
+    assert pa.analyze_keywords("the and of") == (3, {}, {})
+
+
+def test_keywords_keep_non_ascii_words():
+    _, keywords, _ = pa.analyze_keywords("Straße straße Ünïcode 42")
+    assert keywords == pytest.approx({"straße": 200 / 3, "ünïcode": 100 / 3})
+
+
+def test_tfidf_weights_rare_terms_higher_and_normalizes():
+    densities = {
+        "a": {"shared": 5.0, "rare": 5.0},
+        "b": {"shared": 5.0, "other": 1.0},
+        "c": {"shared": 5.0},
+        "empty": {}
+    }
+    weights = pa.corpus_tfidf(densities)
+    assert list(weights["a"]) == ["rare", "shared"]
+    assert math.isclose(sum(weight * weight for weight in weights["a"].values()), 1.0)
+    assert weights["empty"] == {}
+
+
+def test_write_tfidf_matches_corpus_tfidf(tmp_path):
+    densities = {f"https://site{i}.example/": {f"term{j}": float(i + j) for j in range(i, i + 5)} for i in range(20)}
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        for url, page_densities in densities.items():
+            spool.write(json.dumps([url, page_densities]) + "\n")
+        app.write_tfidf(spool, tmp_path / "terms.json")
+    with open(tmp_path / "terms.json", encoding="utf-8") as f:
+        assert json.load(f) == pa.corpus_tfidf(densities)
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+import page_analysis as pa
+from conftest import FIXTURES, read_fixture
+
+URL = "https://bees.example/"
+BACKENDS = pa.available_parsers() + ([pa.STREAM_PARSER] if pa.etree is not None else [])
+# html.parser does not apply HTML's implied end tags (<p> before <p>, unclosed <td>),
+# so its tree legitimately differs on this page; the lxml backends must still agree
+IMPLIED_END_TAGS = "implied-end-tags.html"
+
+
+def analyze(name, parser):
+    output, assets, hrefs, _ = pa.analyze_document(URL, read_fixture(name), parser)
+    return output, assets, hrefs
+
+
+@pytest.mark.parametrize("name", sorted(os.listdir(FIXTURES)))
+def test_backends_agree(name):
+    backends = BACKENDS if name != IMPLIED_END_TAGS else [b for b in BACKENDS if b != "html.parser"]
+    expected = analyze(name, backends[0])
+    assert expected[0]["Word Count"] > 0
+    for parser in backends[1:]:
+        assert analyze(name, parser) == expected, parser
+
+
+def test_stream_parser_leaves_out_hidden_text():
+    output, _, _ = analyze("scripts.html", pa.STREAM_PARSER)
+    assert "secret" not in output["Main Content"]
+    assert "inside a template" not in output["Main Content"]
+    assert output["Headings"]["h1"] == ["Inline script and style"]
+    assert output["Headings"]["h2"] == ["Code samples stay"]
+
+
+def test_declared_encoding_is_used():
+    output, _, _ = analyze("windows-1252.html", pa.STREAM_PARSER)
+    assert output["Headings"]["h1"] == ["Café crème – €2.50"]
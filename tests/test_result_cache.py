@@ -0,0 +1,72 @@
+import json
+import os
+import time
+
+import streamlit_app as app
+
+URL = "https://example.com/page"
+CONFIG = {"fields": None, "analysis_version": 1}
+
+
+def stored_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+
+
+def test_memory_entries_expire():
+    cache = app.ResultCache(ttl=0.05, directory=None)
+    cache.set(URL, CONFIG, {"Word Count": 3})
+    assert cache.get(URL, CONFIG) == {"Word Count": 3}
+    assert cache.get(URL, {"fields": ["Word Count"]}) is None
+    time.sleep(0.1)
+    assert cache.get(URL, CONFIG) is None
+
+
+def test_disk_entries_survive_restart_until_expired(tmp_path):
+    directory = str(tmp_path)
+    app.ResultCache(directory=directory).set(URL, CONFIG, {"Word Count": 3})
+    assert app.ResultCache(directory=directory).get(URL, CONFIG) == {"Word Count": 3}
+
+    [name] = stored_files(directory)
+    path = os.path.join(directory, name)
+    with open(path, encoding="utf-8") as f:
+        entry = json.load(f)
+    entry["stored_at"] -= 2 * app.RESULT_CACHE_TTL
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    assert app.ResultCache(directory=directory).get(URL, CONFIG) is None
+    assert stored_files(directory) == []
+
+
+def test_disk_hit_keeps_only_the_remaining_ttl(tmp_path):
+    directory = str(tmp_path)
+    app.ResultCache(directory=directory).set(URL, CONFIG, {"Word Count": 3})
+    [name] = stored_files(directory)
+    path = os.path.join(directory, name)
+    with open(path, encoding="utf-8") as f:
+        entry = json.load(f)
+    entry["stored_at"] = time.time() - 0.95
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+
+    cache = app.ResultCache(ttl=1, directory=directory)
+    assert cache.get(URL, CONFIG) == {"Word Count": 3}
+    time.sleep(0.15)
+    assert cache.get(URL, CONFIG) is None
+
+
+def test_disk_evicts_least_recently_used(tmp_path):
+    directory = str(tmp_path)
+    cache = app.ResultCache(directory=directory, max_disk_entries=2)
+    for index, url in enumerate(["https://example.com/a", "https://example.com/b"]):
+        cache.set(url, CONFIG, {"page": url})
+        # Distinct, old modification times so the order does not depend on timer resolution
+        stamp = time.time() - 100 + index
+        os.utime(os.path.join(directory, f"{cache.key(url, CONFIG)}.json"), (stamp, stamp))
+
+    # Reading /a from disk makes /b the least recently used entry
+    assert app.ResultCache(directory=directory).get("https://example.com/a", CONFIG) == {"page": "https://example.com/a"}
+    cache.set("https://example.com/c", CONFIG, {"page": "https://example.com/c"})
+    fresh = app.ResultCache(directory=directory)
+    assert fresh.get("https://example.com/b", CONFIG) is None
+    assert fresh.get("https://example.com/a", CONFIG) is not None
+    assert fresh.get("https://example.com/c", CONFIG) is not None
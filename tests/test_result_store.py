@@ -0,0 +1,81 @@
+import streamlit_app as app
+
+URL = "https://example.com/page"
+
+
+def result(score, links, title="Home", **fields):
+    return {
+        "Meta Tags": {"title": title},
+        "Internal Links": links,
+        "Score": score,
+        "HTTP Info": {"status_code": 200, "headers": {"Date": fields.pop("date", "Mon")}},
+        "Page Load Time": fields.pop("load_time", 0.1),
+        **fields
+    }
+
+
+def test_diff_latest_reports_changed_fields_and_items(tmp_path):
+    store = app.ResultStore(str(tmp_path / "history.db"))
+    try:
+        old_id = store.record(URL, result(80, ["https://example.com/a", "https://example.com/b"]), analyzed_at=1)
+        new_id = store.record(
+            "HTTPS://EXAMPLE.COM/page", result(60, ["https://example.com/b", "https://example.com/c"], title="Welcome"),
+            analyzed_at=2
+        )
+        assert [run["id"] for run in store.history(URL)] == [new_id, old_id]
+        changes = store.diff_latest(URL, details=True)
+    finally:
+        store.close()
+    assert changes["from"] == 1 and changes["to"] == 2
+    assert changes["score"] == {"old": 80, "new": 60, "delta": -20}
+    assert changes["changed_fields"] == ["Internal Links", "Meta Tags", "Score"]
+    assert changes["items"] == {
+        "Internal Links": {
+            "added": 1, "removed": 1,
+            "added_items": ["https://example.com/c"], "removed_items": ["https://example.com/a"]
+        }
+    }
+
+
+def test_volatile_fields_are_not_changes(tmp_path):
+    store = app.ResultStore(str(tmp_path / "history.db"))
+    try:
+        store.record(URL, result(80, [], date="Mon", load_time=0.1), analyzed_at=1)
+        store.record(URL, result(80, [], date="Tue", load_time=2.5), analyzed_at=2)
+        changes = store.diff_latest(URL)
+        assert store.diff_latest("https://example.com/other") is None
+    finally:
+        store.close()
+    assert changes["changed_fields"] == []
+    assert changes["items"] == {}
+
+
+def test_score_drops_compare_each_url_with_its_previous_analysis(tmp_path):
+    store = app.ResultStore(str(tmp_path / "history.db"))
+    try:
+        store.record("https://example.com/a", result(90, []), analyzed_at=1)
+        store.record("https://example.com/a", result(50, []), analyzed_at=2)
+        store.record("https://example.com/b", result(40, []), analyzed_at=1)
+        store.record("https://example.com/b", result(35, []), analyzed_at=2)
+        store.record("https://other.example/c", result(100, []), analyzed_at=1)
+        store.record("https://other.example/c", result(10, []), analyzed_at=2)
+        drops = store.score_drops(min_drop=10)
+        host_drops = store.score_drops(min_drop=10, host="example.com")
+    finally:
+        store.close()
+    assert [(drop["url"], drop["previous_score"], drop["score"]) for drop in drops] == [
+        ("https://other.example/c", 100, 10), ("https://example.com/a", 90, 50)
+    ]
+    assert [drop["url"] for drop in host_drops] == ["https://example.com/a"]
+
+
+def test_history_survives_reopening(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = app.ResultStore(path)
+    analysis_id = store.record(URL, result(70, ["https://example.com/a"]))
+    store.close()
+    store = app.ResultStore(path)
+    try:
+        assert store.get(analysis_id)["Internal Links"] == ["https://example.com/a"]
+    finally:
+        store.close()
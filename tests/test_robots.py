@@ -0,0 +1,71 @@
+import asyncio
+
+import streamlit_app as app
+
+
+def check_all(engine, urls):
+    async def check():
+        return await asyncio.gather(*(app.is_scraping_allowed_async(engine, url) for url in urls))
+    return engine.run(check())
+
+
+def robots_requests(site):
+    return [path for command, path, headers in site.requests if path == "/robots.txt"]
+
+
+def test_concurrent_checks_share_one_download_and_drop_the_lock(site, engine):
+    site.pages["/robots.txt"] = (200, {"Content-Type": "text/plain"}, "User-agent: *\nDisallow: /private\n")
+    urls = [f"{site.url}/page/{index}" for index in range(20)] + [f"{site.url}/private/x"]
+    assert check_all(engine, urls) == [True] * 20 + [False]
+    assert len(robots_requests(site)) == 1
+    assert engine.robots_cache._host_locks == {}
+
+
+def test_uncached_robots_txt_does_not_keep_a_lock(site, engine):
+    site.pages["/robots.txt"] = (200, {"Content-Type": "text/plain", "Cache-Control": "no-store"}, "User-agent: *\nAllow: /\n")
+    for _ in range(3):
+        assert check_all(engine, [f"{site.url}/a", f"{site.url}/b"]) == [True, True]
+    assert len(robots_requests(site)) >= 3
+    assert engine.robots_cache._host_locks == {}
+
+
+def test_host_lock_is_shared_while_held():
+    cache = app.RobotsCache(60, 10)
+    order = []
+
+    async def check(name):
+        async with cache.host_lock("https://example.com"):
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+
+    async def run():
+        await asyncio.gather(check("first"), check("second"))
+
+    asyncio.run(run())
+    assert order == ["first start", "first end", "second start", "second end"]
+    assert cache._host_locks == {}
+
+
+def test_failing_robots_txt_is_fetched_once_for_concurrent_checks(site, engine, monkeypatch):
+    monkeypatch.setattr(engine.client, "backoff_factor", 0.01)
+    site.pages["/robots.txt"] = (503, {}, "unavailable")
+    urls = [f"{site.url}/page/{index}" for index in range(10)]
+
+    async def check(url):
+        try:
+            return await app.is_scraping_allowed_async(engine, url)
+        except app.RobotsUnavailable as e:
+            return str(e)
+
+    async def check_all_failing():
+        return await asyncio.gather(*(check(url) for url in urls))
+
+    outcomes = engine.run(check_all_failing())
+    assert all(outcome == f"Could not fetch {site.url}/robots.txt: HTTP 503" for outcome in outcomes)
+    # One retry cycle, shared by every check
+    assert len(robots_requests(site)) == engine.client.retries + 1
+    # Later checks within ROBOTS_FAILURE_TTL reuse the failure too
+    assert engine.run(check_all_failing()) == outcomes
+    assert len(robots_requests(site)) == engine.client.retries + 1
+    assert engine.robots_cache._host_locks == {}
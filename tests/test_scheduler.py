@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import streamlit_app as app
+
+
+def test_asset_checks_do_not_hold_up_pages():
+    scheduler = app.HostScheduler(requests_per_second=10, asset_requests_per_second=1000)
+
+    async def request(lane):
+        async with scheduler.slot("example.com", lane):
+            return time.monotonic()
+
+    async def page_after_assets():
+        assets = [asyncio.ensure_future(request("asset")) for _ in range(100)]
+        await asyncio.sleep(0)
+        page_queued_at = time.monotonic()
+        page_started_at = await request("page")
+        snapshot = scheduler.snapshot()
+        await asyncio.gather(*assets)
+        return page_started_at - page_queued_at, snapshot
+
+    # 100 assets at the page rate would push the page back by 10 seconds
+    waited, snapshot = asyncio.run(page_after_assets())
+    assert waited < 0.5
+    assert snapshot["example.com"]["requests"] == 1
+    assert snapshot["example.com (assets)"]["requests"] < 100
+
+
+def test_lanes_keep_their_own_pacing_and_share_the_crawl_delay():
+    scheduler = app.HostScheduler(requests_per_second=10, asset_requests_per_second=50)
+    assert scheduler.interval("example.com") == 0.1
+    assert scheduler.interval("example.com", "asset") == 0.02
+    scheduler.set_crawl_delay("example.com", 2)
+    assert scheduler.interval("example.com") == scheduler.interval("example.com", "asset") == 2.0
+    assert scheduler.interval("other.example", "asset") == 0.02
+
+
+def test_broken_asset_checks_use_the_asset_lane(site, engine, monkeypatch):
+    scheduler = engine.client.scheduler
+    lanes = []
+    slot = scheduler.slot
+
+    def recording_slot(host, lane="page"):
+        lanes.append((host, lane))
+        return slot(host, lane)
+
+    monkeypatch.setattr(scheduler, "slot", recording_slot)
+    for index in range(5):
+        site.pages[f"/img/{index}.png"] = (200, {"Content-Type": "image/png"}, b"png")
+    srcs = [f"/img/{index}.png" for index in range(6)]
+    broken = app.check_broken_assets(f"{site.url}/page", {"media": srcs})
+    assert broken["media"] == [f"{site.url}/img/5.png"]
+    host = site.url.split("://", 1)[1]
+    assert lanes == [(host, "asset")] * 6
+
+
+def test_idle_hosts_are_dropped():
+    scheduler = app.HostScheduler(requests_per_second=20, asset_requests_per_second=20)
+    hosts = [f"host{index}.example" for index in range(200)]
+
+    async def request(host, lane):
+        async with scheduler.slot(host, lane):
+            await asyncio.sleep(0.001)
+
+    async def crawl():
+        await asyncio.gather(*(request(host, lane) for host in hosts for lane in app.HOST_LANES))
+        # Lanes stay until their next start is due (1 / 20 s after the last one)
+        in_use = len(scheduler._hosts)
+        await asyncio.sleep(0.1)
+        return in_use
+
+    assert asyncio.run(crawl()) == 400
+    assert scheduler._hosts == {}
+    assert scheduler.snapshot() == {}
+
+
+def test_dropping_an_idle_host_keeps_its_pacing():
+    scheduler = app.HostScheduler(requests_per_second=5)
+
+    async def request():
+        async with scheduler.slot("example.com"):
+            return time.monotonic()
+
+    async def two_requests():
+        first = await request()
+        second = await request()
+        return second - first
+
+    # The second request comes while the host is idle but before its next start is due
+    assert asyncio.run(two_requests()) >= 0.19
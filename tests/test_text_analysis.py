@@ -0,0 +1,63 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import page_analysis as pa
+import streamlit_app as app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+URL = "https://example.com/"
+PAGE = "<html><body><p>The quick brown fox jumps over the lazy dog near the river bank.</p></body></html>"
+
+
+@pytest.fixture
+def no_sentiment(monkeypatch):
+    def analyze_sentiment(text):
+        raise AssertionError("sentiment should not run")
+    monkeypatch.setattr(pa, "analyze_sentiment", analyze_sentiment)
+
+
+def test_language_field_skips_sentiment(no_sentiment):
+    output, _, _, stages = pa.analyze_document(URL, PAGE.encode(), "lxml", fields=["Detected Language"])
+    assert output == {"Detected Language": "en"}
+    assert "language" in stages
+    assert "sentiment" not in stages
+
+
+def test_score_profile_skips_sentiment(site, no_sentiment):
+    site.pages["/"] = PAGE
+    output = io.StringIO()
+    counts = app.run_batch([f"{site.url}/\n"], output, workers=1, fields="score")
+    assert counts["failed"] == 0
+    assert json.loads(output.getvalue())["result"]["Score"] > 0
+
+
+def test_sentiment_fields_share_one_run(monkeypatch):
+    calls = []
+    analyze_sentiment = pa.analyze_sentiment
+    monkeypatch.setattr(pa, "analyze_sentiment", lambda text: calls.append(text) or analyze_sentiment(text))
+    output, _, _, _ = pa.analyze_document(URL, PAGE.encode(), "lxml",
+                                          fields=["Sentiment Polarity", "Sentiment Subjectivity"])
+    assert len(calls) == 1
+    assert set(output) == {"Sentiment Polarity", "Sentiment Subjectivity"}
+
+
+def test_exact_mode_is_the_default():
+    env = {name: value for name, value in os.environ.items() if name != "SCRAPER_ANALYSIS_MODE"}
+    result = subprocess.run([sys.executable, "-c", "import page_analysis; print(page_analysis.ANALYSIS_MODE)"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "exact"
+
+
+def test_fast_mode_samples_long_text(monkeypatch):
+    seen = []
+    monkeypatch.setattr(pa, "detect_language", lambda text: seen.append(len(text)) or "en")
+    text = "word " * 10000
+    pa.analyze_language(text, "exact")
+    pa.analyze_language(text, "fast")
+    assert seen[0] == len(text)
+    assert seen[1] <= pa.LANGUAGE_SAMPLE_CHARS
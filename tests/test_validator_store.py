@@ -0,0 +1,92 @@
+import threading
+
+import streamlit_app as app
+
+FIELDS = ["Word Count", "Headings", "HTTP Info"]
+
+
+def etag_page(body, etag):
+    def respond(handler):
+        if handler.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"Content-Type": "text/html; charset=utf-8", "ETag": etag}, body
+    return respond
+
+
+def scrape(engine, url, store):
+    return engine.run(app.scrape_website_async(engine, url, validator_store=store, fields=FIELDS))
+
+
+def conditional_headers(site):
+    return [headers.get("If-None-Match") for command, path, headers in site.requests if path == "/page"]
+
+
+def test_not_modified_reuses_stored_analysis(site, engine, tmp_path):
+    site.pages["/page"] = etag_page("<html><body><h1>Title</h1><p>four words of text</p></body></html>", '"v1"')
+    url = f"{site.url}/page"
+    store = app.ValidatorStore(str(tmp_path / "state.db"))
+    try:
+        first = scrape(engine, url, store)
+        second = scrape(engine, url, store)
+    finally:
+        store.close()
+    assert conditional_headers(site) == [None, '"v1"']
+    assert store.stats == {"not_modified": 1, "unchanged": 0, "reanalyzed": 1}
+    assert second["Word Count"] == first["Word Count"] == 4
+    assert second["Headings"] == first["Headings"]
+    # The stored 200 is reported, not the bodiless 304
+    assert second["HTTP Info"]["status_code"] == 200
+
+
+def test_changed_etag_reanalyzes_and_identical_body_does_not(site, engine, tmp_path):
+    url = f"{site.url}/page"
+    store = app.ValidatorStore(str(tmp_path / "state.db"))
+    try:
+        site.pages["/page"] = etag_page("<html><body><p>old text</p></body></html>", '"v1"')
+        scrape(engine, url, store)
+        # A new ETag with the same body is answered from the content hash
+        site.pages["/page"] = etag_page("<html><body><p>old text</p></body></html>", '"v2"')
+        scrape(engine, url, store)
+        site.pages["/page"] = etag_page("<html><body><p>new and longer text</p></body></html>", '"v3"')
+        changed = scrape(engine, url, store)
+    finally:
+        store.close()
+    assert store.stats == {"not_modified": 0, "unchanged": 1, "reanalyzed": 2}
+    assert changed["Word Count"] == 4
+
+
+def test_store_survives_reopening(site, engine, tmp_path):
+    site.pages["/page"] = etag_page("<html><body><p>some text</p></body></html>", '"v1"')
+    url = f"{site.url}/page"
+    path = str(tmp_path / "state.db")
+    store = app.ValidatorStore(path)
+    scrape(engine, url, store)
+    store.close()
+    store = app.ValidatorStore(path)
+    try:
+        scrape(engine, url, store)
+    finally:
+        store.close()
+    assert store.stats["not_modified"] == 1
+
+
+def test_store_is_used_off_the_event_loop(site, engine, tmp_path):
+    site.pages["/page"] = etag_page("<html><body><p>some text</p></body></html>", '"v1"')
+    threads = []
+
+    class RecordingStore(app.ValidatorStore):
+        def get(self, url, config):
+            threads.append(threading.current_thread().name)
+            return super().get(url, config)
+
+        def put(self, *args):
+            threads.append(threading.current_thread().name)
+            return super().put(*args)
+
+    store = RecordingStore(str(tmp_path / "state.db"))
+    try:
+        scrape(engine, f"{site.url}/page", store)
+    finally:
+        store.close()
+    assert len(threads) == 2
+    assert all(name.startswith("scrape-store") for name in threads)